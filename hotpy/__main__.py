@@ -1,4 +1,12 @@
-from hot import main
+import sys
+
+from pyhot.client import forward_to_server
 
 if __name__ == '__main__':
+	# hand the command to hot --serve when it is running, before loading the rest of hot
+	code = forward_to_server(sys.argv[1:])
+	if code is not None:
+		sys.exit(code)
+
+	from hot import main
 	main()
@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 
 import argparse
+import sys
 
-from pyhot.hottable.document import HotDocument
-from pyhot.hotparse import HotParse
-from pyhot.manipulation import manipulate_document
-from pyhot.repl import start_repl
+# only the client is imported up front, the rest of hot is loaded by main()
+# once a running hot --serve didn't take the command
+from pyhot.client import forward_to_server
 
 
 
@@ -16,7 +16,10 @@ class CustomFormatter(argparse.HelpFormatter):
 		super().__init__(*args, **kwargs)
 
 
-def main():
+def get_parsers():
+	from pyhot.cache import get_default_cache_dir, get_default_cache_size
+	from pyhot.hotparse import HotParse
+
 	parser = argparse.ArgumentParser(
 		description="Convert webpage tables to JSON table data.",
 		formatter_class=CustomFormatter,
@@ -26,13 +29,33 @@ def main():
 
 	parser.add_argument("--cache", action="store_true", help="Cache any fetch requests")
 	parser.add_argument("--fetch", action="store_true", help="Fetch the page again, don't use cache")
+	parser.add_argument("--cache-dir", default=get_default_cache_dir(), help="Where cached pages are kept")
+	parser.add_argument("--cache-size", default=get_default_cache_size(), help="Cache budget, like 500M or 2G")
+	parser.add_argument("--max-age", type=float, default=None, help="Revalidate cached pages older than N seconds")
+	parser.add_argument("--concurrency", type=int, default=8, help="Fetch up to N pages at once")
+	parser.add_argument("--per-host", type=int, default=2, help="Fetch up to N pages at once from the same host")
+	parser.add_argument("--rate", type=float, default=None, help="Limit fetches to N requests per second")
+	parser.add_argument("--retries", type=int, default=3, help="Retry failed fetches N times")
+	parser.add_argument("--timeout", type=float, default=10, help="Fetch timeout in seconds")
 
 	parser.add_argument("-x", "--cut", action="store_true", help="Put output into clipboard")
 	parser.add_argument("-c", "--copy", action="store_true", help="Copy output to clipboard")
 	parser.add_argument("-v", "--paste", action="store_true", help="Take input HTML from clipboard")
 	parser.add_argument("--paste-path", action="store_true", help="Take input path from clipboard")
 
+	parser.add_argument("--jobs", type=int, default=1, help="Load input files in N parallel processes")
+	parser.add_argument("--stream", action="store_true", help="Process a CSV input in batches, without loading it whole")
+	parser.add_argument("--batch-size", type=int, default=10_000, help="Rows per batch in stream mode")
+
 	parser.add_argument("--repl", default=False, action="store_true", help="Start in REPL mode")
+	parser.add_argument("--auto-snap", action="store_true", help="Take a snapshot before every REPL command")
+	parser.add_argument("--snap-budget", default="512M", help="Memory for snapshots, oldest are dropped past it")
+	parser.add_argument("--snap-dir", default=None, help="Move snapshots past the budget to .hot files here instead")
+	parser.add_argument("--explain", action="store_true", help="Print the plan for the given flags and exit")
+	parser.add_argument("--serve", action="store_true", help="Stay loaded and run the commands of other hot calls")
+	parser.add_argument("--serve-memory", default="256M", help="Memory for recently loaded files in serve mode")
+	parser.add_argument("--startup-profile", action="store_true", help="Run the command and report its import times")
+	parser.add_argument("--startup-budget", type=float, default=None, help="With --startup-profile, fail past N ms of imports or on heavy imports")
 	parser.add_argument("-o", "--output", default=None, help="Optional output file")
 	parser.add_argument("--csv", default=False, action="store_true", help="Output as CSV")
 	parser.add_argument("--html", default=False, action="store_true", help="Output as HTML")
@@ -56,11 +79,20 @@ def main():
 	parser.add_argument("--c1", default=None, help="Filter columns before processing")
 	parser.add_argument("--t1", default=None, help="Filter tables before processing")
 	parser.add_argument("--t2", default=None, help="Filter tables after processing")
+	parser.add_argument("--table-id", default=None, help="Select tables by id attribute")
+	parser.add_argument("--table-class", default=None, help="Select tables by class name")
+	parser.add_argument("--caption", default=None, help="Select tables by caption text")
 
 	hot_parser.add_argument("--longest", action="store_true", help="Select the table with most rows")
 	hot_parser.add_argument("--widest", action="store_true", help="Select the table with most cols")
 	hot_parser.add_argument("-j", "--join", action="store_true", help="Join tables with same number of rows")
-	hot_parser.add_argument("-u", "--union", action="store_true", help="Combine tables with same number of cols")
+	hot_parser.add_argument("--join-on", nargs='+', help="Join tables on key columns: inner (default), left or outer")
+	hot_parser.add_argument("-u", "--union", nargs='?', const=None, help="Combine tables with same number of cols, or same headers with 'names'")
+
+	parser.add_argument("--lazy", action="store_true", help="Decode JSON rows only when they are used")
+	parser.add_argument("--columnar", action="store_true", help="Keep table data column by column, in typed arrays")
+	parser.add_argument("--no-infer", action="store_true", help="Keep cell values as strings")
+	parser.add_argument("--infer-sample", type=int, default=None, help="Infer column types from first N rows")
 
 	parser.add_argument("--min-rows", type=int, default=None, help="Minimum table rows expected")
 	parser.add_argument("--max-rows", type=int, default=None, help="Maximum table rows expected")
@@ -102,6 +134,9 @@ def main():
 	hot_parser.add_argument("--keep", nargs='+', help="Keep certain columns")
 	hot_parser.add_argument("--move", nargs='+', help="Move columns to Nth position")
 	hot_parser.add_argument("--swap", nargs='+', help="Swap two columns")
+	hot_parser.add_argument("--distinct", nargs='*', help="Drop repeated rows, by all or some columns, keeping first (default) or last")
+	hot_parser.add_argument("--groupby", nargs='+', help="Group rows by key columns, aggregates like sum:x,mean:y,count can follow")
+	hot_parser.add_argument("--agg", nargs='+', help="Aggregate columns: count, sum, mean, min, max (like sum:x,count)")
 	hot_parser.add_argument("--min", nargs='+', help="Filter rows by minimum value for column")
 	hot_parser.add_argument("--max", nargs='+', help="Filter rows by maximum value for column")
 
@@ -124,21 +159,72 @@ def main():
 	hot_parser.add_argument("--index", nargs='?', const="Index", default=None, help="Add index to table rows")
 	hot_parser.add_argument("--uuid", nargs='?', const="UUID", default=None, help="Add uuid to table rows")
 
-	args, rest = parser.parse_known_args()
+	# set by the plan when a leading --head can be applied while loading
+	parser.set_defaults(row_limit=None)
+	return parser, hot_parser
+
+
+def parse_command(argv):
+	"""
+	Returns the options of a command line and its flag chain, as a HotParse.
+	"""
+	parser, hot_parser = get_parsers()
+	args, rest = parser.parse_known_args(argv)
 	hot_parser.parse_args(rest)
+	return args, hot_parser
+
+
+def main():
+	if sys.argv[1:2] == ["cache"]:
+		from pyhot.cache import cache_main
+		cache_main(sys.argv[2:])
+		return
+	if sys.argv[1:2] == ["run"]:
+		from pyhot.pipeline import run_main
+		sys.exit(run_main(sys.argv[2:], parse_command))
+
+	args, hot_parser = parse_command(sys.argv[1:])
+	if args.startup_profile:
+		from pyhot.startup import profile_startup, strip_profile_args
+		sys.exit(profile_startup(strip_profile_args(sys.argv[1:]), args.startup_budget))
+	if args.serve:
+		from pyhot.server import serve
+		serve(args, main)
+		return
+
+	from pyhot.hottable.document import HotDocument
+	from pyhot.plan import Plan
 
 	input_paths = [arg.arg for arg in hot_parser.args]
 	hotdoc = HotDocument(args)
+	if args.stream:
+		from pyhot.stream import stream_document
+		stream_document(hotdoc, input_paths, hot_parser)
+		return
+
+	plan = Plan(hot_parser)
+	if not args.repl:
+		plan.push_limit_into_loading(args)
+	if args.explain:
+		plan.print()
+		return
+
 	hotdoc.add_hot_tables_from_args(input_paths)
+	# later loads (--load, --undo) get every row again
+	args.row_limit = None
 
 	if args.repl or hotdoc.is_empty:
 		print(f"Lets go to the REPL!")
+		from pyhot.repl import start_repl
 		start_repl(hotdoc)
 	else:
-		for flag in hot_parser:
-			manipulate_document(hotdoc, flag)
+		plan.run(hotdoc)
 		hotdoc.produce_output()
 
 
 if __name__ == '__main__':
+	# hand the command to hot --serve when it is running
+	code = forward_to_server(sys.argv[1:])
+	if code is not None:
+		sys.exit(code)
 	main()
@@ -0,0 +1,353 @@
+import argparse
+import atexit
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+	import fcntl
+except ImportError:
+	# no lock on Windows, processes there can still lose each other's index updates
+	fcntl = None
+
+
+
+def get_default_cache_dir():
+	# read on every call, hot --serve runs each command in its client's environment
+	return os.environ.get("HOT_CACHE_DIR", "cache")
+
+def get_default_cache_size():
+	return os.environ.get("HOT_CACHE_SIZE", "1G")
+
+
+# page accesses are written to the index at most this often (and on exit)
+ACCESS_SAVE_SECONDS = 30
+# page files this new are not orphans yet, their index entry may be on its way
+ORPHAN_GRACE_SECONDS = 60
+PAGE_SUFFIX = ".html.gz"
+# extracted tables, see hottable.table_cache, share the budget with the pages
+TABLES_DIR = "tables"
+TABLE_SUFFIX = ".pickle"
+
+SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(size):
+	if size is None or isinstance(size, int):
+		return size
+	size = size.strip().upper().rstrip("B")
+	if size and size[-1] in SIZE_UNITS:
+		return int(float(size[:-1]) * SIZE_UNITS[size[-1]])
+	return int(size)
+
+def format_size(n):
+	for unit in ["", "K", "M", "G"]:
+		if n < 1024:
+			return f"{n:.1f}{unit}B" if unit else f"{n}B"
+		n /= 1024
+	return f"{n:.1f}TB"
+
+
+def is_table_key(key):
+	return key.endswith(TABLE_SUFFIX)
+
+
+class PageCache:
+	"""
+	Gzipped pages in hash-sharded folders (ab/cd/abcd...html.gz), with a small
+	index.json tracking size, last access and response metadata for every page.
+	Cached table files are in the index too, by their path under the cache,
+	with their size and last access only.
+	Processes sharing the cache only write their own changes into the index,
+	merged with what is on disk under a lock file.
+	"""
+	def __init__(self, location, max_bytes):
+		self.location = location
+		self.max_bytes = parse_size(max_bytes)
+		self.index_path = os.path.join(location, "index.json")
+		self.lock_path = os.path.join(location, "index.lock")
+		self.lock = threading.RLock()
+		self.index = self.load_index()
+		# changes not in the index on disk yet
+		self.changed = {}
+		self.removed = set()
+		self.accessed = {}
+		self.saved_at = time.monotonic()
+		atexit.register(self.flush)
+
+	def load_index(self):
+		if not os.path.isfile(self.index_path):
+			return {}
+		try:
+			with open(self.index_path) as f:
+				return json.load(f)
+		except ValueError:
+			print(f"Bad cache index, starting over: '{self.index_path}'")
+			return {}
+
+	@contextlib.contextmanager
+	def locked(self):
+		"""
+		Holds the lock file, one process at a time gets to update the index.
+		"""
+		with self.lock:
+			if fcntl is None:
+				yield
+				return
+			os.makedirs(self.location, exist_ok=True)
+			with open(self.lock_path, "a") as f:
+				fcntl.flock(f, fcntl.LOCK_EX)
+				try:
+					yield
+				finally:
+					fcntl.flock(f, fcntl.LOCK_UN)
+
+	def merge_index(self):
+		# the index on disk, with the changes made here since it was read
+		index = self.load_index()
+		for key in self.removed:
+			index.pop(key, None)
+		index.update(self.changed)
+		for key, accessed in self.accessed.items():
+			if key in index:
+				index[key]["accessed"] = max(index[key]["accessed"], accessed)
+		self.index = index
+		self.changed, self.removed, self.accessed = {}, set(), {}
+
+	def write_index(self):
+		os.makedirs(self.location, exist_ok=True)
+		tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+		with open(tmp_path, "w") as f:
+			json.dump(self.index, f)
+		os.replace(tmp_path, self.index_path)
+
+	def save_index(self, keep=None):
+		"""
+		Merges the changes made here into the index on disk, evicts pages
+		over the budget and writes it back.
+		"""
+		with self.locked():
+			self.merge_index()
+			self.evict(keep=keep)
+			self.write_index()
+			self.removed = set()
+			self.saved_at = time.monotonic()
+
+	def flush(self):
+		with self.lock:
+			if self.changed or self.removed or self.accessed:
+				self.save_index()
+
+	@staticmethod
+	def get_key(page_url):
+		return hashlib.md5(page_url.encode('utf-8')).hexdigest()
+
+	def get_table_key(self, path):
+		return os.path.relpath(path, self.location).replace(os.sep, "/")
+
+	def get_path(self, key):
+		if is_table_key(key):
+			return os.path.join(self.location, *key.split("/"))
+		return os.path.join(self.location, key[:2], key[2:4], f"{key}{PAGE_SUFFIX}")
+
+	@property
+	def total_bytes(self):
+		return sum(entry["size"] for entry in self.index.values())
+
+	def get_entry(self, page_url):
+		key = self.get_key(page_url)
+		with self.lock:
+			entry = self.index.get(key)
+			if entry and not os.path.isfile(self.get_path(key)):
+				del self.index[key]
+				self.removed.add(key)
+				return None
+			return entry
+
+	def open(self, page_url):
+		"""
+		Text stream that decompresses as it is read, marks the page as used.
+		Returns None when the page is gone, evicted by another fetch since it was looked up.
+		"""
+		key = self.get_key(page_url)
+		with self.lock:
+			entry = self.index.get(key)
+			if entry is None:
+				return None
+			try:
+				# an open file stays readable even if the page is evicted next
+				f = gzip.open(self.get_path(key), "rt", encoding="utf-8")
+			except FileNotFoundError:
+				self.remove(key)
+				return None
+			self.mark_used(key)
+		return f
+
+	def mark_used(self, key):
+		"""
+		Records an access to a page or table file, returns False when the index doesn't know it.
+		"""
+		with self.lock:
+			entry = self.index.get(key)
+			if entry is None:
+				return False
+			entry["accessed"] = self.accessed[key] = time.time()
+			if time.monotonic() - self.saved_at > ACCESS_SAVE_SECONDS:
+				self.save_index(keep=key)
+			return True
+
+	def put(self, page_url, html, meta):
+		key = self.get_key(page_url)
+		path = self.get_path(key)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+			f.write(html)
+
+		with self.lock:
+			self.index[key] = self.changed[key] = {
+				"size": os.path.getsize(path),
+				"accessed": time.time(),
+				"meta": meta,
+			}
+			self.save_index(keep=key)
+		return path
+
+	def put_table(self, path):
+		"""
+		Adds a table file under the cache to the index.
+		"""
+		key = self.get_table_key(path)
+		try:
+			size = os.path.getsize(path)
+		except FileNotFoundError:
+			# evicted by another process already
+			return None
+		with self.lock:
+			self.index[key] = self.changed[key] = {
+				"size": size,
+				"accessed": time.time(),
+			}
+			self.save_index(keep=key)
+		return key
+
+	def update_meta(self, page_url, **meta):
+		key = self.get_key(page_url)
+		with self.lock:
+			entry = self.index.get(key)
+			if entry is None:
+				return
+			entry["meta"].update(meta)
+			entry["accessed"] = time.time()
+			self.changed[key] = entry
+			self.save_index()
+
+	def remove(self, key):
+		path = self.get_path(key)
+		if os.path.isfile(path):
+			os.remove(path)
+		self.index.pop(key, None)
+		self.changed.pop(key, None)
+		self.removed.add(key)
+
+	def evict(self, max_bytes=None, keep=None):
+		"""
+		Drops least recently used pages and table files until they fit the budget together.
+		:param keep: key of a page or table file to leave alone
+		"""
+		max_bytes = self.max_bytes if max_bytes is None else max_bytes
+		if max_bytes is None:
+			return []
+
+		with self.lock:
+			total = self.total_bytes
+			candidates = sorted((entry["accessed"], key) for key, entry in self.index.items())
+			evicted = []
+			for _, key in candidates:
+				if total <= max_bytes:
+					break
+				if key == keep:
+					continue
+				total -= self.index[key]["size"]
+				self.remove(key)
+				evicted.append(key)
+			return evicted
+
+	def find_orphans(self):
+		"""
+		Page and table files no index entry refers to, like ones evicted by
+		a process whose index update got lost.
+		"""
+		orphans = []
+		cutoff = time.time() - ORPHAN_GRACE_SECONDS
+		for folder, _, names in os.walk(self.location):
+			for name in names:
+				path = os.path.join(folder, name)
+				if name.endswith(PAGE_SUFFIX):
+					key = name[:-len(PAGE_SUFFIX)]
+				elif name.endswith(TABLE_SUFFIX):
+					key = self.get_table_key(path)
+				else:
+					continue
+				if key not in self.index and os.path.getmtime(path) < cutoff:
+					orphans.append(path)
+		return orphans
+
+	def prune(self, max_bytes=None):
+		with self.locked():
+			self.merge_index()
+			missing = [key for key in self.index if not os.path.isfile(self.get_path(key))]
+			for key in missing:
+				del self.index[key]
+			evicted = self.evict(max_bytes=max_bytes)
+			orphans = self.find_orphans()
+			for path in orphans:
+				os.remove(path)
+			self.write_index()
+			self.removed = set()
+		return missing, evicted, orphans
+
+	def print_stats(self):
+		entries = list(self.index.values())
+		tables = [entry for key, entry in self.index.items() if is_table_key(key)]
+		table_bytes = sum(entry["size"] for entry in tables)
+		print(f"Location: '{self.location}'")
+		print(f"Pages: {len(entries) - len(tables)} ({format_size(self.total_bytes - table_bytes)})")
+		print(f"Tables: {len(tables)} ({format_size(table_bytes)})")
+		print(f"Size: {format_size(self.total_bytes)}", end="")
+		print(f" of {format_size(self.max_bytes)}" if self.max_bytes else "")
+		if entries:
+			accessed = [entry["accessed"] for entry in entries]
+			print(f"Oldest access: {time.ctime(min(accessed))}")
+			print(f"Newest access: {time.ctime(max(accessed))}")
+
+
+page_caches = {}
+
+def get_page_cache(location=None, max_bytes=None):
+	location = get_default_cache_dir() if location is None else location
+	max_bytes = get_default_cache_size() if max_bytes is None else max_bytes
+	# by absolute path, the same relative location is another cache in another folder
+	key = (os.path.abspath(location), parse_size(max_bytes))
+	if key not in page_caches:
+		page_caches[key] = PageCache(location, max_bytes=max_bytes)
+	return page_caches[key]
+
+
+def cache_main(argv):
+	parser = argparse.ArgumentParser(prog="hot cache", description="Inspect or shrink the page cache.")
+	parser.add_argument("command", choices=["stats", "prune"])
+	parser.add_argument("--cache-dir", default=get_default_cache_dir(), help="Cache location")
+	parser.add_argument("--cache-size", default=get_default_cache_size(), help="Cache budget, like 500M or 2G")
+	args = parser.parse_args(argv)
+
+	page_cache = get_page_cache(args.cache_dir, args.cache_size)
+	if args.command == "stats":
+		page_cache.print_stats()
+	elif args.command == "prune":
+		missing, evicted, orphans = page_cache.prune()
+		print(f"Dropped {len(missing)} missing pages, evicted {len(evicted)} pages and tables, deleted {len(orphans)} orphaned pages.")
+		page_cache.print_stats()
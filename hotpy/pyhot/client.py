@@ -0,0 +1,126 @@
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+
+
+
+# a frame is a kind byte and a payload size, then the payload
+FRAME = struct.Struct("<cI")
+EXIT_CODE = struct.Struct("<i")
+
+# client to server
+REQUEST, STDIN, STDIN_END = b"A", b"I", b"E"
+# server to client
+STDOUT, STDERR, NEED_STDIN, EXIT = b"O", b"R", b"N", b"X"
+
+# flags that need this terminal or clipboard, or start something of their own
+LOCAL_FLAGS = [
+	"--serve", "--repl", "--startup-profile",
+	"-x", "--cut", "-c", "--copy", "-v", "--paste", "--paste-path",
+]
+
+
+def get_socket_path():
+	"""
+	Where hot --serve listens: $HOT_SOCKET (empty to never use a server),
+	else hot.sock in $XDG_RUNTIME_DIR, else ~/.hottable.sock
+	"""
+	path = os.environ.get("HOT_SOCKET")
+	if path is not None:
+		return path
+	runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+	if runtime_dir:
+		return os.path.join(runtime_dir, "hot.sock")
+	return os.path.expanduser("~/.hottable.sock")
+
+
+def send_frame(sock, kind, payload=b""):
+	sock.sendall(FRAME.pack(kind, len(payload)) + payload)
+
+
+def recv_frame(reader):
+	"""
+	Returns (kind, payload), (None, None) once the other side is gone.
+	"""
+	header = reader.read(FRAME.size)
+	if len(header) < FRAME.size:
+		return None, None
+	kind, size = FRAME.unpack(header)
+	payload = reader.read(size)
+	if len(payload) < size:
+		return None, None
+	return kind, payload
+
+
+def get_stream_info(stream):
+	if stream is None:
+		return ["utf-8", "strict", False]
+	return [stream.encoding, stream.errors, stream.isatty()]
+
+
+def can_forward(argv):
+	if argv[:1] == ["cache"]:
+		return False
+	# with a terminal on stdin a command can end up in the REPL, which
+	# would hold the server for as long as the session lasts
+	if sys.stdin is not None and sys.stdin.isatty():
+		return False
+	return not any(arg in LOCAL_FLAGS for arg in argv)
+
+
+def send_stdin(sock):
+	# only started once the command reads its input
+	try:
+		if sys.stdin is not None:
+			fd = sys.stdin.fileno()
+			while data := os.read(fd, 65536):
+				send_frame(sock, STDIN, data)
+		send_frame(sock, STDIN_END)
+	except OSError:
+		pass
+
+
+def forward_to_server(argv):
+	"""
+	Runs the command on a hot --serve server, when one is listening.
+	Returns its exit code, or None when the command has to run here.
+	"""
+	path = get_socket_path()
+	if not path or not can_forward(argv) or not os.path.exists(path):
+		return None
+
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		sock.connect(path)
+	except OSError:
+		sock.close()
+		return None
+
+	request = {
+		"prog": sys.argv[0], "argv": argv, "cwd": os.getcwd(), "env": dict(os.environ),
+		"stdin": get_stream_info(sys.stdin),
+		"stdout": get_stream_info(sys.stdout),
+		"stderr": get_stream_info(sys.stderr),
+	}
+	with sock:
+		send_frame(sock, REQUEST, json.dumps(request).encode("utf-8"))
+		reader = sock.makefile("rb")
+		stdout, stderr = sys.stdout.buffer, sys.stderr.buffer
+		while True:
+			kind, payload = recv_frame(reader)
+			if kind is None:
+				print("Lost connection to the hot server.", file=sys.stderr)
+				return 1
+			elif kind == STDOUT:
+				stdout.write(payload)
+				stdout.flush()
+			elif kind == STDERR:
+				stderr.write(payload)
+				stderr.flush()
+			elif kind == NEED_STDIN:
+				threading.Thread(target=send_stdin, args=(sock,), daemon=True).start()
+			elif kind == EXIT:
+				return EXIT_CODE.unpack(payload)[0]
@@ -1,11 +1,17 @@
+import collections
+import concurrent.futures
 import hashlib
-import os
+import threading
+import time
+import urllib.parse
 
 from bs4 import BeautifulSoup
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from .cache import get_page_cache
 
-session = requests.session()
 
 DEFAULT_HEADERS = {
 	"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
@@ -25,29 +31,153 @@ def to_full_url(url: str):
 	return url
 
 
-def get_cache_path(page_url: str):
-	md5_hash = to_md5(page_url)
-	cache_path = f"cache/{md5_hash}.html"
-	return cache_path
+def get_response_meta(page_url, response):
+	return {
+		"url": page_url,
+		"etag": response.headers.get("ETag"),
+		"last_modified": response.headers.get("Last-Modified"),
+		"content_type": response.headers.get("Content-Type"),
+		"fetched_at": time.time(),
+	}
+
+def get_conditional_headers(meta):
+	headers = {}
+	if meta.get("etag"):
+		headers["If-None-Match"] = meta["etag"]
+	if meta.get("last_modified"):
+		headers["If-Modified-Since"] = meta["last_modified"]
+	return headers
+
+
+class TokenBucket:
+	def __init__(self, rate, capacity=None):
+		self.rate = rate
+		self.capacity = capacity or max(1, rate)
+		self.tokens = self.capacity
+		self.last = time.monotonic()
+		self.lock = threading.Lock()
+
+	def acquire(self):
+		while True:
+			with self.lock:
+				now = time.monotonic()
+				self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+				self.last = now
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return
+				wait = (1 - self.tokens) / self.rate
+			time.sleep(wait)
+
+
+class PageFetcher:
+	def __init__(self, concurrency=8, per_host=2, rate=None, retries=3, backoff=0.5, timeout=10, page_cache=None):
+		self.page_cache = page_cache or get_page_cache()
+		self.concurrency = concurrency
+		self.per_host = per_host
+		self.timeout = timeout
+		self.bucket = TokenBucket(rate) if rate else None
+
+		retry = Retry(
+			total=retries, backoff_factor=backoff,
+			status_forcelist=[429, 500, 502, 503, 504],
+			respect_retry_after_header=True,
+			raise_on_status=False,
+		)
+		# one keep-alive pool per host, big enough for every worker thread
+		adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry)
+		self.session = requests.session()
+		self.session.mount("http://", adapter)
+		self.session.mount("https://", adapter)
+
+		self.host_locks = collections.defaultdict(lambda: threading.Semaphore(self.per_host))
+		self.lock = threading.Lock()
+
+	def get_host_lock(self, page_url):
+		host = urllib.parse.urlsplit(page_url).netloc
+		with self.lock:
+			return self.host_locks[host]
+
+	def download(self, page_url, headers=None):
+		with self.get_host_lock(page_url):
+			if self.bucket:
+				self.bucket.acquire()
+			return self.session.get(page_url, headers=headers, timeout=self.timeout)
+
+	def get_page_html(self, page_url: str, fetch=False, cache=False, max_age=None):
+		"""
+		Returns the page as a string, or as a text stream when it comes from the cache.
+		"""
+		page_url = to_full_url(page_url)
+		page_cache = self.page_cache
+		headers = None
+		entry = None if fetch else page_cache.get_entry(page_url)
+		if entry:
+			meta = entry["meta"]
+			age = time.time() - meta.get("fetched_at", 0)
+			if max_age is None or age <= max_age:
+				stream = page_cache.open(page_url)
+				if stream is not None:
+					return stream
+				# evicted by another fetch in the meantime, fetch it again
+			else:
+				# stale, ask the server whether it changed
+				headers = get_conditional_headers(meta)
+
+		response = self.download(page_url, headers=headers)
+		if headers is not None and response.status_code == 304:
+			page_cache.update_meta(page_url, fetched_at=time.time())
+			stream = page_cache.open(page_url)
+			if stream is not None:
+				return stream
+			response = self.download(page_url)
+
+		html = response.text
+		if cache or headers is not None:
+			cache_path = page_cache.put(page_url, html, get_response_meta(page_url, response))
+			print(f"Saved cache: {cache_path}")
 
-def get_page_html(page_url: str, fetch=False, cache=False):
-	page_url = to_full_url(page_url)
-	cache_path = get_cache_path(page_url)
-	if not fetch and os.path.isfile(cache_path):
-		with open(cache_path) as f:
-			html = f.read()
 		return html
 
-	response = session.get(page_url, timeout=10)
-	html = response.text
-	if cache:
-		with open(cache_path, "w") as f:
-			f.write(html)
-		print(f"Saved cache: {cache_path}")
+	def get_pages(self, page_urls, fetch=False, cache=False, max_age=None):
+		"""
+		Yields (index, html, error) for every url, in the order they finish.
+		"""
+		workers = max(1, min(self.concurrency, len(page_urls)))
+		with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+			futures = {
+				executor.submit(self.get_page_html, page_url, fetch=fetch, cache=cache, max_age=max_age): idx
+				for idx, page_url in enumerate(page_urls)
+			}
+			for future in concurrent.futures.as_completed(futures):
+				try:
+					yield futures[future], future.result(), None
+				except Exception as e:
+					yield futures[future], None, e
+
+
+fetchers = {}
+
+def get_fetcher(concurrency=8, per_host=2, rate=None, retries=3, timeout=10,
+		cache_dir=None, cache_size=None):
+	page_cache = get_page_cache(cache_dir, cache_size)
+	# reuse sessions (and their open connections) for the same settings
+	key = (concurrency, per_host, rate, retries, timeout, id(page_cache))
+	if key not in fetchers:
+		fetchers[key] = PageFetcher(
+			concurrency=concurrency, per_host=per_host,
+			rate=rate, retries=retries, timeout=timeout,
+			page_cache=page_cache
+		)
+	return fetchers[key]
 
-	return html
+def get_page_html(page_url: str, fetch=False, cache=False, max_age=None):
+	return get_fetcher().get_page_html(page_url, fetch=fetch, cache=cache, max_age=max_age)
 
 def get_soup(page_url: str):
 	html = get_page_html(page_url)
+	if not isinstance(html, str):
+		with html:
+			html = html.read()
 	soup = BeautifulSoup(html, "lxml")
 	return soup
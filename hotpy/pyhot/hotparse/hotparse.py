@@ -1,4 +1,3 @@
-from tabulate import tabulate
 
 
 
@@ -92,6 +91,7 @@ class HotParse(HotFlag):
 		return rows
 
 	def print(self):
+		from tabulate import tabulate
 		print(tabulate([self.row(), *self.rows()], headers=["Id", "Flag", "N", "Args"]))
 
 
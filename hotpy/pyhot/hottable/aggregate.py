@@ -0,0 +1,164 @@
+import abc
+import itertools
+
+
+
+class Accumulator(abc.ABC):
+	"""
+	Running state for every group of a column. Values come in as
+	(group id, value) pairs, in as many batches as needed, and nulls are skipped.
+	"""
+	name = ""
+	initial = None
+
+	def __init__(self):
+		self.states = []
+
+	def grow(self, group_count):
+		missing = group_count - len(self.states)
+		if missing > 0:
+			self.states.extend([self.initial] * missing)
+
+	@abc.abstractmethod
+	def update(self, group_ids, values):
+		"""
+		Folds a batch of values into the states of their groups.
+		"""
+
+	def results(self):
+		return list(self.states)
+
+
+class CountAccumulator(Accumulator):
+	name = "count"
+	initial = 0
+
+	def update(self, group_ids, values):
+		states = self.states
+		if values is None:
+			# a plain count counts rows, not values
+			for g in group_ids:
+				states[g] += 1
+			return
+		for g, value in zip(group_ids, values):
+			if value is not None:
+				states[g] += 1
+
+
+class SumAccumulator(Accumulator):
+	name = "sum"
+	initial = 0
+
+	def update(self, group_ids, values):
+		states = self.states
+		for g, value in zip(group_ids, values):
+			if value is not None:
+				states[g] += value
+
+
+class MeanAccumulator(Accumulator):
+	name = "mean"
+
+	def __init__(self):
+		super().__init__()
+		self.counts = []
+
+	def grow(self, group_count):
+		missing = group_count - len(self.states)
+		if missing > 0:
+			self.states.extend([0] * missing)
+			self.counts.extend([0] * missing)
+
+	def update(self, group_ids, values):
+		sums, counts = self.states, self.counts
+		for g, value in zip(group_ids, values):
+			if value is not None:
+				sums[g] += value
+				counts[g] += 1
+
+	def results(self):
+		return [s / n if n else None for s, n in zip(self.states, self.counts)]
+
+
+class MinAccumulator(Accumulator):
+	name = "min"
+
+	def update(self, group_ids, values):
+		states = self.states
+		for g, value in zip(group_ids, values):
+			if value is not None and (states[g] is None or value < states[g]):
+				states[g] = value
+
+
+class MaxAccumulator(Accumulator):
+	name = "max"
+
+	def update(self, group_ids, values):
+		states = self.states
+		for g, value in zip(group_ids, values):
+			if value is not None and (states[g] is None or value > states[g]):
+				states[g] = value
+
+
+ACCUMULATORS = {acc.name: acc for acc in [CountAccumulator, SumAccumulator, MeanAccumulator, MinAccumulator, MaxAccumulator]}
+
+
+def parse_agg_specs(args):
+	"""
+	(function name, column name) pairs for args like sum:x,mean:y,count.
+	Column name is None for a plain count.
+	"""
+	specs = []
+	for spec in ",".join(args).split(","):
+		if not spec:
+			continue
+		name, _, col_name = spec.partition(":")
+		name = name.lower()
+		if name not in ACCUMULATORS:
+			raise ValueError(f"Unknown aggregate: '{name}' (expected one of {', '.join(ACCUMULATORS)})")
+		if not col_name and name != "count":
+			raise ValueError(f"Missing column for aggregate: '{spec}'")
+		specs.append((name, col_name or None))
+	return specs
+
+
+def get_group_ids(keys):
+	"""
+	Group id for every key, in order of first appearance, and the key of every group.
+	"""
+	index = {}
+	group_ids = [index.setdefault(key, len(index)) for key in keys]
+	return group_ids, list(index)
+
+
+def get_runs(keys):
+	"""
+	Keys and lengths of the runs of equal keys, for keys that are already
+	sorted. Unlike get_group_ids nothing is kept per row.
+	"""
+	group_keys, lengths = [], []
+	for key, run in itertools.groupby(keys):
+		group_keys.append(key)
+		lengths.append(sum(1 for _ in run))
+	return group_keys, lengths
+
+
+def aggregate_columns(keys, columns, accumulators, is_sorted=False):
+	"""
+	Returns the group keys and a column of results for every accumulator.
+	:param keys: group key of every row
+	:param columns: values for every accumulator, None for a plain count
+	"""
+	if is_sorted:
+		group_keys, lengths = get_runs(keys)
+		get_ids = lambda: itertools.chain.from_iterable(map(itertools.repeat, range(len(lengths)), lengths))
+	else:
+		group_ids, group_keys = get_group_ids(keys)
+		get_ids = lambda: group_ids
+
+	results = []
+	for acc, values in zip(accumulators, columns):
+		acc.grow(len(group_keys))
+		acc.update(get_ids(), values)
+		results.append(acc.results())
+	return group_keys, results
@@ -0,0 +1,332 @@
+import array
+import collections.abc
+import weakref
+
+from .kernels import get_typecode, take_typed
+
+
+
+INT_MIN = -2 ** 63
+INT_MAX = 2 ** 63 - 1
+
+
+def get_column_kind(values):
+	"""
+	'int' or 'float' when every non-null value fits a typed array, 'object' otherwise.
+	"""
+	types = set(map(type, values))
+	has_nulls = type(None) in types
+	types.discard(type(None))
+	if types == {float}:
+		return "float"
+	elif types == {int}:
+		ints = [x for x in values if x is not None] if has_nulls else values
+		if INT_MIN <= min(ints) and max(ints) <= INT_MAX:
+			return "int"
+	return "object"
+
+
+class Column:
+	"""
+	One column of a table. Ints and floats live in typed arrays (8 bytes a cell)
+	with a null mask, anything else in a plain list. Columns mapped from a
+	.hot file hold read-only memoryviews instead, copied on the first change.
+	"""
+	def __init__(self, kind, values, nulls=None):
+		self.kind = kind
+		self.values = values
+		# bytearray with a 1 for every None, or None when there are no nulls
+		self.nulls = nulls
+
+	@classmethod
+	def from_values(cls, values):
+		kind = get_column_kind(values)
+		if kind == "object":
+			return cls(kind, list(values))
+
+		zero = 0 if kind == "int" else 0.0
+		nulls = None
+		if None in values:
+			nulls = bytearray(1 if value is None else 0 for value in values)
+			values = [zero if value is None else value for value in values]
+		return cls(kind, array.array("q" if kind == "int" else "d", values), nulls)
+
+	def __len__(self):
+		return len(self.values)
+
+	def get(self, idx):
+		if self.nulls is not None and self.nulls[idx]:
+			return None
+		return self.values[idx]
+
+	def fits(self, value):
+		if self.kind == "object":
+			return True
+		elif value is None:
+			return True
+		elif self.kind == "int":
+			return type(value) is int and INT_MIN <= value <= INT_MAX
+		return type(value) is float
+
+	def make_writable(self):
+		if isinstance(self.values, memoryview):
+			values = array.array(self.values.format)
+			values.frombytes(self.values.cast("B"))
+			self.values = values
+		if isinstance(self.nulls, memoryview):
+			self.nulls = bytearray(self.nulls)
+
+	def set(self, idx, value):
+		if not self.fits(value):
+			self.promote()
+		self.make_writable()
+		if self.kind == "object":
+			self.values[idx] = value
+		elif value is None:
+			if self.nulls is None:
+				self.nulls = bytearray(len(self.values))
+			self.nulls[idx] = 1
+		else:
+			self.values[idx] = value
+			if self.nulls is not None:
+				self.nulls[idx] = 0
+
+	def promote(self):
+		self.values = self.to_list()
+		self.kind = "object"
+		self.nulls = None
+
+	def to_list(self):
+		if self.kind == "object":
+			return self.values
+		values = self.values.tolist()
+		if self.nulls is not None:
+			values = [None if null else value for value, null in zip(values, self.nulls)]
+		return values
+
+	@classmethod
+	def from_array(cls, values):
+		return cls("int" if get_typecode(values) == "q" else "float", values)
+
+	def take(self, indices):
+		values = self.values
+		if self.kind == "object":
+			return Column(self.kind, list(map(values.__getitem__, indices)))
+		nulls = None
+		if self.nulls is not None:
+			nulls = bytearray(map(self.nulls.__getitem__, indices))
+		taken = take_typed(values, indices)
+		if taken is None:
+			taken = array.array(get_typecode(values), map(values.__getitem__, indices))
+		return Column(self.kind, taken, nulls)
+
+	def slice(self, s):
+		nulls = None if self.nulls is None else self.nulls[s]
+		return Column(self.kind, self.values[s], nulls)
+
+	def map(self, fn):
+		return Column.from_values([fn(value) for value in self.to_list()])
+
+	def reverse(self):
+		self.make_writable()
+		self.values.reverse()
+		if self.nulls is not None:
+			self.nulls.reverse()
+
+	def insert(self, idx, value):
+		if not self.fits(value):
+			self.promote()
+		self.make_writable()
+		if self.kind == "object":
+			self.values.insert(idx, value)
+			return
+		if value is not None or self.nulls is not None:
+			if self.nulls is None:
+				self.nulls = bytearray(len(self.values))
+			self.nulls.insert(idx, 1 if value is None else 0)
+		self.values.insert(idx, 0 if value is None else value)
+
+	def delete(self, idx):
+		self.make_writable()
+		del self.values[idx]
+		if self.nulls is not None:
+			del self.nulls[idx]
+
+
+class RowView(collections.abc.MutableSequence):
+	"""
+	Looks like a row list, reads and writes cells of a ColumnarRows.
+	Inserting or removing cells detaches the view into a list of its own.
+	"""
+	__slots__ = ("store", "idx", "local", "__weakref__")
+
+	def __init__(self, store, idx):
+		self.store = store
+		self.idx = idx
+		self.local = None
+
+	def __len__(self):
+		if self.local is not None:
+			return len(self.local)
+		return len(self.store.columns)
+
+	def __getitem__(self, cdx):
+		if self.local is not None:
+			return self.local[cdx]
+		if isinstance(cdx, slice):
+			return [column.get(self.idx) for column in self.store.columns[cdx]]
+		return self.store.columns[cdx].get(self.idx)
+
+	def __setitem__(self, cdx, value):
+		if self.local is None and isinstance(cdx, int):
+			self.store.columns[cdx].set(self.idx, value)
+		else:
+			self.detach()[cdx] = value
+
+	def __delitem__(self, cdx):
+		del self.detach()[cdx]
+
+	def insert(self, cdx, value):
+		self.detach().insert(cdx, value)
+
+	def __iter__(self):
+		if self.local is not None:
+			return iter(self.local)
+		idx = self.idx
+		return (column.get(idx) for column in self.store.columns)
+
+	def detach(self):
+		if self.local is None:
+			self.local = list(self)
+		return self.local
+
+	def __eq__(self, other):
+		if isinstance(other, (list, RowView)):
+			return list(self) == list(other)
+		return NotImplemented
+
+	def __repr__(self):
+		return repr(list(self))
+
+
+class ColumnarRows(collections.abc.MutableSequence):
+	"""
+	Table rows stored one column at a time, see Column.
+	Indexing gives RowViews, slicing gives another ColumnarRows.
+	"""
+	def __init__(self, columns, length=0):
+		self.columns = columns
+		self.length = len(columns[0]) if columns else length
+		# live views handed out by indexing (by id, they can't be hashed). A row
+		# that gets overwritten detaches its views first, so that they keep
+		# what they showed, as in rows[0], rows[1] = rows[1], rows[0]
+		self.views = {}
+
+	@classmethod
+	def from_rows(cls, rows, width):
+		columns = [Column.from_values([row[cdx] for row in rows]) for cdx in range(width)]
+		return cls(columns, len(rows))
+
+	def __len__(self):
+		return self.length
+
+	def __getitem__(self, idx):
+		if isinstance(idx, slice):
+			length = len(range(*idx.indices(self.length)))
+			return ColumnarRows([column.slice(idx) for column in self.columns], length)
+		if idx < 0:
+			idx += self.length
+		if not 0 <= idx < self.length:
+			raise IndexError("row index out of range")
+		view = RowView(self, idx)
+		key = id(view)
+		self.views[key] = weakref.ref(view, lambda ref, views=self.views, key=key: views.pop(key, None))
+		return view
+
+	def __setitem__(self, idx, row):
+		if isinstance(idx, slice):
+			raise TypeError("ColumnarRows does not support slice assignment")
+		row = list(row)
+		if len(row) != len(self.columns):
+			raise ValueError(f"Row has {len(row)} cells, table has {len(self.columns)} columns")
+		if idx < 0:
+			idx += self.length
+		for ref in list(self.views.values()):
+			view = ref()
+			if view is not None and view.idx == idx:
+				view.detach()
+		for column, value in zip(self.columns, row):
+			column.set(idx, value)
+
+	def __delitem__(self, idx):
+		if isinstance(idx, slice):
+			indices = sorted(range(*idx.indices(self.length)), reverse=True)
+		else:
+			indices = [idx + self.length if idx < 0 else idx]
+		for i in indices:
+			for column in self.columns:
+				column.delete(i)
+		self.length -= len(indices)
+
+	def insert(self, idx, row):
+		row = list(row)
+		if len(row) != len(self.columns):
+			raise ValueError(f"Row has {len(row)} cells, table has {len(self.columns)} columns")
+		for column, value in zip(self.columns, row):
+			column.insert(idx, value)
+		self.length += 1
+
+	def __iter__(self):
+		return (RowView(self, idx) for idx in range(self.length))
+
+	def reverse(self):
+		for column in self.columns:
+			column.reverse()
+
+	def take(self, indices):
+		indices = list(indices)
+		return ColumnarRows([column.take(indices) for column in self.columns], len(indices))
+
+	def select_columns(self, col_indexes):
+		return ColumnarRows([self.columns[cdx] for cdx in col_indexes], self.length)
+
+	def map_column(self, cdx, fn):
+		self.columns[cdx] = self.columns[cdx].map(fn)
+
+	def get_column_values(self, cdx):
+		return self.columns[cdx].to_list()
+
+	def to_columns(self):
+		return [column.to_list() for column in self.columns]
+
+	def to_lists(self):
+		if not self.columns:
+			return [[] for _ in range(self.length)]
+		return [list(row) for row in zip(*self.to_columns())]
+
+	@property
+	def nbytes(self):
+		total = 0
+		for column in self.columns:
+			if column.kind == "object":
+				total += 8 * len(column.values)
+			else:
+				total += column.values.itemsize * len(column.values)
+				total += len(column.nulls) if column.nulls is not None else 0
+		return total
+
+	def __repr__(self):
+		return f"ColumnarRows ({self.length} x {len(self.columns)})"
+
+
+def to_columnar(rows, width):
+	"""
+	ColumnarRows for the given row lists, or the rows as they are
+	when some row does not have exactly width cells.
+	"""
+	if isinstance(rows, ColumnarRows):
+		return rows
+	rows = list(rows)
+	if any(len(row) != width for row in rows):
+		return rows
+	return ColumnarRows.from_rows(rows, width)
@@ -1,24 +1,45 @@
+import contextlib
 import hashlib
+import io
 import json
 import os
-
-from bs4 import BeautifulSoup
-import pyperclip
-
-from .factory import create_table_from_table_tag, create_table_from_jo, create_table_from_csv
+import sys
+
+from .extractor import decode_html, iter_table_cells
+from .factory import create_table_from_cells, create_table_from_jo, create_table_from_csv
+from .factory import create_table_from_json_values, store_columnar
+from .hot_format import is_hot_file, iter_hot_tables, save_hot_file
+from .joins import JOIN_TYPES
+from .json_loader import JsonTableReader, LazyRows, TableFilterError, close_json_buffer, open_json_buffer
 from .table import HotTable
+from .table_cache import get_table_cache, get_content_hash, get_recent_tables
+from .table_index import build_table_index, select_tables
 from .time_machine import TimeMachine
-from ..fetch import get_page_html
-from ..output import document_to_html5, document_to_html, document_to_xml
-from ..utils import filter_list
+from ..output import write_document_html5
+from ..utils import filter_list, open_replacing
+from ..writers import CsvWriter, HtmlWriter, JsonWriter, TableTextWriter, XmlWriter, write_document
 
 
 
+def load_table_values_from_file(args, input_path):
+	# runs in a worker process, hands back plain lists and whatever got printed
+	output = io.StringIO()
+	with contextlib.redirect_stdout(output):
+		hotdoc = HotDocument(args)
+		try:
+			hotdoc.add_hot_tables_from_file(input_path)
+		except Exception as e:
+			print(e)
+	return [table.values for table in hotdoc.tables], output.getvalue()
+
+
 class HotDocument:
 	def __init__(self, args):
 		self.args = args
 		self.tables = []
 		self.time_machine = TimeMachine(self)
+		# JSON files still mapped for the --lazy rows read from them, by absolute path
+		self.json_buffers = {}
 
 	@property
 	def table_count(self):
@@ -39,60 +60,208 @@ class HotDocument:
 		doc_json = self.json_text
 		return hashlib.md5(doc_json.encode()).hexdigest()
 
+	@property
+	def fingerprint(self):
+		"""
+		Changes whenever a table changes, cheap for tables that did not (see HotTable.fingerprint).
+		"""
+		return tuple(table.fingerprint for table in self.tables)
+
 	def empty_document(self):
 		self.tables = []
 
 	def load_document(self, json_path="hotdoc.json"):
-		self.add_hot_tables_from_json_file(json_path)
+		if is_hot_file(json_path):
+			self.add_hot_tables_from_hot_file(json_path, apply_filters=False)
+		else:
+			self.add_hot_tables_from_json_file(json_path)
 
 	def save_document(self, json_path="hotdoc.json"):
 		if not self.tables: return
-		with open(json_path, "w") as f:
-			f.write(self.json_text)
+		if is_hot_file(json_path):
+			save_hot_file(json_path, self.tables)
+		else:
+			self.release_json_buffer(json_path)
+			with open_replacing(json_path) as f:
+				write_document(self, JsonWriter(self, f))
 		print(f"Saved: '{json_path}' ({self.table_count} tables)")
 
 	def add_hot_tables_from_args(self, input_paths):
 		if self.args.paste:
+			import pyperclip
 			html = pyperclip.paste()
 			self.add_hot_tables_from_html(html)
 
 		if self.args.paste_path:
+			import pyperclip
 			path_in_clipboard = pyperclip.paste()
 			input_paths.append(path_in_clipboard)
 
-		for input_path in input_paths:
-			if os.path.isfile(input_path):
-				self.add_hot_tables_from_file(input_path)
-			elif input_path.startswith("-"):
-				print(f"Unknown flag: '{input_path}'")
-			elif "." in input_path:
-				html = get_page_html(input_path, fetch=self.args.fetch, cache=self.args.cache)
-				self.add_hot_tables_from_html(html)
-			else:
-				print(f"File not found: '{input_path}'")
-				return
+		if self.can_filter_tables_while_loading(input_paths):
+			# a lone JSON input can skip unwanted tables without decoding them
+			self.add_hot_tables_from_json_file(input_paths[0], tables_filter=self.args.t2)
+			return
+
+		url_tables = self.get_hot_tables_from_urls(input_paths)
+		recent_tables = get_recent_tables()
+		with self.start_file_loaders(input_paths) as loaders:
+			for idx, input_path in enumerate(input_paths):
+				if idx in loaders:
+					self.add_hot_tables_from_loader(loaders[idx])
+				elif recent_tables is not None and os.path.isfile(input_path) and not is_hot_file(input_path):
+					self.add_hot_tables_from_recent(recent_tables, input_path)
+				elif os.path.isfile(input_path):
+					self.add_hot_tables_from_file(input_path)
+				elif input_path.startswith("-"):
+					print(f"Unknown flag: '{input_path}'")
+				elif idx in url_tables:
+					self.tables.extend(url_tables[idx])
+				else:
+					print(f"File not found: '{input_path}'")
+					return
 
 		self.tables = filter_list(self.tables, self.args.t2)
 
+	def can_filter_tables_while_loading(self, input_paths):
+		args = self.args
+		bounds = [args.min_rows, args.max_rows, args.exact_rows, args.min_cols, args.max_cols, args.exact_cols]
+		return (
+			len(input_paths) == 1 and input_paths[0].endswith(".json")
+			and os.path.isfile(input_paths[0])
+			and not args.paste and all(x is None for x in bounds)
+		)
+
+	def is_url(self, input_path):
+		return not os.path.isfile(input_path) and not input_path.startswith("-") and "." in input_path
+
+	def get_hot_tables_from_urls(self, input_paths):
+		url_indexes = [idx for idx, path in enumerate(input_paths) if self.is_url(path)]
+		if not url_indexes:
+			return {}
+
+		# requests and bs4 are only imported once there is a URL to fetch
+		from ..fetch import get_fetcher
+
+		args = self.args
+		fetcher = get_fetcher(
+			concurrency=args.concurrency, per_host=args.per_host,
+			rate=args.rate, retries=args.retries, timeout=args.timeout,
+			cache_dir=args.cache_dir, cache_size=args.cache_size
+		)
+		page_urls = [input_paths[idx] for idx in url_indexes]
+
+		url_tables = {}
+		# pages get parsed as soon as they land, tables are put back in input order later
+		for n, html, error in fetcher.get_pages(page_urls, fetch=args.fetch, cache=args.cache, max_age=args.max_age):
+			idx = url_indexes[n]
+			if error:
+				print(f"Failed to fetch '{input_paths[idx]}': {error}")
+				url_tables[idx] = []
+			elif isinstance(html, str):
+				url_tables[idx] = self.get_hot_tables_from_html(html)
+			else:
+				with html:
+					url_tables[idx] = self.get_hot_tables_from_html(html)
+		return url_tables
+
+	@contextlib.contextmanager
+	def start_file_loaders(self, input_paths):
+		file_indexes = [idx for idx, path in enumerate(input_paths) if os.path.isfile(path)]
+		if self.args.jobs <= 1 or len(file_indexes) < 2:
+			yield {}
+			return
+
+		import concurrent.futures
+		with concurrent.futures.ProcessPoolExecutor(max_workers=self.args.jobs) as executor:
+			loaders = {
+				idx: executor.submit(load_table_values_from_file, self.args, input_paths[idx])
+				for idx in file_indexes
+			}
+			try:
+				yield loaders
+			finally:
+				for loader in loaders.values():
+					loader.cancel()
+
+	def add_hot_tables_from_loader(self, loader):
+		table_values, output = loader.result()
+		print(output, end="")
+		for headers, rows in table_values:
+			self.tables.append(self.create_table_from_values(headers, rows))
+
+	def add_hot_tables_from_recent(self, recent_tables, input_path):
+		# in serve mode files that did not change since the last command are not parsed again
+		key = recent_tables.get_key(input_path, self.args)
+		entry = recent_tables.get(key)
+		if entry is not None:
+			table_values, output = entry
+			print(output, end="")
+			for headers, rows in table_values:
+				self.tables.append(self.create_table_from_values(headers, rows))
+			return
+
+		table_count = len(self.tables)
+		output = io.StringIO()
+		try:
+			with contextlib.redirect_stdout(output):
+				self.add_hot_tables_from_file(input_path)
+		finally:
+			print(output.getvalue(), end="")
+		recent_tables.put(key, [table.values for table in self.tables[table_count:]], output.getvalue())
+
 	def add_hot_tables_from_file(self, input_path: str):
 		if input_path.endswith(".csv"):
 			self.add_hot_tables_from_csv_file(input_path)
 		elif input_path.endswith(".json"):
 			self.add_hot_tables_from_json_file(input_path)
+		elif is_hot_file(input_path):
+			self.add_hot_tables_from_hot_file(input_path)
 		else:
-			with open(input_path) as f:
-				html = f.read()
-			self.add_hot_tables_from_html(html)
+			with open(input_path, "rb") as f:
+				self.add_hot_tables_from_html(f)
 
 	def add_hot_tables_from_csv_file(self, input_path):
 		table = create_table_from_csv(self, input_path)
 		if table and table.is_acceptable():
 			self.tables.append(table)
 
-	def add_hot_tables_from_json_file(self, json_path):
-		with open(json_path) as f:
-			jo = json.load(f)
-		self.add_hot_tables_from_jo(jo)
+	def add_hot_tables_from_json_file(self, json_path, tables_filter=None):
+		rows_filter = self.args.r1
+		if rows_filter is None and self.args.row_limit is not None:
+			rows_filter = str(self.args.row_limit)
+		self.release_json_buffer(json_path)
+		buf = open_json_buffer(json_path)
+		reader = JsonTableReader(
+			buf, tables_filter=tables_filter,
+			rows_filter=rows_filter, cols_filter=self.args.c1, lazy=self.args.lazy
+		)
+		try:
+			for headers, rows in reader.iter_tables():
+				table = create_table_from_json_values(self, headers, rows)
+				if table.is_acceptable():
+					self.tables.append(table)
+		except TableFilterError as e:
+			print(e)
+		except ValueError as e:
+			print(f"Bad JSON in '{json_path}': {e}")
+
+		if self.args.lazy:
+			self.json_buffers[os.path.abspath(json_path)] = buf
+		else:
+			close_json_buffer(buf)
+
+	def release_json_buffer(self, json_path):
+		"""
+		Decodes the lazy rows still read from a mapped JSON file and unmaps
+		it, before the file gets replaced.
+		"""
+		buf = self.json_buffers.pop(os.path.abspath(json_path), None)
+		if buf is None:
+			return
+		for table in self.tables:
+			if isinstance(table.rows, LazyRows) and table.rows.scanner.buf is buf:
+				table.rows.materialize()
+		close_json_buffer(buf)
 
 	def add_hot_tables_from_json_text(self, json_text):
 		jo = json.loads(json_text)
@@ -106,6 +275,33 @@ class HotDocument:
 		except Exception as e:
 			print(e)
 
+	def add_hot_tables_from_hot_file(self, hot_path, apply_filters=True):
+		"""
+		Tables of a .hot file, with columns that are only read when used.
+		"""
+		args = self.args
+		try:
+			hot_tables = list(iter_hot_tables(hot_path))
+		except (OSError, ValueError) as e:
+			print(f"Can't load '{hot_path}': {e}")
+			return
+		for headers, rows in hot_tables:
+			table = HotTable(self)
+			table.headers, table.rows = headers, rows
+			if apply_filters:
+				rows_filter = args.r1 if args.r1 is not None or args.row_limit is None else str(args.row_limit)
+				table.rows = filter_list(table.rows, rows_filter)
+				if args.c1:
+					col_indexes = filter_list(list(range(table.col_count)), args.c1)
+					table.headers = [table.headers[cdx] for cdx in col_indexes]
+					if table.is_columnar:
+						table.rows = table.rows.select_columns(col_indexes)
+					else:
+						table.rows = [[row[cdx] for cdx in col_indexes] for row in table.rows]
+				if not table.is_acceptable():
+					continue
+			self.tables.append(table)
+
 	def add_hot_tables_from_jo(self, jo):
 		if "tables" in jo:
 			for table_jo in jo["tables"]:
@@ -115,18 +311,66 @@ class HotDocument:
 		elif "data" in jo and "headers" in jo:
 			self.add_hot_table_from_jo(jo)
 
-	def add_hot_tables_from_html(self, html: str):
-		soup = BeautifulSoup(html, "lxml")
-		table_tags = soup.find_all("table")
-		table_tags = filter_list(table_tags, self.args.t1)
+	@property
+	def needs_table_index(self):
+		args = self.args
+		selectors = [args.t1, args.table_id, args.table_class, args.caption]
+		bounds = [args.min_rows, args.max_rows, args.exact_rows, args.min_cols, args.max_cols, args.exact_cols]
+		return any(x is not None for x in selectors + bounds)
+
+	def select_table_cells(self, html):
+		if not isinstance(html, (str, bytes)):
+			html = html.read()
+		if isinstance(html, bytes):
+			html = decode_html(html)
+		index = build_table_index(html)
+		for info in select_tables(index, self.args):
+			# the first table in a slice is the selected one, the rest are nested in it
+			for cells in iter_table_cells(html[info.start:info.end]):
+				yield cells
+				break
+
+	def get_hot_tables_from_html(self, html):
+		if not self.args.cache:
+			return self.extract_hot_tables(html)
+
+		if not isinstance(html, (str, bytes)):
+			html = html.read()
+		table_cache = get_table_cache(self.args.cache_dir, self.args.cache_size)
+		key = table_cache.get_key(get_content_hash(html), self.args)
+		table_values = table_cache.get(key)
+		if table_values is not None:
+			return [self.create_table_from_values(headers, rows) for headers, rows in table_values]
+
+		tables = self.extract_hot_tables(html)
+		table_cache.put(key, [table.values for table in tables])
+		return tables
+
+	def extract_hot_tables(self, html):
+		if self.needs_table_index:
+			table_cells = self.select_table_cells(html)
+		else:
+			table_cells = iter_table_cells(html)
 
-		for table_tag in table_tags:
+		tables = []
+		for headers, rows in table_cells:
 			try:
-				table = create_table_from_table_tag(self, table_tag)
-				if table.is_acceptable():
-					self.tables.append(table)
+				table = create_table_from_cells(self, headers, rows)
+				if table and table.is_acceptable():
+					tables.append(table)
 			except Exception as e:
 				print(e)
+		return tables
+
+	def create_table_from_values(self, headers, rows):
+		table = HotTable(self)
+		table.headers = headers
+		table.rows = rows
+		store_columnar(self, table)
+		return table
+
+	def add_hot_tables_from_html(self, html):
+		self.tables.extend(self.get_hot_tables_from_html(html))
 
 	def longest_tables(self):
 		n = max(t.row_count for t in self.tables)
@@ -136,14 +380,24 @@ class HotDocument:
 		n = max(t.col_count for t in self.tables)
 		return [t for t in self.tables if t.col_count == n]
 
-	def union_tables(self):
-		col_counts = set(t.col_count for t in self.tables)
-		combined_tables = []
-		for col_count in col_counts:
-			matching_tables = [t for t in self.tables if t.col_count == col_count]
-			combined_table = sum(matching_tables[1:], matching_tables[0])
-			combined_tables.append(combined_table)
-		self.tables = combined_tables
+	def union_tables(self, args=None):
+		"""
+		Combines tables with the same number of cols, or with 'names' as
+		the arg, tables with the same headers in any order.
+		"""
+		by_name = bool(args) and args[0] == "names"
+		if args and not by_name:
+			print(f"Bad union arg: '{args[0]}' (expected nothing or 'names')")
+			return
+
+		groups = {}
+		if by_name:
+			for table in self.tables:
+				groups.setdefault((table.col_count, frozenset(table.headers_lower)), []).append(table)
+		else:
+			for col_count in set(t.col_count for t in self.tables):
+				groups[col_count] = [t for t in self.tables if t.col_count == col_count]
+		self.tables = [HotTable.concat(matching_tables, by_name=by_name) for matching_tables in groups.values()]
 
 	def join_tables(self):
 		row_counts = set(t.row_count for t in self.tables)
@@ -156,6 +410,26 @@ class HotDocument:
 			joined_tables.append(joined_table)
 		self.tables = joined_tables
 
+	def join_tables_on(self, args):
+		if not args:
+			print(f"Missing join columns, expected something like: --join-on id left")
+			return
+		key_arg = args[0]
+		how = args[1] if len(args) > 1 else "inner"
+		if how not in JOIN_TYPES:
+			print(f"Bad join type: '{how}' (expected one of {', '.join(JOIN_TYPES)})")
+			return
+		if self.table_count < 2:
+			print(f"Need at least 2 tables to join, found {self.table_count}")
+			return
+
+		joined = self.tables[0]
+		for table in self.tables[1:]:
+			joined = joined.join_on(table, key_arg, how=how)
+			if joined is None:
+				return
+		self.tables = [joined]
+
 	def print_tables(self, n=None):
 		if not n:
 			n = 10 if self.table_count == 1 else 5
@@ -167,38 +441,51 @@ class HotDocument:
 		for table in self.tables:
 			print(table)
 
-	def get_output_text(self):
+	def get_writer(self, stream):
 		if self.args.json:
-			return self.json_text
-		elif self.args.html5:
-			return document_to_html5(self)
+			return JsonWriter(self, stream)
 		elif self.args.html:
-			return document_to_html(self)
+			return HtmlWriter(self, stream)
 		elif self.args.xml:
-			return document_to_xml(self)
+			return XmlWriter(self, stream)
+		elif self.args.csv:
+			return CsvWriter(self, stream)
+		return TableTextWriter(self, stream)
+
+	def write_output(self, stream):
+		"""
+		Writes the output a batch of rows at a time, without building it as one string.
+		"""
+		if self.args.html5 and not self.args.json:
+			write_document_html5(self, stream)
 		else:
-			return "\n".join([t.get_output_text() for t in self.tables])
+			write_document(self, self.get_writer(stream))
+
+	def get_output_text(self):
+		output = io.StringIO()
+		self.write_output(output)
+		return output.getvalue()
 
 	def produce_output(self):
 		if self.args.summary:
 			self.print_summary()
 			return
 
-		output_text = self.get_output_text()
-		if self.args.cut:
-			pyperclip.copy(output_text)
-			print(f"Put output into clipboard.")
-			return
-		elif self.args.copy:
-			pyperclip.copy(output_text)
+		if self.args.cut or self.args.copy:
+			import pyperclip
+			pyperclip.copy(self.get_output_text())
+			if self.args.cut:
+				print(f"Put output into clipboard.")
+				return
 			print(f"Copied output to clipboard.")
 
 		if self.args.output:
 			with open(self.args.output, "w") as f:
-				f.write(output_text)
+				self.write_output(f)
 			print(f"Saved: '{self.args.output}' ({len(self.tables)} tables)")
 		else:
-			print(output_text)
+			self.write_output(sys.stdout)
+			sys.stdout.write("\n")
 
 	@property
 	def is_empty(self):
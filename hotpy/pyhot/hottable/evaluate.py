@@ -1,28 +1,115 @@
-import re
+import ast
+import builtins
 
 
 
 alphabet = "abcdefghijklmnopqrstuvwxyz"
 alphabet_upper = alphabet.upper()
 
-def transform_template(template, arr):
-	for ch, val in zip(alphabet, arr):
-		if ch in template:
-			template = template.replace(ch, str(val))
-
-	for ch_upper, val in zip(alphabet_upper, reversed(arr)):
-		if ch_upper in template:
-			template = template.replace(ch_upper, str(val))
-	return template
-
-def evaluate_expression(expression: str, arr: list):
-	try:
-		return eval(expression)
-	except Exception as e:
-		print(f"Error evaluating expression '{expression}': {e}")
-		return 0
-
-def evaluate_template(template: str, arr: list):
-	expression = transform_template(template, arr)
-	return evaluate_expression(expression, arr)
+# all that templates get to see besides their columns
+TEMPLATE_BUILTINS = [
+	"abs", "all", "any", "bool", "chr", "divmod", "float", "format", "hex", "int",
+	"len", "list", "max", "min", "oct", "ord", "pow", "range", "repr", "reversed",
+	"round", "sorted", "str", "sum", "tuple", "zip",
+]
+TEMPLATE_NAMESPACE = {"__builtins__": {name: getattr(builtins, name) for name in TEMPLATE_BUILTINS}}
+
+
+class ColumnResolver(ast.NodeTransformer):
+	"""
+	Replaces column references with the arguments of the compiled template:
+	a, b, c... count from the first column, A, B, C... from the last one,
+	and header names can be used when they are valid identifiers
+	that do not shadow a builtin templates can use.
+	"""
+	def __init__(self, headers):
+		self.headers = headers
+		self.headers_lower = [str(h).lower() for h in headers]
+		self.col_indexes = []
+
+	def get_column_index(self, name):
+		width = len(self.headers)
+		if len(name) == 1 and name in alphabet:
+			n = alphabet.index(name)
+			return n if n < width else None
+		elif len(name) == 1 and name in alphabet_upper:
+			n = width - (1 + alphabet_upper.index(name))
+			return n if n >= 0 else None
+		elif name.lower() in self.headers_lower and name not in TEMPLATE_BUILTINS:
+			return self.headers_lower.index(name.lower())
+		return None
+
+	def visit_Name(self, node):
+		cdx = self.get_column_index(node.id)
+		if cdx is None:
+			return node
+		if cdx not in self.col_indexes:
+			self.col_indexes.append(cdx)
+		arg_name = f"_c{self.col_indexes.index(cdx)}"
+		return ast.copy_location(ast.Name(id=arg_name, ctx=node.ctx), node)
+
+
+ARITHMETIC_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div)
+
+def is_arithmetic(node):
+	"""
+	True for templates made of column references, numbers and + - * / only.
+	"""
+	if isinstance(node, ast.Expression):
+		return is_arithmetic(node.body)
+	elif isinstance(node, ast.BinOp):
+		return isinstance(node.op, ARITHMETIC_OPS) and is_arithmetic(node.left) and is_arithmetic(node.right)
+	elif isinstance(node, ast.UnaryOp):
+		return isinstance(node.op, (ast.USub, ast.UAdd)) and is_arithmetic(node.operand)
+	elif isinstance(node, ast.Constant):
+		return type(node.value) in (int, float)
+	elif isinstance(node, ast.Name):
+		return node.id.startswith("_c")
+	return False
+
+
+class Template:
+	"""
+	A --template expression, parsed and compiled once for a table's headers.
+	The compiled function takes the referenced column values as arguments.
+	"""
+	def __init__(self, template, headers):
+		self.template = template
+		resolver = ColumnResolver(headers)
+		self.tree = resolver.visit(ast.parse(template.strip(), mode="eval"))
+		self.col_indexes = resolver.col_indexes
+
+		args = [ast.arg(arg=f"_c{i}") for i in range(len(self.col_indexes))]
+		lambda_node = ast.Lambda(
+			args=ast.arguments(posonlyargs=[], args=args, kwonlyargs=[], kw_defaults=[], defaults=[]),
+			body=self.tree.body
+		)
+		expression = ast.fix_missing_locations(ast.Expression(body=lambda_node))
+		self.function = eval(compile(expression, f"<template {template}>", "eval"), TEMPLATE_NAMESPACE)
+
+	@property
+	def is_arithmetic(self):
+		return bool(self.col_indexes) and is_arithmetic(self.tree)
+
+	def evaluate_columns(self, columns, row_count):
+		"""
+		Returns (values, errors) for the given column values, errors being
+		(row number, exception) pairs. Rows that fail get a 0.
+		"""
+		function = self.function
+		try:
+			if not columns:
+				return [function() for _ in range(row_count)], []
+			return list(map(function, *columns)), []
+		except Exception:
+			pass
+
+		values, errors = [], []
+		for i, args in enumerate(zip(*columns) if columns else [()] * row_count):
+			try:
+				values.append(function(*args))
+			except Exception as e:
+				values.append(0)
+				errors.append((i, e))
+		return values, errors
 
@@ -0,0 +1,141 @@
+import codecs
+import io
+import re
+
+
+
+ROW_GROUPS = ("thead", "tbody", "tfoot")
+SKIPPED_TAGS = ("script", "style")
+
+
+def get_cell_text(cell):
+	parts = []
+	def collect(el):
+		if isinstance(el.tag, str) and el.tag not in SKIPPED_TAGS:
+			parts.append(el.text or "")
+			for child in el:
+				collect(child)
+		if el is not cell:
+			parts.append(el.tail or "")
+	collect(cell)
+	return "".join(parts).strip()
+
+
+def get_row_cells(tr):
+	# only direct children, so cells of nested tables are never picked up
+	cells = [cell for cell in tr if cell.tag == "th"]
+	if not cells:
+		cells = [cell for cell in tr if cell.tag == "td"]
+	return [get_cell_text(cell) for cell in cells]
+
+
+def get_direct_rows(parent):
+	return [child for child in parent if child.tag == "tr"]
+
+
+def get_table_cells(table):
+	groups = {}
+	for child in table:
+		if child.tag in ROW_GROUPS and child.tag not in groups:
+			groups[child.tag] = child
+
+	thead = groups.get("thead")
+	tbody = groups.get("tbody")
+	if thead is not None and tbody is not None:
+		header_rows = get_direct_rows(thead)
+		if not header_rows: return ([], [])
+		headers = get_row_cells(header_rows[0])
+		tr_tags = get_direct_rows(tbody)
+	else:
+		tr_tags = []
+		for child in table:
+			if child.tag == "tr":
+				tr_tags.append(child)
+			elif child.tag in ROW_GROUPS:
+				tr_tags.extend(get_direct_rows(child))
+		if not tr_tags: return ([], [])
+		headers = get_row_cells(tr_tags[0])
+		tr_tags = tr_tags[1:]
+
+	rows = [get_row_cells(tr) for tr in tr_tags]
+	return (headers, rows)
+
+
+def free_element(el):
+	el.clear()
+	while el is not None:
+		while el.getprevious() is not None:
+			del el.getparent()[0]
+		el = el.getparent()
+
+
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="...; charset=...">
+CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE)
+CHARSET_SNIFF_SIZE = 4096
+
+
+def get_declared_encoding(head):
+	"""
+	The charset HTML bytes declare near their start, else utf-8.
+	"""
+	match = CHARSET_PATTERN.search(head[:CHARSET_SNIFF_SIZE])
+	if match:
+		try:
+			return codecs.lookup(match.group(1).decode("ascii")).name
+		except LookupError:
+			pass
+	return "utf-8"
+
+
+def decode_html(data):
+	return data.decode(get_declared_encoding(data), errors="replace")
+
+
+def to_stream(source):
+	if isinstance(source, str):
+		return io.BytesIO(source.encode("utf-8")), "utf-8"
+	elif isinstance(source, bytes):
+		return io.BytesIO(source), get_declared_encoding(source)
+	elif isinstance(source, io.TextIOWrapper):
+		# text files (like the gzipped page cache) are parsed from their raw bytes
+		return source.buffer, source.encoding
+	elif hasattr(source, "peek"):
+		return source, get_declared_encoding(source.peek(CHARSET_SNIFF_SIZE))
+	return source, "utf-8"
+
+
+def iter_table_cells(source):
+	"""
+	Yields (headers, rows) for every <table> in document order.
+	:param source: HTML as str/bytes, a binary file object or a text file
+	"""
+	# lxml is only needed for HTML inputs, not at startup
+	from lxml import etree
+
+	stream, encoding = to_stream(source)
+	events = etree.iterparse(
+		stream, events=("start", "end"), tag="table",
+		html=True, encoding=encoding
+	)
+
+	depth = 0
+	pending = []
+	try:
+		for event, table in events:
+			if event == "start":
+				pending.append(None)
+				table.set("data-hot-position", str(len(pending) - 1))
+				depth += 1
+				continue
+
+			depth -= 1
+			position = int(table.attrib.pop("data-hot-position"))
+			pending[position] = get_table_cells(table)
+			if depth == 0:
+				# outer table and its nested tables are done, hand them out in start order
+				yield from pending
+				pending = []
+				free_element(table)
+	except etree.XMLSyntaxError:
+		# lxml raises on empty documents
+		return
@@ -1,52 +1,52 @@
 import csv
+import itertools
 
+from .inference import get_column_converters, infer_column_types
+from .json_loader import LazyRows
 from .table import HotTable
 from ..utils import filter_list
-from ..utils import is_int, is_float
 
 
 
-def get_row_cols(tr, cols_filter):
-	cells = tr.find_all("th")
-	if not cells:
-		cells = tr.find_all("td")
-	data = [cell.text.strip() for cell in cells]
-	data = filter_list(data, cols_filter)
-	return data
+# rows a --lazy table infers its types from, unless --infer-sample says otherwise
+LAZY_INFER_SAMPLE = 1000
 
+def infer_types(document, rows):
+	args = document.args
+	if not args.no_infer:
+		infer_column_types(rows, sample=args.infer_sample)
 
-def create_table_from_table_tag(document, table_tag):
+def infer_lazy_types(document, rows):
+	# types from the first rows only, the others are checked as they are decoded
 	args = document.args
-	thead = table_tag.find("thead")
-	tbody = table_tag.find("tbody")
+	if not args.no_infer:
+		sample = min(args.infer_sample or LAZY_INFER_SAMPLE, len(rows))
+		rows.converters = get_column_converters(list(rows.iter_read(sample)))
 
-	if thead and tbody:
-		headers = get_row_cols(thead.find('tr'), args.c1)
-		tr_tags = tbody.find_all("tr")
-	else:
-		tr_tags = table_tag.find_all("tr")
-		headers = get_row_cols(tr_tags[0], args.c1)
-		tr_tags = tr_tags[1:]
-
-	tr_tags = filter_list(tr_tags, args.r1)
-	rows = [get_row_cols(tr, args.c1) for tr in tr_tags]
-
-	n_cols = len(rows[0])
-	rows_are_uniform = all(len(row) == n_cols for row in rows)
-	if rows_are_uniform:
-		for n in range(n_cols):
-			all_values_are_int = all(is_int(row[n]) for row in rows)
-			all_values_are_float = all(is_float(row[n]) for row in rows)
-			if all_values_are_int:
-				for row in rows:
-					row[n] = int(row[n])
-			elif all_values_are_float:
-				for row in rows:
-					row[n] = float(row[n])
+def limit_rows(document, rows):
+	# set when the plan starts with --head, see Plan.push_limit_into_loading
+	limit = document.args.row_limit
+	return rows if limit is None else rows[:limit]
+
+def store_columnar(document, hot_table):
+	if document.args.columnar:
+		hot_table.make_columnar()
+
+
+def create_table_from_cells(document, headers, rows):
+	args = document.args
+	headers = filter_list(headers, args.c1)
+	rows = limit_rows(document, filter_list(rows, args.r1))
+	rows = [filter_list(row, args.c1) for row in rows]
+	if not rows:
+		return None
+
+	infer_types(document, rows)
 
 	hot_table = HotTable(document)
 	hot_table.headers = headers
 	hot_table.rows = rows
+	store_columnar(document, hot_table)
 	return hot_table
 
 
@@ -55,6 +55,21 @@ def create_table_from_jo(document, table_jo):
 	hot_table.headers = table_jo["headers"]
 	hot_table.rows = table_jo["data"]
 	hot_table.perform_c1_r1_filtering()
+	hot_table.rows = limit_rows(document, hot_table.rows)
+	infer_types(document, hot_table.rows)
+	store_columnar(document, hot_table)
+	return hot_table
+
+def create_table_from_json_values(document, headers, rows):
+	# rows come already filtered by --r1/--c1
+	hot_table = HotTable(document)
+	hot_table.headers = headers
+	hot_table.rows = limit_rows(document, rows)
+	if isinstance(hot_table.rows, LazyRows):
+		infer_lazy_types(document, hot_table.rows)
+	else:
+		infer_types(document, hot_table.rows)
+		store_columnar(document, hot_table)
 	return hot_table
 
 def create_table_from_csv(document, csv_path):
@@ -63,9 +78,15 @@ def create_table_from_csv(document, csv_path):
 		with open(csv_path, 'r') as file:
 			csv_reader = csv.reader(file)
 			hot_table.headers = next(csv_reader)
-			hot_table.rows = list(csv_reader)
+			if document.args.r1 is None and document.args.row_limit is not None:
+				hot_table.rows = list(itertools.islice(csv_reader, document.args.row_limit))
+			else:
+				hot_table.rows = list(csv_reader)
 
 		hot_table.perform_c1_r1_filtering()
+		hot_table.rows = limit_rows(document, hot_table.rows)
+		infer_types(document, hot_table.rows)
+		store_columnar(document, hot_table)
 		return hot_table
 	except Exception as e:
 		return None
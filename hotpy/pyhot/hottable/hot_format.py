@@ -0,0 +1,231 @@
+import array
+import itertools
+import json
+import mmap
+import os
+import struct
+
+from .columnar import Column, ColumnarRows, to_columnar
+from ..utils import open_replacing
+
+
+
+# a .hot file: MAGIC, the offset and size of the schema (two little endian
+# uint64s), then 8 byte aligned column blocks, then the schema as JSON
+MAGIC = b"HOTDOC\x00\x01"
+PREAMBLE = struct.Struct("<8sQQ")
+ALIGNMENT = 8
+
+
+def is_hot_file(path):
+	return path.endswith(".hot")
+
+
+def get_object_kind(values):
+	"""
+	How an object column is stored: 'str' or 'bool' when every non-null
+	value is one, 'json' for anything else.
+	"""
+	types = set(map(type, values))
+	types.discard(type(None))
+	if types == {str}:
+		return "str"
+	elif types == {bool}:
+		return "bool"
+	return "json"
+
+
+def encode_values(kind, values):
+	if kind == "str":
+		return [b"" if value is None else value.encode("utf-8", "surrogatepass") for value in values]
+	return [json.dumps(value, default=str).encode("utf-8") for value in values]
+
+
+def decode_values(kind, offsets, blob):
+	if kind == "str":
+		texts = [bytes(blob[start:end]).decode("utf-8", "surrogatepass") for start, end in zip(offsets, offsets[1:])]
+	else:
+		texts = [json.loads(bytes(blob[start:end])) for start, end in zip(offsets, offsets[1:])]
+	return texts
+
+
+class HotFileWriter:
+	def __init__(self, f):
+		self.f = f
+		self.position = PREAMBLE.size
+
+	def write_block(self, data):
+		"""
+		Writes bytes (or anything with the buffer protocol) and returns [offset, size].
+		"""
+		data = memoryview(data).cast("B")
+		padding = -self.position % ALIGNMENT
+		if padding:
+			self.f.write(b"\x00" * padding)
+			self.position += padding
+		offset = self.position
+		self.f.write(data)
+		self.position += len(data)
+		return [offset, len(data)]
+
+	def write_column(self, column):
+		if column.kind != "object":
+			spec = {"kind": column.kind, "values": self.write_block(column.values)}
+			spec["nulls"] = self.write_block(column.nulls) if column.nulls is not None else None
+			return spec
+
+		values = column.values
+		kind = get_object_kind(values)
+		nulls = None
+		if None in values:
+			nulls = bytearray(1 if value is None else 0 for value in values)
+		if kind == "bool":
+			flags = bytes(1 if value else 0 for value in values)
+			return {"kind": kind, "values": self.write_block(flags), "nulls": self.write_block(nulls) if nulls else None}
+
+		encoded = encode_values(kind, values)
+		offsets = array.array("q", itertools.accumulate(map(len, encoded), initial=0))
+		spec = {"kind": kind, "offsets": self.write_block(offsets), "values": self.write_block(b"".join(encoded))}
+		spec["nulls"] = self.write_block(nulls) if kind == "str" and nulls else None
+		return spec
+
+	def write_table(self, table):
+		rows = table.rows
+		width = len(table.headers)
+		if not isinstance(rows, ColumnarRows):
+			rows = to_columnar(rows, width)
+		if not isinstance(rows, ColumnarRows):
+			# rows of different widths are kept as one JSON value per row
+			column = Column("object", list(map(list, rows)))
+			return {"headers": list(table.headers), "length": len(rows), "ragged": True, "columns": [self.write_column(column)]}
+
+		columns = [self.write_column(column) for column in rows.columns]
+		return {"headers": list(table.headers), "length": len(rows), "ragged": False, "columns": columns}
+
+	def write(self, tables):
+		self.f.write(PREAMBLE.pack(MAGIC, 0, 0))
+		schema = {"version": 1, "tables": [self.write_table(table) for table in tables]}
+		schema_offset, schema_size = self.write_block(json.dumps(schema).encode("utf-8"))
+		self.f.seek(0)
+		self.f.write(PREAMBLE.pack(MAGIC, schema_offset, schema_size))
+
+
+def save_hot_file(path, tables):
+	"""
+	Saves tables (anything with headers and rows) as a .hot file.
+	"""
+	# the tables may be mapped from the file being replaced, which a new
+	# file moved over it leaves be
+	with open_replacing(path, "wb") as f:
+		HotFileWriter(f).write(tables)
+
+
+class MappedColumn(Column):
+	"""
+	A column of a mapped .hot file, or a window of its rows. Its values are
+	only read from the mapping (and so paged in) the first time they are used.
+	Int and float values and the null mask stay read-only views of the
+	mapping, see Column.make_writable; str, bool and JSON values are decoded.
+	"""
+	def __init__(self, buffer, spec, length, start=0):
+		self.buffer = buffer
+		self.spec = spec
+		self.length = length
+		self.start = start
+		self.kind = spec["kind"] if spec["kind"] in ["int", "float"] else "object"
+		self.loaded = False
+		self._values = None
+		self._nulls = None
+
+	def get_block(self, name, itemsize=1, extra=0):
+		# the bytes of this window's rows in a block, plus extra items
+		offset, size = self.spec[name]
+		offset += self.start * itemsize
+		return self.buffer[offset:offset + (self.length + extra) * itemsize]
+
+	def load(self):
+		spec = self.spec
+		kind = spec["kind"]
+		nulls = self.get_block("nulls") if spec.get("nulls") else None
+		if kind in ["int", "float"]:
+			values = self.get_block("values", itemsize=8).cast("q" if kind == "int" else "d")
+		elif kind == "bool":
+			values = [bool(flag) for flag in self.get_block("values")]
+		else:
+			offsets = array.array("q")
+			offsets.frombytes(self.get_block("offsets", itemsize=8, extra=1))
+			offset, size = spec["values"]
+			values = decode_values(kind, offsets, self.buffer[offset:offset + size])
+		if nulls is not None and self.kind == "object":
+			values = [None if null else value for value, null in zip(values, nulls)]
+			nulls = None
+		self._values, self._nulls, self.loaded = values, nulls, True
+
+	def slice(self, s):
+		start, stop, step = s.indices(self.length)
+		if self.loaded or step != 1:
+			return super().slice(s)
+		return MappedColumn(self.buffer, self.spec, max(0, stop - start), self.start + start)
+
+	@property
+	def values(self):
+		if not self.loaded:
+			self.load()
+		return self._values
+
+	@values.setter
+	def values(self, values):
+		if not self.loaded:
+			self.load()
+		self._values = values
+
+	@property
+	def nulls(self):
+		if not self.loaded:
+			self.load()
+		return self._nulls
+
+	@nulls.setter
+	def nulls(self, nulls):
+		if not self.loaded:
+			self.load()
+		self._nulls = nulls
+
+	def __len__(self):
+		return self.length if not self.loaded else len(self._values)
+
+
+def open_hot_file(path):
+	"""
+	Maps a .hot file, returns (buffer, schema). Nothing past the schema is read.
+	"""
+	with open(path, "rb") as f:
+		if os.fstat(f.fileno()).st_size < PREAMBLE.size:
+			raise ValueError(f"Not a .hot file, or cut short: '{path}'")
+		mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	magic, schema_offset, schema_size = PREAMBLE.unpack_from(mapped, 0)
+	if magic != MAGIC:
+		raise ValueError(f"Not a .hot file: '{path}'")
+	if schema_offset + schema_size > len(mapped):
+		raise ValueError(f"Cut short .hot file: '{path}'")
+	buffer = memoryview(mapped)
+	try:
+		schema = json.loads(bytes(buffer[schema_offset:schema_offset + schema_size]))
+	except ValueError as e:
+		raise ValueError(f"Bad schema in .hot file '{path}': {e}")
+	return buffer, schema
+
+
+def iter_hot_tables(path):
+	"""
+	(headers, rows) for every table of a .hot file, rows being ColumnarRows
+	of mapped columns, or row lists for tables saved with ragged rows.
+	"""
+	buffer, schema = open_hot_file(path)
+	for table_spec in schema["tables"]:
+		length = table_spec["length"]
+		columns = [MappedColumn(buffer, spec, length) for spec in table_spec["columns"]]
+		if table_spec["ragged"]:
+			yield table_spec["headers"], columns[0].values
+		else:
+			yield table_spec["headers"], ColumnarRows(columns, length)
@@ -0,0 +1,168 @@
+import re
+
+
+
+NULL_VALUES = ("", "-")
+BOOL_VALUES = {"true": True, "false": False}
+
+INT_PATTERN = re.compile(r"[+-]?\d+\Z")
+FLOAT_PATTERN = re.compile(r"[+-]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?\Z")
+THOUSANDS_PATTERN = re.compile(r"[+-]?\d{1,3}(?:,\d{3})+(\.\d+)?\Z")
+PERCENT_PATTERN = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)%\Z")
+
+# kinds of a single value
+NULL, INT, FLOAT, THOUSANDS, THOUSANDS_FLOAT, PERCENT, BOOL, STR = range(8)
+
+NUMERIC_KINDS = {INT, FLOAT, THOUSANDS, THOUSANDS_FLOAT}
+COMPATIBLE_KINDS = [NUMERIC_KINDS, {PERCENT}, {BOOL}]
+
+
+def get_value_kind(value):
+	if value is None:
+		return NULL
+	elif not isinstance(value, str):
+		# typed already (as JSON values are), the column is left as it is
+		return STR
+
+	if value in NULL_VALUES:
+		return NULL
+	elif INT_PATTERN.match(value):
+		return INT
+	elif FLOAT_PATTERN.match(value):
+		return FLOAT
+	elif value[-1] == "%" and PERCENT_PATTERN.match(value):
+		return PERCENT
+	elif "," in value:
+		match = THOUSANDS_PATTERN.match(value)
+		if match:
+			return THOUSANDS_FLOAT if match.group(1) else THOUSANDS
+	elif value.lower() in BOOL_VALUES:
+		return BOOL
+	return STR
+
+
+def get_column_kinds(values):
+	"""
+	Returns the set of kinds seen in a column, or None as soon as
+	a value shows that the column can only be kept as strings.
+	"""
+	kinds = set()
+	allowed = None
+	for value in values:
+		kind = get_value_kind(value)
+		if kind == NULL or kind in kinds:
+			continue
+		if kind == STR:
+			return None
+
+		kinds.add(kind)
+		if allowed is None:
+			allowed = get_allowed_kinds(kind)
+		if allowed is None or kind not in allowed:
+			return None
+	return kinds
+
+
+def get_allowed_kinds(kind):
+	return next((c for c in COMPATIBLE_KINDS if kind in c), None)
+
+
+def to_int(value):
+	if isinstance(value, int):
+		return value
+	return int(value.replace(",", ""))
+
+def to_float(value):
+	if isinstance(value, (int, float)):
+		return float(value)
+	return float(value.replace(",", ""))
+
+def to_percent(value):
+	if isinstance(value, (int, float)):
+		return float(value)
+	return float(value[:-1])
+
+def to_bool(value):
+	if isinstance(value, bool):
+		return value
+	return BOOL_VALUES[value.lower()]
+
+
+def get_converter(kinds):
+	if not kinds:
+		# all nulls, leave the column alone
+		return None
+
+	def nullable(convert):
+		def converter(value):
+			if value is None or value in NULL_VALUES:
+				return None
+			return convert(value)
+		return converter
+
+	if kinds <= {INT, THOUSANDS}:
+		return nullable(to_int)
+	elif kinds <= NUMERIC_KINDS:
+		return nullable(to_float)
+	elif kinds == {PERCENT}:
+		return nullable(to_percent)
+	elif kinds == {BOOL}:
+		return nullable(to_bool)
+	return None
+
+
+def convert_column(rows, n, converter):
+	converted = []
+	try:
+		for row in rows:
+			converted.append(converter(row[n]))
+	except (ValueError, KeyError, AttributeError, TypeError):
+		# only possible when types were inferred from a sample
+		return False
+
+	for row, value in zip(rows, converted):
+		row[n] = value
+	return True
+
+
+def get_column_converters(rows):
+	"""
+	One converter (or None) per column, inferred from uniform rows.
+	"""
+	if not rows:
+		return []
+
+	n_cols = len(rows[0])
+	if not all(len(row) == n_cols for row in rows):
+		return []
+
+	converters = []
+	for n in range(n_cols):
+		kinds = get_column_kinds(row[n] for row in rows)
+		converters.append(None if kinds is None else get_converter(kinds))
+	return converters
+
+
+def apply_column_converters(rows, converters):
+	"""
+	Returns the indexes of columns that failed validation and were left as they were.
+	"""
+	failed = []
+	for n, converter in enumerate(converters):
+		if converter and not convert_column(rows, n, converter):
+			failed.append(n)
+	return failed
+
+
+def infer_column_types(rows, sample=None):
+	"""
+	Converts columns of uniform rows in place to int, float, bool, percent
+	(as float) or thousands-separated numbers. Empty and "-" cells become None.
+	Columns holding values that are typed already are left as they are.
+	:param sample: classify from the first N rows, then validate while converting
+	"""
+	sample_rows = rows[:sample] if sample else rows
+	converters = get_column_converters(sample_rows)
+	if converters and all(len(row) == len(converters) for row in rows):
+		apply_column_converters(rows, converters)
+	return rows
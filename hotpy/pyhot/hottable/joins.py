@@ -0,0 +1,132 @@
+import itertools
+
+
+
+JOIN_TYPES = ["inner", "left", "outer"]
+
+
+def has_null(key):
+	return key is None or (isinstance(key, tuple) and None in key)
+
+
+def is_sorted(keys):
+	try:
+		return all(a <= b for a, b in zip(keys, itertools.islice(keys, 1, None)))
+	except TypeError:
+		return False
+
+
+def hash_join(left_keys, right_keys, how="inner"):
+	"""
+	Returns matching (left positions, right positions), None standing for
+	a missing side. Rows come in left order, matches in right order, and for
+	outer joins the unmatched right rows come last. Null keys never match.
+	The smaller side gets indexed.
+	"""
+	left_pos, right_pos = [], []
+	right_matched = bytearray(len(right_keys))
+
+	if len(right_keys) <= len(left_keys):
+		index = {}
+		for ri, key in enumerate(right_keys):
+			if not has_null(key):
+				index.setdefault(key, []).append(ri)
+		if all(len(ris) == 1 for ris in index.values()):
+			return unique_hash_join(left_keys, right_keys, index, how)
+		left_matches = (index.get(key) for key in left_keys)
+	else:
+		index = {}
+		for li, key in enumerate(left_keys):
+			if not has_null(key):
+				index.setdefault(key, []).append(li)
+		matches = [None] * len(left_keys)
+		for ri, key in enumerate(right_keys):
+			for li in index.get(key, ()):
+				if matches[li] is None:
+					matches[li] = []
+				matches[li].append(ri)
+		left_matches = iter(matches)
+
+	for li, ris in enumerate(left_matches):
+		if ris:
+			left_pos.extend([li] * len(ris))
+			right_pos.extend(ris)
+			for ri in ris:
+				right_matched[ri] = 1
+		elif how != "inner":
+			left_pos.append(li)
+			right_pos.append(None)
+
+	if how == "outer":
+		for ri, matched in enumerate(right_matched):
+			if not matched:
+				left_pos.append(None)
+				right_pos.append(ri)
+	return left_pos, right_pos
+
+
+def unique_hash_join(left_keys, right_keys, index, how):
+	# every key is on at most one right row, so lookups can run in bulk
+	unique = {key: ris[0] for key, ris in index.items()}
+	found = list(map(unique.get, left_keys))
+	if how == "inner":
+		left_pos = [li for li, ri in enumerate(found) if ri is not None]
+		right_pos = [found[li] for li in left_pos]
+	else:
+		left_pos = list(range(len(left_keys)))
+		right_pos = found
+
+	if how == "outer":
+		matched = set(found)
+		unmatched = [ri for ri in range(len(right_keys)) if ri not in matched]
+		left_pos.extend([None] * len(unmatched))
+		right_pos.extend(unmatched)
+	return left_pos, right_pos
+
+
+def merge_join(left_keys, right_keys, how="inner"):
+	"""
+	Same as hash_join, for keys that are already sorted on both sides.
+	"""
+	left_pos, right_pos = [], []
+	unmatched_right = []
+	n, m = len(left_keys), len(right_keys)
+	i = j = 0
+	while i < n and j < m:
+		lk, rk = left_keys[i], right_keys[j]
+		if lk < rk:
+			if how != "inner":
+				left_pos.append(i)
+				right_pos.append(None)
+			i += 1
+		elif rk < lk:
+			unmatched_right.append(j)
+			j += 1
+		else:
+			i2, j2 = i + 1, j + 1
+			while i2 < n and left_keys[i2] == lk: i2 += 1
+			while j2 < m and right_keys[j2] == rk: j2 += 1
+			for li in range(i, i2):
+				left_pos.extend([li] * (j2 - j))
+				right_pos.extend(range(j, j2))
+			i, j = i2, j2
+
+	if how != "inner":
+		left_pos.extend(range(i, n))
+		right_pos.extend([None] * (n - i))
+	if how == "outer":
+		unmatched_right.extend(range(j, m))
+		left_pos.extend([None] * len(unmatched_right))
+		right_pos.extend(unmatched_right)
+	return left_pos, right_pos
+
+
+def join_positions(left_keys, right_keys, how="inner"):
+	sides = [left_keys, right_keys]
+	if all(is_sorted(keys) and not any(map(has_null, keys)) for keys in sides):
+		try:
+			return merge_join(left_keys, right_keys, how)
+		except TypeError:
+			# each side is sorted, but its keys can't be compared to the other's
+			pass
+	return hash_join(left_keys, right_keys, how)
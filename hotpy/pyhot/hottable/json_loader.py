@@ -0,0 +1,377 @@
+import array
+import collections.abc
+import itertools
+import json
+import mmap
+import re
+
+from ..utils import filter_list, is_int
+
+
+
+WS = re.compile(rb"[ \t\n\r]*")
+STRING = re.compile(rb'"(?:[^"\\]|\\.)*"', re.S)
+SCALAR = re.compile(rb"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null")
+# a whole array with nothing nested in it, like most rows
+FLAT_ARRAY = re.compile(rb'\[(?:[^\[\]{}"]|"(?:[^"\\]|\\.)*")*\]', re.S)
+
+
+class JsonScanner:
+	"""
+	Walks a JSON buffer (usually an mmap) without decoding it.
+	Values are only decoded when asked for, by their start position.
+	"""
+	def __init__(self, buf):
+		self.buf = buf
+
+	def skip_ws(self, pos):
+		return WS.match(self.buf, pos).end()
+
+	def char_at(self, pos):
+		return self.buf[pos:pos+1]
+
+	def expect(self, pos, ch):
+		pos = self.skip_ws(pos)
+		if self.char_at(pos) != ch:
+			raise ValueError(f"Expected {ch.decode()} at byte {pos} of JSON")
+		return pos + 1
+
+	def skip_value(self, pos):
+		"""
+		Returns the position right after the value starting at pos.
+		"""
+		ch = self.char_at(pos)
+		if ch == b'"':
+			match = STRING.match(self.buf, pos)
+		elif ch == b"[":
+			match = FLAT_ARRAY.match(self.buf, pos)
+			if not match:
+				return self.skip_container(pos, b"]")
+		elif ch == b"{":
+			return self.skip_container(pos, b"}")
+		else:
+			match = SCALAR.match(self.buf, pos)
+		if not match:
+			raise ValueError(f"Bad JSON value at byte {pos}")
+		return match.end()
+
+	def skip_container(self, pos, closing):
+		items = self.iter_array(pos) if closing == b"]" else self.iter_object(pos)
+		for _ in items:
+			pass
+		return self.end
+
+	def iter_array(self, pos):
+		"""
+		Yields a JsonItem for every element. A consumer that reads the element
+		itself can set item.end, otherwise the element gets skipped.
+		Leaves the position after the closing bracket in self.end.
+		"""
+		pos = self.skip_ws(self.expect(pos, b"["))
+		if self.char_at(pos) == b"]":
+			self.end = pos + 1
+			return
+		while True:
+			item = JsonItem(self, pos)
+			yield item
+			pos = self.skip_ws(item.end)
+			ch = self.char_at(pos)
+			if ch == b"]":
+				self.end = pos + 1
+				return
+			elif ch != b",":
+				raise ValueError(f"Expected , or ] at byte {pos} of JSON")
+			pos = self.skip_ws(pos + 1)
+
+	def iter_object(self, pos):
+		"""
+		Same as iter_array, for object members, with item.key set.
+		"""
+		pos = self.skip_ws(self.expect(pos, b"{"))
+		if self.char_at(pos) == b"}":
+			self.end = pos + 1
+			return
+		while True:
+			key_end = self.skip_value(pos)
+			key = json.loads(self.buf[pos:key_end])
+			pos = self.skip_ws(self.expect(key_end, b":"))
+			item = JsonItem(self, pos, key)
+			yield item
+			pos = self.skip_ws(item.end)
+			ch = self.char_at(pos)
+			if ch == b"}":
+				self.end = pos + 1
+				return
+			elif ch != b",":
+				raise ValueError(f"Expected , or }} at byte {pos} of JSON")
+			pos = self.skip_ws(pos + 1)
+
+	def decode(self, start, end):
+		return json.loads(self.buf[start:end])
+
+
+class JsonItem:
+	def __init__(self, scanner, start, key=None):
+		self.scanner = scanner
+		self.start = start
+		self.key = key
+		self._end = None
+
+	@property
+	def end(self):
+		if self._end is None:
+			self._end = self.scanner.skip_value(self.start)
+		return self._end
+
+	@end.setter
+	def end(self, end):
+		self._end = end
+
+	def decode(self):
+		return self.scanner.decode(self.start, self.end)
+
+
+class TableShapeError(ValueError):
+	def __init__(self, message="Table JSON needs 'headers' and 'data'"):
+		super().__init__(message)
+
+
+class TableFilterError(ValueError):
+	pass
+
+
+def filter_values(arr, s):
+	# filter_list, with a bad or out of range filter reported like a bad table
+	try:
+		return filter_list(arr, s)
+	except (IndexError, ValueError) as e:
+		raise TableFilterError(f"Can't apply filter '{s}': {e}") from e
+
+
+class LazyRows(collections.abc.MutableSequence):
+	"""
+	Rows of a JSON table, decoded from the buffer only when they are read.
+	Any change turns it into a plain list first.
+	"""
+	def __init__(self, scanner, spans, cols_filter=None):
+		self.scanner = scanner
+		self.spans = spans
+		self.cols_filter = cols_filter
+		self.decoded = {}
+		self.rows = None
+		# positions of the filtered columns, for rows too short for the filter
+		self.col_indexes = None
+		self.is_reported = False
+		# applied to every row as it is decoded, see factory.infer_lazy_types
+		self.converters = []
+
+	def decode_row(self, i):
+		if i not in self.decoded:
+			self.decoded[i] = self.read_row(i)
+		return self.decoded[i]
+
+	def read_raw_row(self, i):
+		raw = self.scanner.decode(self.spans[2*i], self.spans[2*i+1])
+		try:
+			return filter_values(raw, self.cols_filter)
+		except TableFilterError as e:
+			if self.col_indexes is None:
+				raise
+			# the table was already taken, so a short row gets empty cells
+			if not self.is_reported:
+				print(f"Row {i}: {e}")
+				self.is_reported = True
+			return [raw[cdx] if cdx < len(raw) else None for cdx in self.col_indexes]
+
+	def read_row(self, i):
+		row = self.read_raw_row(i)
+		for n, converter in enumerate(self.converters):
+			if converter:
+				try:
+					row[n] = converter(row[n])
+				except (ValueError, KeyError, IndexError, AttributeError, TypeError):
+					# types were inferred from a sample that this row doesn't fit
+					self.drop_converter(n)
+		return row
+
+	def drop_converter(self, n):
+		"""
+		Leaves column n as decoded, in the rows decoded so far too.
+		"""
+		self.converters[n] = None
+		for i, row in self.decoded.items():
+			row[n] = self.read_raw_row(i)[n]
+
+	def iter_read(self, count):
+		"""
+		The first count rows, decoded again and not kept.
+		"""
+		return (self.read_row(i) for i in range(count))
+
+	def materialize(self):
+		if self.rows is None:
+			self.rows = [self.decode_row(i) for i in range(len(self))]
+			self.decoded = {}
+		return self.rows
+
+	def __len__(self):
+		if self.rows is not None:
+			return len(self.rows)
+		return len(self.spans) // 2
+
+	def __getitem__(self, idx):
+		if self.rows is not None:
+			return self.rows[idx]
+		if isinstance(idx, slice):
+			return [self.decode_row(i) for i in range(*idx.indices(len(self)))]
+		if idx < 0:
+			idx += len(self)
+		if not 0 <= idx < len(self):
+			raise IndexError("row index out of range")
+		return self.decode_row(idx)
+
+	def __iter__(self):
+		if self.rows is not None:
+			return iter(self.rows)
+		return (self.decode_row(i) for i in range(len(self)))
+
+	def __setitem__(self, idx, value):
+		self.materialize()[idx] = value
+
+	def __delitem__(self, idx):
+		del self.materialize()[idx]
+
+	def insert(self, idx, value):
+		self.materialize().insert(idx, value)
+
+	def __repr__(self):
+		return f"LazyRows ({len(self)} rows, {len(self.decoded)} decoded)"
+
+
+def is_prefix_filter(s):
+	return s is not None and is_int(s) and int(s) >= 0
+
+
+class JsonTableReader:
+	"""
+	Reads the tables / table / headers+data shapes of hot JSON files,
+	applying table, row and column filters before anything is decoded.
+	"""
+	def __init__(self, buf, tables_filter=None, rows_filter=None, cols_filter=None, lazy=False):
+		self.scanner = JsonScanner(buf)
+		self.tables_filter = tables_filter
+		self.rows_filter = rows_filter
+		self.cols_filter = cols_filter
+		self.lazy = lazy
+
+	def iter_row_items(self, item):
+		items = self.scanner.iter_array(item.start)
+		if is_prefix_filter(self.rows_filter):
+			n = int(self.rows_filter)
+			for i, row_item in enumerate(items):
+				if i >= n: return
+				yield row_item
+		else:
+			yield from items
+			item.end = self.scanner.end
+
+	def read_rows(self, item):
+		spans = array.array("q")
+		for row_item in self.iter_row_items(item):
+			spans.append(row_item.start)
+			spans.append(row_item.end)
+
+		if self.rows_filter is not None and not is_prefix_filter(self.rows_filter):
+			# pick rows by position before any of them is decoded
+			picked = filter_values(range(len(spans) // 2), self.rows_filter)
+			spans = array.array("q", [x for i in picked for x in (spans[2*i], spans[2*i+1])])
+
+		rows = LazyRows(self.scanner, spans, self.cols_filter)
+		return rows if self.lazy else rows.materialize()
+
+	def read_table(self, item):
+		headers = rows = None
+		for member in self.scanner.iter_object(item.start):
+			if member.key == "headers":
+				headers = member.decode()
+			elif member.key == "data":
+				rows = self.read_rows(member)
+		item.end = self.scanner.end
+		if headers is None or rows is None:
+			raise TableShapeError()
+		col_count = len(headers)
+		headers = filter_values(headers, self.cols_filter)
+		if isinstance(rows, LazyRows):
+			rows.col_indexes = filter_values(range(col_count), self.cols_filter)
+		return headers, rows
+
+	def has_table_shape(self, item):
+		# by its keys, without decoding anything
+		keys = [member.key for member in self.scanner.iter_object(item.start)]
+		item.end = self.scanner.end
+		return "headers" in keys and "data" in keys
+
+	def iter_tables(self):
+		"""
+		Yields (headers, rows) for every table that makes it through the filters.
+		The table filter counts tables that could be read, skipped ones don't take a position.
+		"""
+		members = {}
+		for member in self.scanner.iter_object(0):
+			if member.key == "tables":
+				yield from self.iter_table_list(member)
+				return
+			members[member.key] = member
+
+		if "table" in members:
+			items = [members["table"]]
+		elif "data" in members and "headers" in members:
+			items = [JsonItem(self.scanner, 0)]
+		else:
+			items = []
+
+		yield from filter_values(list(self.read_tables(items)), self.tables_filter)
+
+	def iter_table_list(self, member):
+		items = self.scanner.iter_array(member.start)
+		if self.tables_filter is None:
+			yield from self.read_tables(items)
+			member.end = self.scanner.end
+		elif is_prefix_filter(self.tables_filter):
+			yield from itertools.islice(self.read_tables(items), int(self.tables_filter))
+		else:
+			# positions of every readable table first, so filters can count from the end
+			items = list(self.skip_bad_tables(items))
+			yield from self.read_tables(filter_values(items, self.tables_filter))
+
+	def skip_bad_tables(self, items):
+		for item in items:
+			if self.has_table_shape(item):
+				yield item
+			else:
+				print(TableShapeError())
+
+	def read_tables(self, items):
+		# a table without headers or data, or that the row and column filters
+		# don't fit, is reported and skipped, not the whole file
+		for item in items:
+			try:
+				table = self.read_table(item)
+			except (TableShapeError, TableFilterError) as e:
+				print(e)
+				continue
+			yield table
+
+
+def close_json_buffer(buf):
+	if isinstance(buf, mmap.mmap):
+		buf.close()
+
+
+def open_json_buffer(json_path):
+	with open(json_path, "rb") as f:
+		try:
+			return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			# empty files cannot be mapped
+			return b""
@@ -0,0 +1,189 @@
+import array
+import ast
+import operator
+
+from ..utils import to_rounded
+
+
+
+# NumPy takes longer to import than most commands take to run,
+# so it is only imported by the first kernel that gets used
+numpy = None
+numpy_missing = False
+
+def load_numpy():
+	"""
+	Imports NumPy on first use, returns None when it is not installed.
+	"""
+	global numpy, numpy_missing
+	if numpy is None and not numpy_missing:
+		try:
+			import numpy
+		except ImportError:
+			numpy_missing = True
+	return numpy
+
+
+def is_typed_array(values):
+	# an array.array, or a read-only view of a column mapped from a .hot file
+	return isinstance(values, (array.array, memoryview))
+
+def get_typecode(values):
+	return values.format if isinstance(values, memoryview) else values.typecode
+
+
+INT_MAX = 2 ** 63 - 1
+# ints beyond this do not compare exactly against a float64 bound
+EXACT_FLOAT_INT = 2 ** 53
+
+
+def get_numeric_array(values):
+	"""
+	NumPy array for a column of plain ints or plain floats, with no nulls.
+	None when NumPy is missing or the column holds anything else.
+	"""
+	if load_numpy() is None:
+		return None
+	if is_typed_array(values):
+		return numpy.frombuffer(values, dtype=numpy.int64 if get_typecode(values) == "q" else numpy.float64)
+	types = set(map(type, values))
+	try:
+		if types == {int}:
+			return numpy.array(values, dtype=numpy.int64)
+		elif types == {float}:
+			return numpy.array(values, dtype=numpy.float64)
+	except OverflowError:
+		pass
+	return None
+
+
+def get_abs_max(arr):
+	if len(arr) == 0:
+		return 0
+	return max(abs(int(arr.min())), abs(int(arr.max()))) if arr.dtype.kind == "i" else float(numpy.abs(arr).max())
+
+
+def scale_values(values, divisor=0, multiplier=0):
+	arr = get_numeric_array(values)
+	if arr is not None:
+		if divisor and arr.dtype.kind == "i":
+			return arr // divisor
+		if multiplier and numpy.isfinite(arr).all() and get_abs_max(arr) * multiplier <= INT_MAX:
+			if arr.dtype.kind == "i":
+				return arr * multiplier
+			return (arr * multiplier).astype(numpy.int64)
+
+	if divisor:
+		return [None if x is None else x // divisor for x in values]
+	return [None if x is None else int(x * multiplier) for x in values]
+
+
+def round_values(values, digits=0):
+	arr = get_numeric_array(values)
+	# numpy rounds by scaling with 10**digits, which can disagree with round() on the last digit
+	if arr is not None and digits == 0:
+		return numpy.round(arr.astype(numpy.float64))
+	return [to_rounded(x, digits) for x in values]
+
+
+def update_bound_mask(mask, values, bound, is_max=False):
+	"""
+	Clears mask entries for rows whose value is above (is_max) or below the bound.
+	Rows already cleared are not compared again. Raises TypeError for
+	a value that doesn't compare with a number.
+	"""
+	arr = get_numeric_array(values)
+	if arr is not None and (arr.dtype.kind == "f" or get_abs_max(arr) <= EXACT_FLOAT_INT):
+		passed = arr <= bound if is_max else arr >= bound
+		if mask is None:
+			return passed
+		return numpy.logical_and(mask, passed)
+
+	if mask is None:
+		mask = [True] * len(values)
+	elif is_ndarray(mask):
+		mask = mask.tolist()
+	return [m and is_within_bound(x, bound, is_max) for m, x in zip(mask, values)]
+
+
+def is_within_bound(x, bound, is_max=False):
+	# empty cells fail the bound
+	if x is None:
+		return False
+	return x <= bound if is_max else x >= bound
+
+
+def get_mask_indices(mask):
+	if is_ndarray(mask):
+		return numpy.flatnonzero(mask).tolist()
+	return [i for i, m in enumerate(mask) if m]
+
+
+def is_ndarray(values):
+	return numpy is not None and isinstance(values, numpy.ndarray)
+
+
+def to_typed_array(values):
+	"""
+	array.array for an int64/float64 NumPy result, None for anything else.
+	"""
+	if is_ndarray(values) and values.dtype in (numpy.int64, numpy.float64):
+		typecode = "q" if values.dtype == numpy.int64 else "d"
+		typed = array.array(typecode)
+		typed.frombytes(numpy.ascontiguousarray(values).tobytes())
+		return typed
+	return None
+
+
+def take_typed(values, indices):
+	"""
+	Picks items of an int/float array.array (or view) by position, None without NumPy.
+	"""
+	if load_numpy() is None:
+		return None
+	arr = numpy.frombuffer(values, dtype=numpy.int64 if get_typecode(values) == "q" else numpy.float64)
+	return to_typed_array(arr[numpy.asarray(indices, dtype=numpy.intp)])
+
+
+BINARY_OPS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+
+def compute_arithmetic(node, arrays):
+	if isinstance(node, ast.Expression):
+		return compute_arithmetic(node.body, arrays)
+	elif isinstance(node, ast.BinOp):
+		op = BINARY_OPS[type(node.op)]
+		return op(compute_arithmetic(node.left, arrays), compute_arithmetic(node.right, arrays))
+	elif isinstance(node, ast.UnaryOp):
+		value = compute_arithmetic(node.operand, arrays)
+		return -value if isinstance(node.op, ast.USub) else +value
+	elif isinstance(node, ast.Constant):
+		return node.value
+	return arrays[int(node.id[2:])]
+
+
+def evaluate_arithmetic(tree, columns):
+	"""
+	Evaluates an arithmetic template (see evaluate.is_arithmetic) over whole
+	columns at once. None when NumPy is missing, a column is not plain numbers,
+	or the result could differ from Python's (overflow, division by zero).
+	"""
+	if load_numpy() is None:
+		return None
+	arrays = [get_numeric_array(values) for values in columns]
+	if any(arr is None for arr in arrays):
+		return None
+	if any(arr.dtype.kind == "i" and get_abs_max(arr) > EXACT_FLOAT_INT for arr in arrays):
+		return None
+	constants = [node.value for node in ast.walk(tree) if isinstance(node, ast.Constant)]
+	if any(type(value) is int and abs(value) > EXACT_FLOAT_INT for value in constants):
+		return None
+
+	with numpy.errstate(all="ignore"):
+		result = compute_arithmetic(tree, arrays)
+		# the same sums in floats show when ints would overflow, or a division went wrong
+		shadow = compute_arithmetic(tree, [arr.astype(numpy.float64) for arr in arrays])
+	if not isinstance(result, numpy.ndarray) or not numpy.isfinite(shadow).all():
+		return None
+	if result.dtype.kind == "i" and get_abs_max(shadow) > EXACT_FLOAT_INT:
+		return None
+	return result
@@ -1,20 +1,260 @@
+import array
 import datetime
+import os
+import sys
+import weakref
 
+from .columnar import Column, ColumnarRows
+from .hot_format import iter_hot_tables, save_hot_file
+from .kernels import get_typecode
+from .table import HotTable
+from ..cache import format_size
+
+
+
+def freeze_column(column):
+	values = column.values
+	if column.kind == "object":
+		values = tuple(values)
+	elif not isinstance(values, memoryview):
+		# a view mapped from a .hot file can't change, it is shared as it is
+		values = array.array(values.typecode, values)
+	nulls = bytes(column.nulls) if column.nulls is not None else None
+	return Column(column.kind, values, nulls)
+
+
+def thaw_column(column):
+	values = column.values
+	values = list(values) if column.kind == "object" else array.array(get_typecode(values), values)
+	nulls = bytearray(column.nulls) if column.nulls is not None else None
+	return Column(column.kind, values, nulls)
+
+
+def get_column_nbytes(column):
+	if column.kind == "object":
+		return sys.getsizeof(column.values)
+	return column.values.itemsize * len(column.values) + (len(column.nulls) if column.nulls is not None else 0)
+
+
+def is_same_cells(a, b):
+	"""
+	Whether a live row (or column of objects) still holds what a frozen one
+	does. Cells are shared with the live table, so unchanged ones are the
+	very same objects. 1, 1.0 and True are equal, but not the same cells.
+	"""
+	return len(a) == len(b) and all(x is y or (type(x) is type(y) and x == y) for x, y in zip(a, b))
+
+
+def is_same_column(a, b):
+	if a.kind != b.kind or len(a.values) != len(b.values) or a.nulls != b.nulls:
+		return False
+	return is_same_cells(a.values, b.values) if a.kind == "object" else a.values == b.values
+
+
+def is_same_table(table, state):
+	"""
+	Whether a table still holds exactly what the state does. A matching
+	fingerprint alone is not trusted with throwing the changes away.
+	"""
+	if tuple(table.headers) != state.headers:
+		return False
+	if table.is_columnar:
+		columns = table.rows.columns
+		return (
+			state.columns is not None and table.rows.length == state.length and len(columns) == len(state.columns)
+			and all(is_same_column(column, old) for column, old in zip(columns, state.columns))
+		)
+	rows = table.row_list
+	return (
+		state.rows is not None and len(rows) == len(state.rows)
+		and all(is_same_cells(row, old) for row, old in zip(rows, state.rows))
+	)
+
+
+class TableState:
+	"""
+	Frozen copy of a table: rows as tuples, or copies of the columns of a
+	columnar table. Rows (by position) and columns (anywhere) that are the
+	same as in the previous state of the table are shared with it, only
+	changed ones are copied. Telling which ones changed still looks at
+	every cell of a table that was touched since the previous state.
+	nbytes only counts what the state itself allocates, cell values
+	are shared with the live table.
+	"""
+	def __init__(self, table, previous=None):
+		# a table that was not touched since the previous state costs nothing
+		self.table = weakref.ref(table)
+		self.version = table.version
+		if previous is not None and previous.table() is table and previous.version == table.version:
+			self.share(previous)
+			return
+
+		self.fingerprint = table.fingerprint
+		if previous is not None and previous.fingerprint == self.fingerprint and is_same_table(table, previous):
+			self.share(previous)
+			return
+
+		self.headers = tuple(table.headers)
+		self.rows = None
+		self.columns = None
+		self.nbytes = sys.getsizeof(self.headers)
+		shared = 0
+
+		if table.is_columnar:
+			old_columns = previous.columns if previous is not None and previous.columns is not None else ()
+			columns = []
+			for column in table.rows.columns:
+				old = next((old for old in old_columns if is_same_column(column, old)), None)
+				if old is not None:
+					columns.append(old)
+					shared += 1
+				else:
+					frozen = freeze_column(column)
+					columns.append(frozen)
+					self.nbytes += get_column_nbytes(frozen)
+			self.columns = tuple(columns)
+			self.length = table.rows.length
+			parts, old_parts = self.columns, old_columns
+		else:
+			old_rows = previous.rows if previous is not None and previous.rows is not None else ()
+			rows = []
+			for i, row in enumerate(table.row_list):
+				if i < len(old_rows) and is_same_cells(row, old_rows[i]):
+					rows.append(old_rows[i])
+					shared += 1
+				else:
+					row = tuple(row)
+					rows.append(row)
+					self.nbytes += sys.getsizeof(row)
+			self.rows = tuple(rows)
+			self.nbytes += sys.getsizeof(self.rows)
+			self.length = len(rows)
+			parts, old_parts = self.rows, old_rows
+
+		self.is_unchanged = (
+			previous is not None and self.headers == previous.headers
+			and len(parts) == len(old_parts) and shared == len(parts)
+		)
+
+	def share(self, previous):
+		self.fingerprint = previous.fingerprint
+		self.headers, self.rows, self.columns = previous.headers, previous.rows, previous.columns
+		self.length = previous.length
+		self.nbytes = 0
+		self.is_unchanged = True
+
+	def restore(self, table, current=None):
+		"""
+		Puts this state back into the table. With current, the state the
+		table is in now taken with this one as its previous, only rows and
+		columns that differ get rebuilt.
+		"""
+		if current is not None and current.is_unchanged:
+			return
+		table.headers = list(self.headers)
+		if self.columns is not None:
+			live = {}
+			if current is not None and current.columns is not None:
+				live = {id(frozen): column for frozen, column in zip(current.columns, table.rows.columns)}
+			columns = [live.pop(id(frozen), None) or thaw_column(frozen) for frozen in self.columns]
+			table.rows = ColumnarRows(columns, self.length)
+		elif current is not None and current.rows is not None:
+			live_rows = table.row_list
+			rows = [row if now is old else list(old) for row, now, old in zip(live_rows, current.rows, self.rows)]
+			rows.extend(map(list, self.rows[len(rows):]))
+			table.rows = rows
+		else:
+			table.rows = list(map(list, self.rows))
+		# what the table holds now was hashed when the state was taken
+		table.cached_fingerprint, table.fingerprint_version = self.fingerprint, table.version
+
+	def as_table(self):
+		# enough of a table for save_hot_file
+		table = HotTable()
+		table.headers = self.headers
+		table.rows = self.rows if self.columns is None else ColumnarRows(list(self.columns), self.length)
+		return table
+
+	@property
+	def total_nbytes(self):
+		if self.columns is not None:
+			return sys.getsizeof(self.headers) + sum(map(get_column_nbytes, self.columns))
+		return sys.getsizeof(self.headers) + sys.getsizeof(self.rows) + sum(map(sys.getsizeof, self.rows))
 
 
 class Snapshot:
-	def __init__(self, time_machine):
+	def __init__(self, time_machine, previous=None):
+		"""
+		:param previous: snapshot to share unchanged tables, rows and columns with
+		"""
 		self.time_machine = time_machine
 		self.hotdoc = self.time_machine.hotdoc
-		self.hash = self.hotdoc.hash
-		self.json_text = self.hotdoc.json_text
+		self.id = None
+		# set once the snapshot is moved to a .hot file, see spill()
+		self.path = None
+
+		old_states = previous.states if previous is not None else []
+		self.states = [
+			TableState(table, old_states[i] if i < len(old_states) else None)
+			for i, table in enumerate(self.hotdoc.tables)
+		]
+		self.nbytes = sum(state.nbytes for state in self.states)
+		self.is_unchanged = (
+			previous is not None and len(self.states) == len(old_states)
+			and all(state.is_unchanged for state in self.states)
+		)
+		self.fingerprint = tuple(state.fingerprint for state in self.states)
+		self.table_count = len(self.states)
+		self.row_count = sum(state.length for state in self.states)
 
 		self.datetime = datetime.datetime.now()
 		self.dts = str(self.datetime)[:19]
 		self.date = self.dts[:10]
 		self.time = self.dts[11:]
 
-	def __repr__(self):
-		return f"Snapshot ({self.hash}) on {self.date} at {self.time}"
+	def own_all_data(self):
+		# the snapshot it shared data with is gone, so that data is now counted here
+		self.nbytes = sum(state.total_nbytes for state in self.states)
+
+	def spill(self, directory):
+		"""
+		Moves the snapshot out of memory, into a .hot file in the directory.
+		"""
+		os.makedirs(directory, exist_ok=True)
+		path = os.path.join(directory, f"snapshot-{os.getpid()}-{self.id}.hot")
+		save_hot_file(path, [state.as_table() for state in self.states])
+		self.path = path
+		self.states = []
+		self.nbytes = 0
 
+	def delete_file(self):
+		if self.path is not None and os.path.exists(self.path):
+			os.remove(self.path)
 
+	def restore(self, current=None):
+		"""
+		:param current: snapshot of the document as it is now, taken with this one as previous
+		"""
+		if self.path is not None:
+			tables = []
+			for headers, rows in iter_hot_tables(self.path):
+				table = HotTable(self.hotdoc)
+				table.headers, table.rows = headers, rows
+				tables.append(table)
+			self.hotdoc.tables = tables
+			return
+
+		current_states = current.states if current is not None else []
+		tables = []
+		for i, (state, table) in enumerate(zip(self.states, self.hotdoc.tables)):
+			state.restore(table, current_states[i] if i < len(current_states) else None)
+			tables.append(table)
+		for state in self.states[len(tables):]:
+			table = HotTable(self.hotdoc)
+			state.restore(table)
+			tables.append(table)
+		self.hotdoc.tables = tables
+
+	def __repr__(self):
+		where = f"in '{self.path}'" if self.path is not None else format_size(self.nbytes)
+		return f"Snapshot #{self.id} ({self.table_count} tables, {self.row_count} rows, {where}) on {self.date} at {self.time}"
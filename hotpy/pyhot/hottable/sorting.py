@@ -0,0 +1,55 @@
+import heapq
+
+
+
+NUMBER_TYPES = {int, float, bool}
+
+
+def get_sort_keys(values):
+	"""
+	Sort keys for a column that put None first, then numbers, then text,
+	then anything else, so mixed columns never compare across types.
+	"""
+	types = set(map(type, values))
+	if types <= NUMBER_TYPES or types == {str}:
+		return values
+
+	def decorate(value):
+		if value is None:
+			return (0, 0)
+		elif type(value) in NUMBER_TYPES:
+			return (1, value)
+		elif type(value) is str:
+			return (2, value)
+		return (3, str(value))
+	return [decorate(value) for value in values]
+
+
+def get_sort_order(columns, limit=None):
+	"""
+	Row positions in sorted order, as if every column had been sorted on in
+	turn with a stable sort, so the last column decides first.
+	:param columns: (values, reverse) pairs, in the order they were given
+	:param limit: only the first N positions are needed
+	"""
+	row_count = len(columns[0][0])
+	keys = [get_sort_keys(values) for values, reverse in columns]
+	positions = range(row_count)
+
+	if limit is not None and 0 <= limit < row_count:
+		if limit == 0:
+			return []
+		# rows past the limit-th smallest key of the deciding column can never make it
+		primary, reverse = keys[-1], columns[-1][1]
+		if reverse:
+			cutoff = heapq.nlargest(limit, primary)[-1]
+			positions = [i for i in positions if primary[i] >= cutoff]
+		else:
+			cutoff = heapq.nsmallest(limit, primary)[-1]
+			positions = [i for i in positions if primary[i] <= cutoff]
+
+	# stable passes over positions with precomputed keys beat tuple keys in CPython
+	positions = list(positions)
+	for column_keys, (values, reverse) in zip(keys, columns):
+		positions.sort(key=column_keys.__getitem__, reverse=reverse)
+	return positions if limit is None else positions[:limit]
@@ -1,28 +1,116 @@
 import csv
 import io
+import itertools
 import random
-import uuid
 
-from tabulate import tabulate
 
-from .evaluate import alphabet, alphabet_upper, evaluate_template
-from .table_utils import camelize, get_snippet_args
-from ..utils import filter_list, move_element_within_array
+from .aggregate import ACCUMULATORS, aggregate_columns, parse_agg_specs
+from .columnar import Column, ColumnarRows, RowView, to_columnar
+from .evaluate import alphabet, alphabet_upper, Template
+from .joins import is_sorted, join_positions
+from .kernels import scale_values, round_values, update_bound_mask, get_mask_indices
+from .kernels import evaluate_arithmetic, is_ndarray, to_typed_array
+from .sorting import get_sort_order
+from .table_utils import camelize, get_snippet_args, get_table_fingerprint
+from ..utils import filter_list, filter_list_by_args, move_element_within_array
 from ..utils import to_bool, to_int, to_float, to_str
 from ..utils import strip_leading_dots, to_rounded
 from ..utils import is_int, pop_first_value_between_xny
 
 
 
+def to_column(values):
+	typed = to_typed_array(values)
+	return Column.from_array(typed) if typed is not None else Column.from_values(values)
+
+
 class HotTable:
 	def __init__(self, document = None):
 		self.document = document
-		self.headers = []
-		self.rows = []
+		self.version = 0
+		self.fingerprint_version = None
+		self.cached_fingerprint = None
+		self._headers = []
+		self._rows = []
+
+	def touch(self):
+		"""
+		Marks the table as changed. Setting headers or rows does it, methods
+		changing them in place call it themselves.
+		"""
+		self.version += 1
+
+	@property
+	def headers(self):
+		return self._headers
+
+	@headers.setter
+	def headers(self, headers):
+		self._headers = headers
+		self.touch()
+
+	@property
+	def rows(self):
+		return self._rows
+
+	@rows.setter
+	def rows(self, rows):
+		self._rows = rows
+		self.touch()
+
+	@property
+	def fingerprint(self):
+		"""
+		Digest of the table contents, only recomputed after a touch().
+		"""
+		if self.fingerprint_version != self.version:
+			self.cached_fingerprint = get_table_fingerprint(self.headers, self.rows)
+			self.fingerprint_version = self.version
+		return self.cached_fingerprint
+
+	@property
+	def row_list(self):
+		# rows can be lazy (json_loader.LazyRows) or columnar, some consumers need real lists
+		rows = self.rows
+		if isinstance(rows, ColumnarRows):
+			return rows.to_lists()
+		if not isinstance(rows, list):
+			rows = list(rows)
+		if any(isinstance(row, RowView) for row in rows):
+			rows = [list(row) for row in rows]
+		return rows
+
+	@property
+	def is_columnar(self):
+		return isinstance(self.rows, ColumnarRows)
+
+	def make_columnar(self):
+		self.rows = to_columnar(self.rows, self.col_count)
+
+	def get_column_values(self, cdx):
+		"""
+		Values of one column, as a list or (for typed columns without nulls) an array.
+		"""
+		if self.is_columnar:
+			column = self.rows.columns[cdx]
+			if column.kind != "object" and column.nulls is None:
+				return column.values
+			return column.to_list()
+		return [row[cdx] for row in self.rows]
+
+	def set_column_values(self, cdx, values):
+		self.touch()
+		if self.is_columnar:
+			self.rows.columns[cdx] = to_column(values)
+			return
+		if is_ndarray(values):
+			values = values.tolist()
+		for row, value in zip(self.rows, values):
+			row[cdx] = value
 
 	@property
 	def values(self):
-		return (self.headers, self.rows)
+		return (self.headers, self.row_list)
 
 	def to_dataframe(self):
 		df = pd.DataFrame(self.rows, columns=self.headers)
@@ -67,7 +155,7 @@ class HotTable:
 			table["data"] = [self.make_row_object(row, headers=camel_headers) for row in self.rows]
 		else:
 			table["headers"] = self.headers
-			table["data"] = self.rows
+			table["data"] = self.row_list
 		return table
 
 	def is_acceptable(self):
@@ -112,6 +200,21 @@ class HotTable:
 			self.headers = filter_list(self.headers, self.args.c1)
 			self.rows = [filter_list(row, self.args.c1) for row in self.rows]
 
+	def filter_rows_by_args(self, args):
+		if self.is_columnar:
+			# picking rows by index would give views of this store, not a new one
+			self.take_rows(filter_list_by_args(range(self.row_count), args))
+			return
+		self.rows = filter_list_by_args(self.rows, args)
+
+	def filter_cols_by_args(self, args):
+		col_indexes = filter_list_by_args(list(range(self.col_count)), args)
+		self.headers = [self.headers[cdx] for cdx in col_indexes]
+		if self.is_columnar:
+			self.rows = self.rows.select_columns(col_indexes)
+			return
+		self.rows = [[row[cdx] for cdx in col_indexes] for row in self.rows]
+
 	def process_template_args(self, args):
 		for arg in args:
 			parts = arg.split("=")
@@ -119,14 +222,47 @@ class HotTable:
 				header, template = parts
 			else:
 				header, template = ("@", arg)
-			self.headers = [*self.headers, header]
-			self.rows = [[*row, evaluate_template(template, row)] for row in self.rows]
+			self.add_template_column(header, template)
+
+	def add_template_column(self, header, template):
+		try:
+			compiled = Template(template, self.headers)
+		except SyntaxError as e:
+			print(f"Bad template '{template}': {e.msg}")
+			self.add_column(header, [0] * self.row_count)
+			return
+
+		columns = [self.get_column_values(cdx) for cdx in compiled.col_indexes]
+		values = evaluate_arithmetic(compiled.tree, columns) if compiled.is_arithmetic else None
+		if values is None:
+			values, errors = compiled.evaluate_columns(columns, self.row_count)
+			if errors:
+				row_number, e = errors[0]
+				print(f"Error evaluating template '{template}' in {len(errors)} of {self.row_count} rows (first in row {row_number+1}): {e}")
+		self.add_column(header, values)
+
+	def add_column(self, header, values):
+		self.headers = [*self.headers, header]
+		if self.is_columnar:
+			self.rows.columns.append(to_column(values))
+			return
+		if is_ndarray(values):
+			values = values.tolist()
+		self.rows = [[*row, value] for row, value in zip(self.rows, values)]
+
+	def insert_first_column(self, header, values):
+		self.headers = [header, *self.headers]
+		if self.is_columnar:
+			self.rows.columns.insert(0, to_column(values))
+			return
+		self.rows = [[value, *row] for row, value in zip(self.rows, values)]
 
 	def shave_headers(self):
 		self.headers = [header.split(" ")[0] for header in self.headers]
 
 
 	def get_tabulate(self):
+		from tabulate import tabulate
 		table_text = tabulate(
 			self.rows,
 			headers=self.headers,
@@ -138,6 +274,7 @@ class HotTable:
 		print(self.get_tabulate())
 
 	def print_table(self, n=10, fmt="simple"):
+		from tabulate import tabulate
 		table_text = tabulate(
 			self.rows[:n],
 			headers=self.headers,
@@ -151,12 +288,162 @@ class HotTable:
 		result = HotTable(self.document)
 		result.headers = [*self.headers, *other.headers]
 		result.rows = [[*r1, *r2] for r1, r2 in zip(self.rows, other.rows)]
+		if self.is_columnar:
+			result.make_columnar()
+		return result
+
+
+	@staticmethod
+	def concat(tables, by_name=False):
+		"""
+		All rows of the tables in one new table, copied once. Columns are
+		taken by position, or with by_name by header (ignoring case), in the
+		order of the first table.
+		"""
+		first = tables[0]
+		parts = []
+		for table in tables:
+			rows = table.row_list
+			if by_name and table.headers_lower != first.headers_lower:
+				order = [table.headers_lower.index(header) for header in first.headers_lower]
+				rows = [[row[cdx] for cdx in order] for row in rows]
+			parts.append(rows)
+
+		result = HotTable(first.document)
+		result.headers = first.headers
+		result.rows = list(itertools.chain.from_iterable(parts))
+		if first.is_columnar:
+			result.make_columnar()
+		return result
+
+	def distinct_rows(self, args):
+		"""
+		Drops rows repeating an earlier row, or only its values in the given
+		columns. A last arg of 'last' keeps the last occurrence instead.
+		"""
+		keep = "first"
+		if args and args[-1] in ["first", "last"]:
+			*args, keep = args
+		col_indexes = self.get_column_indexes(args) if args else list(range(self.col_count))
+		if args and not col_indexes:
+			return
+
+		def get_distinct_indexes(keys):
+			if keep == "last":
+				last_indexes = {key: i for i, key in enumerate(keys)}
+				return sorted(last_indexes.values())
+			seen = set()
+			return [i for i, key in enumerate(keys) if not (key in seen or seen.add(key))]
+
+		keys = self.get_key_values(col_indexes)
+		try:
+			indices = get_distinct_indexes(keys)
+		except TypeError:
+			# cells like lists or dicts, compare them by their text
+			indices = get_distinct_indexes([repr(key) for key in keys])
+		if len(indices) < self.row_count:
+			self.take_rows(indices)
+
+	def get_key_values(self, col_indexes):
+		columns = [self.get_column_values(cdx) for cdx in col_indexes]
+		if len(columns) == 1:
+			return list(columns[0])
+		return list(zip(*columns))
+
+	def join_on(self, other, key_arg, how="inner"):
+		"""
+		Joins rows of both tables that have equal values in the key columns,
+		given by names (or letters) separated by commas. Key columns of the
+		other table are not repeated, outer joins fill them in from the other side.
+		"""
+		key_names = key_arg.split(",")
+		left_cols = self.get_column_indexes([key_arg])
+		right_cols = other.get_column_indexes([key_arg])
+		if len(left_cols) != len(key_names) or len(right_cols) != len(key_names):
+			print(f"Join columns not found in both tables: '{key_arg}'")
+			return None
+
+		left_pos, right_pos = join_positions(
+			self.get_key_values(left_cols), other.get_key_values(right_cols), how=how
+		)
+
+		rest = [cdx for cdx in range(other.col_count) if cdx not in right_cols]
+		right_parts = [[row[cdx] for cdx in rest] for row in other.row_list]
+		left_rows = self.row_list
+		missing_right = [None] * len(rest)
+
+		rows = []
+		for li, ri in zip(left_pos, right_pos):
+			if ri is None:
+				rows.append([*left_rows[li], *missing_right])
+			elif li is None:
+				left_part = [None] * self.col_count
+				right_row = other.rows[ri]
+				for lc, rc in zip(left_cols, right_cols):
+					left_part[lc] = right_row[rc]
+				rows.append([*left_part, *right_parts[ri]])
+			else:
+				rows.append([*left_rows[li], *right_parts[ri]])
+
+		result = HotTable(self.document)
+		result.headers = [*self.headers, *[other.headers[cdx] for cdx in rest]]
+		result.rows = rows
+		if self.is_columnar:
+			result.make_columnar()
 		return result
 
+	def group_by(self, key_arg, agg_args):
+		"""
+		New table with a row for every distinct value of the key columns
+		(names or letters separated by commas, none for a single group) and
+		a column for every aggregate, like sum:x,mean:y,count,min:z,max:z.
+		Already sorted keys are grouped by runs instead of a hash index.
+		"""
+		try:
+			specs = parse_agg_specs(agg_args or ["count"])
+		except ValueError as e:
+			print(e)
+			return None
+
+		key_names = key_arg.split(",") if key_arg else []
+		key_cols = self.get_column_indexes([key_arg]) if key_arg else []
+		agg_cols = [self.get_column_index(col_name) if col_name else None for name, col_name in specs]
+		if len(key_cols) != len(key_names) or any(col_name and cdx is None for (name, col_name), cdx in zip(specs, agg_cols)):
+			return None
+
+		keys = self.get_key_values(key_cols) if key_cols else [()] * self.row_count
+		columns = [self.get_column_values(cdx) if cdx is not None else None for cdx in agg_cols]
+		accumulators = [ACCUMULATORS[name]() for name, col_name in specs]
+		try:
+			group_keys, results = aggregate_columns(keys, columns, accumulators, is_sorted=is_sorted(keys))
+		except TypeError as e:
+			print(f"Cannot aggregate '{','.join(agg_args)}': {e}")
+			return None
+
+		result = HotTable(self.document)
+		result.headers = [
+			*[self.headers[cdx] for cdx in key_cols],
+			*[f"{name}_{self.headers[cdx]}" if cdx is not None else name for (name, col_name), cdx in zip(specs, agg_cols)],
+		]
+		key_parts = [key if isinstance(key, tuple) else (key,) for key in group_keys]
+		result.rows = [[*key, *values] for key, *values in zip(key_parts, *results)]
+		if self.is_columnar:
+			result.make_columnar()
+		return result
+
+	def aggregate_rows(self, key_arg, agg_args):
+		result = self.group_by(key_arg, agg_args)
+		if result is not None:
+			self.headers, self.rows = result.headers, result.rows
 
 	def convert_columns_to_x(self, args, to_x):
 		if not args: return None
 		col_indexes = self.get_column_indexes(args)
+		self.touch()
+		if self.is_columnar:
+			for col_index in col_indexes:
+				self.rows.map_column(col_index, to_x)
+			return
 		for row in self.rows:
 			for col_index in col_indexes:
 				row[col_index] = to_x(row[col_index])
@@ -166,30 +453,47 @@ class HotTable:
 		for arg in args:
 			digits, col_arg = strip_leading_dots(arg)
 			col_indexes = self.get_column_indexes([col_arg])
-
-			for row in self.rows:
-				for col_index in col_indexes:
-					row[col_index] = to_rounded(row[col_index], digits)
+			for col_index in col_indexes:
+				values = self.get_column_values(col_index)
+				self.set_column_values(col_index, round_values(values, digits))
 
 
-	def sort_rows_by_arg(self, arg, reverse=False):
-		cdx = self.get_column_index(arg)
-		if cdx is None:
-			print(f"Invalid column for sorting: '{arg}'")
+	def sort_rows_by_args(self, args, reverse=False):
+		self.sort_rows_by_keys([(arg, reverse) for arg in args])
+
+	def sort_rows_by_keys(self, keys, limit=None):
+		"""
+		Sorts once on (column arg, reverse) pairs, with the same result as
+		sorting on each of them in turn. With a limit, only the first N rows are kept.
+		"""
+		columns = []
+		for arg, reverse in keys:
+			cdx = self.get_column_index(arg)
+			if cdx is None:
+				print(f"Invalid column for sorting: '{arg}'")
+				continue
+			columns.append((self.get_column_values(cdx), reverse))
+		if not columns:
 			return
-		self.rows = sorted(self.rows, key=lambda x:x[cdx], reverse=reverse)
 
-	def sort_rows_by_args(self, args, reverse=False):
-		for arg in args:
-			self.sort_rows_by_arg(arg, reverse=reverse)
+		order = get_sort_order(columns, limit=limit)
+		self.take_rows(order)
 
 
 	def scale_columns(self, args, divisor=0, multiplier=0):
 		if not args: return None
 		col_indexes = self.get_column_indexes(args)
+		if self.is_columnar:
+			for col_index in col_indexes:
+				values = self.get_column_values(col_index)
+				self.set_column_values(col_index, scale_values(values, divisor=divisor, multiplier=multiplier))
+			return
+		self.touch()
 		for row in self.rows:
 			for col_index in col_indexes:
-				if divisor:
+				if row[col_index] is None:
+					continue
+				elif divisor:
 					row[col_index] = row[col_index] // divisor
 				elif multiplier:
 					row[col_index] = int(row[col_index] * multiplier)
@@ -199,6 +503,9 @@ class HotTable:
 		def drop_filter(arr):
 			return [x for i, x in enumerate(arr) if not i in col_indexes]
 		self.headers = drop_filter(self.headers)
+		if self.is_columnar:
+			self.rows = self.rows.select_columns(drop_filter(range(len(self.rows.columns))))
+			return
 		self.rows = [drop_filter(row) for row in self.rows]
 
 	def drop_naked_columns(self):
@@ -209,6 +516,9 @@ class HotTable:
 		def keep_filter(arr):
 			return [x for i, x in enumerate(arr) if i in col_indexes]
 		self.headers = keep_filter(self.headers)
+		if self.is_columnar:
+			self.rows = self.rows.select_columns(keep_filter(range(len(self.rows.columns))))
+			return
 		self.rows = [keep_filter(row) for row in self.rows]
 
 	def choose_n_columns_from_left(self, n, right=False):
@@ -234,7 +544,11 @@ class HotTable:
 
 		def move(arr):
 			move_element_within_array(arr, cdx, ddx)
+		self.touch()
 		move(self.headers)
+		if self.is_columnar:
+			move(self.rows.columns)
+			return
 		for row in self.rows:
 			move(row)
 
@@ -247,7 +561,11 @@ class HotTable:
 		c1, c2 = column_indexes
 		def swap(arr):
 			arr[c1], arr[c2] = arr[c2], arr[c1]
+		self.touch()
 		swap(self.headers)
+		if self.is_columnar:
+			swap(self.rows.columns)
+			return
 		for row in self.rows:
 			swap(row)
 
@@ -271,7 +589,13 @@ class HotTable:
 		if cdx is None: return
 		if cdx >= self.col_count: return
 
+		self.touch()
 		self.headers.insert(cdx+1, header)
+		if self.is_columnar:
+			pairs = [pop_first_value_between_xny(x, start_char=start_char, end_char=end_char) for x in self.rows.get_column_values(cdx)]
+			self.rows.columns[cdx] = Column.from_values([c1 for c1, c2 in pairs])
+			self.rows.columns.insert(cdx+1, Column.from_values([c2 for c1, c2 in pairs]))
+			return
 		for row in self.rows:
 			c1, c2 = pop_first_value_between_xny(row[cdx], start_char=start_char, end_char=end_char)
 			row[cdx] = c1
@@ -280,31 +604,87 @@ class HotTable:
 
 	def min_max_filtering(self, args, max=False):
 		if not args: return
-		for arg in args:
+		self.filter_rows_by_bounds([(arg, max) for arg in args])
+
+	def filter_rows_by_bounds(self, bounds):
+		"""
+		Applies --min/--max args, given as (arg, is_max) pairs, in one pass:
+		columnar tables build one mask for all of them, row lists are checked
+		against all of them at once. Empty cells fail every bound, an arg whose
+		column has cells that don't compare with a number is reported and skipped.
+		"""
+		checks = []
+		for arg, is_max in bounds:
 			try:
-				col_index, value = arg.split("=")
-				col_index = self.get_column_index(col_index)
+				col_arg, value = arg.split("=")
+				col_index = self.get_column_index(col_arg)
 				value = to_float(value)
-				if max:
-					self.rows = [row for row in self.rows if row[col_index] <= value]
-				else:
-					self.rows = [row for row in self.rows if row[col_index] >= value]
-			except:
+			except (ValueError, IndexError):
+				col_index = None
+			if col_index is None:
 				print(f"Invalid min/max arg: '{arg}'")
+				continue
+			checks.append((arg, col_index, value, is_max))
+		if not checks:
+			return
+
+		if self.is_columnar:
+			mask = None
+			for arg, col_index, value, is_max in checks:
+				try:
+					mask = update_bound_mask(mask, self.get_column_values(col_index), value, is_max=is_max)
+				except TypeError:
+					print(f"Invalid min/max arg: '{arg}'")
+			if mask is not None:
+				self.take_rows(get_mask_indices(mask))
+			return
+
+		def is_within(row):
+			for n, (arg, col_index, value, is_max) in enumerate(checks):
+				x = row[col_index]
+				if x is None:
+					return False
+				try:
+					if x > value if is_max else x < value:
+						return False
+				except TypeError:
+					failed.append(n)
+					raise
+			return True
+
+		while checks:
+			failed = []
+			try:
+				self.rows = [row for row in self.rows if is_within(row)]
+				return
+			except TypeError:
+				# like one arg at a time, the others still apply
+				print(f"Invalid min/max arg: '{checks.pop(failed[0])[0]}'")
 
 
 	def select_random_rows(self, n, preserve_order=False):
 		indices = random.sample(range(self.row_count), n)
 		if preserve_order:
 			indices = sorted(indices)
-		self.rows = [self.rows[i] for i in indices]
+		self.take_rows(indices)
+
+	def take_rows(self, indices):
+		if self.is_columnar:
+			self.rows = self.rows.take(indices)
+		else:
+			rows = self.rows
+			self.rows = [rows[i] for i in indices]
 
 	def choose_nth_word(self, args, n=0):
-		def update_row(row, cdx, wn):
+		def get_word(value, wn):
 			try:
-				row[cdx] = row[cdx].split(" ")[wn]
+				return value.split(" ")[wn]
 			except Exception as e:
-				print(f"Error while selecting word #{wn} in '{row[cdx]}' !")
+				print(f"Error while selecting word #{wn} in '{value}' !")
+				return value
+
+		def update_row(row, cdx, wn):
+			row[cdx] = get_word(row[cdx], wn)
 			return row
 
 		for arg in args:
@@ -315,7 +695,12 @@ class HotTable:
 			else:
 				cdx = self.get_column_index(arg)
 
-			if cdx is not None:
+			if cdx is None:
+				continue
+			if self.is_columnar:
+				self.touch()
+				self.rows.map_column(cdx, lambda value, wn=n: get_word(value, wn))
+			else:
 				self.rows = [update_row(row, cdx, n) for row in self.rows]
 
 	def slice_column(self, args):
@@ -328,7 +713,11 @@ class HotTable:
 					print(f"Bad column name: '{arg}'")
 				elif not slice_arg:
 					print(f"Empty slice arg: '{arg}'")
+				elif self.is_columnar:
+					self.touch()
+					self.rows.map_column(cdx, lambda value: filter_list(value, slice_arg))
 				else:
+					self.touch()
 					for row in self.rows:
 						row[cdx] = filter_list(row[cdx], slice_arg)
 			else:
@@ -336,8 +725,11 @@ class HotTable:
 
 
 	def mirror_table(self):
-		self.headers = reversed(self.headers)
-		self.rows = [reversed(row) for row in self.rows]
+		if self.is_columnar:
+			self.rows = self.rows.select_columns(reversed(range(self.col_count)))
+		else:
+			self.rows = [list(reversed(row)) for row in self.rows]
+		self.headers = list(reversed(self.headers))
 
 	def snip_table(self, arg):
 		snip_args = get_snippet_args(arg)
@@ -348,10 +740,19 @@ class HotTable:
 		c1, r1, c2, r2 = snip_args
 		self.rows = self.rows[r1-1:r2]
 
+		if self.is_columnar:
+			self.rows = self.rows.select_columns(list(range(self.col_count))[c1:c2+1])
+		else:
+			self.rows = [row[c1:c2+1] for row in self.rows]
 		self.headers = self.headers[c1:c2+1]
-		self.rows = [row[c1:c2+1] for row in self.rows]
 
 	def transpose_table(self):
+		if self.is_columnar:
+			columns = [[header, *values] for header, values in zip(self.headers, self.rows.to_columns())]
+			self.headers = columns[0]
+			self.rows = to_columnar(columns[1:], len(self.headers))
+			return
+
 		total_rows = [self.headers, *self.rows]
 		def get_nth_column(rows, n):
 			return [row[n] for row in rows]
@@ -370,6 +771,7 @@ class HotTable:
 		return output.getvalue()
 
 	def to_markdown(self):
+		from tabulate import tabulate
 		return tabulate(self.rows, headers=self.headers, tablefmt="github")
 
 	def get_output_text(self):
@@ -382,10 +784,7 @@ class HotTable:
 
 
 	def __add__(self, other):
-		result = HotTable(self.document)
-		result.headers = self.headers
-		result.rows = [*self.rows, *other.rows]
-		return result
+		return HotTable.concat([self, other])
 
 	def __repr__(self):
 		return f"HotTable ({self.row_count} x {self.col_count})"
@@ -0,0 +1,150 @@
+import collections
+import hashlib
+import importlib
+import json
+import marshal
+import os
+import pickle
+import sys
+
+from ..cache import get_page_cache, get_default_cache_size, TABLES_DIR, TABLE_SUFFIX
+
+
+# modules whose code decides what comes out of a page
+EXTRACTOR_MODULES = ["extractor", "inference", "factory", "table_index"]
+
+# every option that changes which tables come out of a page, or how
+OPTION_NAMES = [
+	"t1", "r1", "c1", "table_id", "table_class", "caption",
+	"min_rows", "max_rows", "exact_rows", "min_cols", "max_cols", "exact_cols",
+	"no_infer", "infer_sample", "row_limit",
+]
+
+
+def get_extractor_version():
+	"""
+	Short hash of the extraction and inference code, so cached tables
+	are dropped whenever that code changes.
+	"""
+	digest = hashlib.blake2b(digest_size=8)
+	for name in EXTRACTOR_MODULES:
+		module = importlib.import_module(f".{name}", __package__)
+		source = module.__loader__.get_source(module.__name__)
+		if source is None:
+			# compiled only, e.g. a zip without sources
+			source = marshal.dumps(module.__loader__.get_code(module.__name__))
+		digest.update(source.encode("utf-8") if isinstance(source, str) else source)
+	return digest.hexdigest()
+
+
+def get_content_hash(content):
+	if isinstance(content, str):
+		content = content.encode("utf-8")
+	return hashlib.md5(content).hexdigest()
+
+
+class TableCache:
+	"""
+	Pickled header/row lists of the tables extracted from a page,
+	keyed by page content and extraction options. They are in the page
+	cache's index and count towards its budget. Tables of other extractor
+	versions are left to its LRU eviction, other checkouts may still use them.
+	"""
+	def __init__(self, location, max_bytes):
+		self.page_cache = get_page_cache(location, max_bytes)
+		self.location = os.path.join(location, TABLES_DIR, f"v{get_extractor_version()}")
+
+	def get_key(self, content_hash, args):
+		options = [getattr(args, name, None) for name in OPTION_NAMES]
+		key_text = json.dumps([content_hash, options])
+		return hashlib.md5(key_text.encode("utf-8")).hexdigest()
+
+	def get_path(self, key):
+		return os.path.join(self.location, key[:2], f"{key}{TABLE_SUFFIX}")
+
+	def get(self, key):
+		path = self.get_path(key)
+		if not os.path.isfile(path):
+			return None
+		try:
+			with open(path, "rb") as f:
+				table_values = pickle.load(f)
+		except Exception as e:
+			print(f"Bad table cache entry '{path}': {e}")
+			return None
+		# used just now, for the LRU eviction of the page cache
+		if not self.page_cache.mark_used(self.page_cache.get_table_key(path)):
+			self.page_cache.put_table(path)
+		return table_values
+
+	def put(self, key, table_values):
+		path = self.get_path(key)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp_path = f"{path}.{os.getpid()}.tmp"
+		with open(tmp_path, "wb") as f:
+			pickle.dump(table_values, f, protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(tmp_path, path)
+		self.page_cache.put_table(path)
+
+
+table_caches = {}
+
+def get_table_cache(location, max_bytes=None):
+	max_bytes = get_default_cache_size() if max_bytes is None else max_bytes
+	key = (os.path.abspath(location), max_bytes)
+	if key not in table_caches:
+		table_caches[key] = TableCache(location, max_bytes)
+	return table_caches[key]
+
+
+class RecentTables:
+	"""
+	Header/row lists of recently loaded files, kept in memory by hot --serve
+	along with whatever loading them printed. Keyed by the file's path,
+	size and modification time and the extraction options. Least recently
+	used files are dropped past max_bytes.
+	"""
+	def __init__(self, max_bytes):
+		self.max_bytes = max_bytes
+		self.nbytes = 0
+		self.entries = collections.OrderedDict()
+
+	def get_key(self, path, args):
+		stat = os.stat(path)
+		options = [getattr(args, name, None) for name in OPTION_NAMES]
+		return json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, options])
+
+	def get(self, key):
+		"""
+		Returns (table values, output) with rows that can be changed freely, or None.
+		"""
+		entry = self.entries.get(key)
+		if entry is None:
+			return None
+		self.entries.move_to_end(key)
+		table_values, output, nbytes = entry
+		return [(list(headers), list(map(list, rows))) for headers, rows in table_values], output
+
+	def put(self, key, table_values, output):
+		frozen = [(tuple(headers), tuple(map(tuple, rows))) for headers, rows in table_values]
+		nbytes = sum(sys.getsizeof(rows) + sum(sys.getsizeof(row) + sum(map(sys.getsizeof, row)) for row in rows) for _, rows in frozen)
+		if nbytes > self.max_bytes:
+			return
+		if key in self.entries:
+			self.nbytes -= self.entries.pop(key)[2]
+		self.entries[key] = (frozen, output, nbytes)
+		self.nbytes += nbytes
+		while self.nbytes > self.max_bytes:
+			_, (_, _, dropped) = self.entries.popitem(last=False)
+			self.nbytes -= dropped
+
+
+recent_tables = None
+
+def get_recent_tables():
+	return recent_tables
+
+def keep_recent_tables(max_bytes):
+	global recent_tables
+	recent_tables = RecentTables(max_bytes)
+	return recent_tables
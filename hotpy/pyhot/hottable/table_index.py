@@ -0,0 +1,204 @@
+import html as htmllib
+import re
+
+from ..utils import filter_list
+
+
+
+TOKEN_PATTERN = re.compile(
+	r"<!--.*?-->"
+	r"|<(script|style)\b[^>]*>.*?</\1\s*>"
+	r"|<(/?)(table|thead|tbody|tfoot|tr|th|td|caption)\b([^>]*)>",
+	re.S | re.I
+)
+ID_PATTERN = re.compile(r"""\bid\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.I)
+CLASS_PATTERN = re.compile(r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.I)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+
+
+def get_attribute(pattern, attrs):
+	match = pattern.search(attrs)
+	if not match:
+		return ""
+	return next(g for g in match.groups() if g is not None)
+
+
+class TableInfo:
+	def __init__(self, position, start, attrs):
+		self.position = position
+		self.start = start
+		self.end = None
+		self.id = get_attribute(ID_PATTERN, attrs)
+		self.classes = get_attribute(CLASS_PATTERN, attrs).split()
+		self.caption = ""
+
+		self.group = None
+		self.seen_groups = set()
+		self.tbody_count = 0
+		self.tr_count = 0
+		self.tbody_tr_count = 0
+		self.first_row = None
+		self.first_thead_row = None
+		self.cells = [0, 0]
+		# the counts are exact only while every row and cell is opened and
+		# closed where the parser would put them
+		self.is_exact = True
+		self.in_row = False
+		self.in_cell = False
+
+	@property
+	def has_head_and_body(self):
+		return "thead" in self.seen_groups and "tbody" in self.seen_groups
+
+	@property
+	def row_count(self):
+		if self.has_head_and_body:
+			return self.tbody_tr_count
+		return max(self.tr_count - 1, 0)
+
+	@property
+	def col_count(self):
+		header_row = self.first_thead_row if self.has_head_and_body else self.first_row
+		if not header_row:
+			return 0
+		th_count, td_count = header_row
+		return th_count or td_count
+
+	def add_row(self):
+		if self.in_row or self.in_cell:
+			self.is_exact = False
+		self.in_row = True
+		self.tr_count += 1
+		cells = [0, 0]
+		if self.first_row is None:
+			self.first_row = cells
+		if self.group == "thead" and self.first_thead_row is None:
+			self.first_thead_row = cells
+		if self.group == "tbody" and self.tbody_count == 1:
+			self.tbody_tr_count += 1
+		self.cells = cells
+
+	def add_cell(self, tag):
+		if self.in_cell or not self.in_row:
+			self.is_exact = False
+		self.in_cell = True
+		if self.tr_count == 0:
+			return
+		self.cells[0 if tag == "th" else 1] += 1
+
+	def open_group(self, tag):
+		if self.group or self.in_row:
+			self.is_exact = False
+		self.group = tag
+		self.seen_groups.add(tag)
+		if tag == "tbody":
+			self.tbody_count += 1
+
+	def close_tag(self, tag):
+		if tag in ("td", "th"):
+			if not self.in_cell:
+				self.is_exact = False
+			self.in_cell = False
+		elif tag == "tr":
+			if self.in_cell or not self.in_row:
+				self.is_exact = False
+			self.in_row = False
+		elif tag == self.group:
+			if self.in_row:
+				self.is_exact = False
+			self.group = None
+		elif tag in ("thead", "tbody", "tfoot"):
+			self.is_exact = False
+
+	def close(self, end):
+		self.end = end
+		if self.in_row or self.in_cell or self.group:
+			self.is_exact = False
+
+	def is_acceptable(self, args):
+		# mirrors HotTable.is_acceptable, on the counts left after --r1/--c1
+		if not self.is_exact:
+			# broken markup, the counts may be off, the extraction step decides
+			return True
+		try:
+			row_count = len(filter_list(range(self.row_count), args.r1))
+			col_count = len(filter_list(range(self.col_count), args.c1))
+		except (IndexError, ValueError):
+			# leave bad filters to the extraction step, which reports them
+			return True
+		if args.min_rows and row_count < args.min_rows: return False
+		if args.max_rows and row_count > args.max_rows: return False
+		if args.exact_rows and row_count != args.exact_rows: return False
+		if args.min_cols and col_count < args.min_cols: return False
+		if args.max_cols and col_count > args.max_cols: return False
+		if args.exact_cols and col_count != args.exact_cols: return False
+		return True
+
+	def __repr__(self):
+		return f"TableInfo #{self.position} ({self.row_count} x {self.col_count}) at {self.start}:{self.end}"
+
+
+def build_table_index(html: str):
+	"""
+	Cheap regex pass over the page, no DOM is built.
+	Row and column counts are approximate for badly broken markup,
+	such tables are marked not exact and never rejected on them.
+	"""
+	index = []
+	stack = []
+	caption_start = None
+
+	for match in TOKEN_PATTERN.finditer(html):
+		tag = match.group(3)
+		if tag is None:
+			continue
+		tag = tag.lower()
+		closing = match.group(2) == "/"
+
+		if tag == "table":
+			if closing:
+				if stack:
+					stack.pop().close(match.end())
+			else:
+				if stack and stack[-1].in_row and not stack[-1].in_cell:
+					stack[-1].is_exact = False
+				info = TableInfo(len(index), match.start(), match.group(4))
+				index.append(info)
+				stack.append(info)
+			continue
+		elif not stack:
+			continue
+
+		info = stack[-1]
+		if tag == "caption":
+			if not closing:
+				caption_start = match.end()
+			elif caption_start is not None:
+				caption = TAG_PATTERN.sub("", html[caption_start:match.start()])
+				info.caption = " ".join(htmllib.unescape(caption).split())
+				caption_start = None
+		elif closing:
+			info.close_tag(tag)
+		elif tag in ("thead", "tbody", "tfoot"):
+			info.open_group(tag)
+		elif tag == "tr":
+			info.add_row()
+		else:
+			info.add_cell(tag)
+
+	for info in stack:
+		info.close(len(html))
+		info.is_exact = False
+	return index
+
+
+def select_tables(index, args):
+	tables = filter_list(index, args.t1)
+	if args.table_id:
+		tables = [t for t in tables if t.id == args.table_id]
+	if args.table_class:
+		tables = [t for t in tables if args.table_class in t.classes]
+	if args.caption:
+		caption = args.caption.lower()
+		tables = [t for t in tables if caption in t.caption.lower()]
+	return [t for t in tables if t.is_acceptable(args)]
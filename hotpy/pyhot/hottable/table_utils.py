@@ -1,3 +1,8 @@
+import array
+import hashlib
+import itertools
+
+from .columnar import ColumnarRows
 from .evaluate import alphabet
 
 
@@ -39,3 +44,36 @@ def get_snippet_args(arg: str):
 	return (c1, r1, c2, r2)
 
 
+# cells hashed at a time, so that no table is turned into one huge string
+DIGEST_CHUNK_SIZE = 65536
+
+
+def update_cells_digest(digest, cells):
+	# types are part of it, as 1, 1.0, True and "1" must not match
+	cells = iter(cells)
+	while chunk := list(itertools.islice(cells, DIGEST_CHUNK_SIZE)):
+		digest.update(repr(chunk).encode("utf-8", "backslashreplace"))
+		digest.update(" ".join(type(cell).__name__ for cell in chunk).encode("ascii"))
+
+
+def get_table_fingerprint(headers, rows):
+	"""
+	Digest of the headers and every cell (with its type) of a table.
+	"""
+	digest = hashlib.blake2b(digest_size=16)
+	update_cells_digest(digest, map(str, headers))
+	if isinstance(rows, ColumnarRows):
+		digest.update(f"columnar {rows.length}".encode("ascii"))
+		for column in rows.columns:
+			digest.update(column.kind.encode("ascii"))
+			if column.kind == "object":
+				update_cells_digest(digest, column.values)
+			else:
+				digest.update(column.values.tobytes())
+				digest.update(bytes(column.nulls or b""))
+	else:
+		widths = array.array("q", map(len, rows))
+		digest.update(f"rows {len(widths)}".encode("ascii"))
+		digest.update(widths.tobytes())
+		update_cells_digest(digest, itertools.chain.from_iterable(rows))
+	return digest.digest()
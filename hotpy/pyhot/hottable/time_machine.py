@@ -1,41 +1,121 @@
 from .snapshot import Snapshot
+from ..cache import parse_size, format_size
 
 
 
 class TimeMachine:
+	"""
+	Undo and redo stacks of snapshots. Each snapshot shares what did not
+	change with the one before it, and the oldest ones are dropped when
+	all of them together go over the --snap-budget.
+	"""
 	def __init__(self, hotdoc):
 		self.hotdoc = hotdoc
 		self.snapshots = []
+		self.redo_snapshots = []
+		self.snap_count = 0
 
-	def snap(self):
-		if self.snapshots and self.snapshots[-1].hash == self.hotdoc.hash:
-			print(f"Snapshots up-to-date: {self.snapshots[-1]}")
+	@property
+	def max_bytes(self):
+		return parse_size(self.hotdoc.args.snap_budget)
+
+	@property
+	def nbytes(self):
+		return sum(snapshot.nbytes for snapshot in self.snapshots + self.redo_snapshots)
+
+	def add_snapshot(self, stack, snapshot):
+		if snapshot.id is None:
+			self.snap_count += 1
+			snapshot.id = self.snap_count
+		stack.append(snapshot)
+
+	def snap(self, quiet=False):
+		previous = self.snapshots[-1] if self.snapshots else None
+		# unchanged tables are only checked cell by cell when their fingerprints match
+		snapshot = Snapshot(self, previous)
+		if snapshot.is_unchanged:
+			if not quiet:
+				print(f"Snapshots up-to-date: {previous}")
 			return
 
-		snapshot = Snapshot(self)
-		self.snapshots.append(snapshot)
-		print(f"Took a snapshot: {snapshot}")
+		self.add_snapshot(self.snapshots, snapshot)
+		self.redo_snapshots = []
+		if not quiet:
+			print(f"Took a snapshot: {snapshot}")
+		self.enforce_budget()
+
+	def enforce_budget(self):
+		"""
+		Drops the oldest snapshots while over the budget, or with --snap-dir
+		moves them to .hot files there. The newest snapshot always stays,
+		even when it is over the budget on its own.
+		"""
+		max_bytes = self.max_bytes
+		snap_dir = self.hotdoc.args.snap_dir
+		dropped = spilled = 0
+		i = 0
+		while i < len(self.snapshots) - 1 and self.nbytes > max_bytes:
+			snapshot = self.snapshots[i]
+			if snap_dir is None:
+				self.snapshots.pop(i)
+				dropped += 1
+			elif snapshot.path is None:
+				snapshot.spill(snap_dir)
+				spilled += 1
+				i += 1
+			else:
+				i += 1
+				continue
+			# the snapshot after it may have shared data with it
+			if i < len(self.snapshots) and self.snapshots[i].path is None:
+				self.snapshots[i].own_all_data()
+		if dropped:
+			print(f"Forgot {dropped} oldest snapshots to stay under {format_size(max_bytes)}")
+		if spilled:
+			print(f"Moved {spilled} oldest snapshots to '{snap_dir}' to stay under {format_size(max_bytes)}")
 
 	def forget(self):
-		print(f"Forgot {len(self.snapshots)} snapshots!")
+		print(f"Forgot {len(self.snapshots) + len(self.redo_snapshots)} snapshots!")
+		for snapshot in self.snapshots + self.redo_snapshots:
+			snapshot.delete_file()
 		self.snapshots = []
+		self.redo_snapshots = []
 
 	def history(self):
 		print(f"Found {len(self.snapshots)} snapshots!")
 		for i, snapshot in enumerate(self.snapshots, start=1):
 			print(f"\t{i:2}/{len(self.snapshots):02}. {snapshot}")
+		if self.redo_snapshots:
+			print(f"Can redo {len(self.redo_snapshots)} times ({format_size(self.nbytes)} used in all)")
+
+	def travel(self, source, target):
+		"""
+		Moves the document to the top snapshot of source, pushing its
+		current state to target. Like a plain undo, one snapshot is used
+		up per call, even one that is the same as the current state.
+		"""
+		if not source:
+			return None
+		snapshot = source.pop()
+		current = Snapshot(self, snapshot)
+		snapshot.restore(current)
+		snapshot.delete_file()
+		current.own_all_data()
+		self.add_snapshot(target, current)
+		return snapshot
 
 	def undo(self):
-		if not self.snapshots:
+		snapshot = self.travel(self.snapshots, self.redo_snapshots)
+		if snapshot is None:
 			print(f"No snapshots to undo to!")
 			return
-
-		snapshot = self.snapshots.pop()
-		self.hotdoc.empty_document()
-		self.hotdoc.add_hot_tables_from_json_text(snapshot.json_text)
 		print(f"Did undo to: {snapshot}!")
 
 	def redo(self):
-		print(f"Redo command not implemented!")
-
+		snapshot = self.travel(self.redo_snapshots, self.snapshots)
+		if snapshot is None:
+			print(f"Nothing to redo!")
+			return
+		print(f"Did redo to: {snapshot}!")
+		self.enforce_budget()
 
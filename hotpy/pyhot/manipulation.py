@@ -1,6 +1,6 @@
-import uuid
+import random
 
-from .utils import filter_list_by_args, strip_leading_dots
+from .utils import strip_leading_dots
 from .utils import to_bool, to_int, to_float, to_str, to_rounded
 
 
@@ -16,14 +16,12 @@ def manipulate_table(table, flag):
 	match manipulator:
 		# index addition stuff
 		case "--id":
-			table.headers = ["Id", *table.headers]
-			table.rows = [[i+1, *row] for i, row in enumerate(table.rows)]
+			table.insert_first_column("Id", list(range(1, table.row_count+1)))
 		case "--index":
-			table.headers = ["Index", *table.headers]
-			table.rows = [[i, *row] for i, row in enumerate(table.rows)]
+			table.insert_first_column("Index", list(range(table.row_count)))
 		case "--uuid":
-			table.headers = ["UUID", *table.headers]
-			table.rows = [[str(uuid.uuid4()), *row] for row in table.rows]
+			import uuid
+			table.insert_first_column("UUID", [str(uuid.uuid4()) for _ in range(table.row_count)])
 
 		# conversion stuff
 		case "--bool": table.convert_columns_to_x(args, to_bool)
@@ -53,15 +51,13 @@ def manipulate_table(table, flag):
 		# ordering stuff
 		case "-a" | "--ascending": table.sort_rows_by_args(args)
 		case "-d" | "--descending": table.sort_rows_by_args(args, reverse=True)
-		case "-R" | "--reverse": table.rows.reverse()
+		case "-R" | "--reverse":
+			table.rows.reverse()
+			table.touch()
 
 		# filtering stuff
-		case "-r" | "--rows":
-			table.rows = filter_list_by_args(table.rows, args)
-
-		case "-c" |  "--cols":
-			table.headers = filter_list_by_args(table.headers, args)
-			table.rows = [filter_list_by_args(row, args) for row in table.rows]
+		case "-r" | "--rows": table.filter_rows_by_args(args)
+		case "-c" |  "--cols": table.filter_cols_by_args(args)
 
 		case "--drop": table.drop_certain_columns(column_indexes)
 		case "--drop-naked": table.drop_naked_columns()
@@ -76,6 +72,9 @@ def manipulate_table(table, flag):
 
 		case "--min": table.min_max_filtering(args, max=False)
 		case "--max": table.min_max_filtering(args, max=True)
+		case "--distinct": table.distinct_rows(args)
+		case "--groupby": table.aggregate_rows(first_arg, args[1:])
+		case "--agg": table.aggregate_rows(None, args)
 		case "--random": table.select_random_rows(10, preserve_order=True)
 		case "--randomx": table.select_random_rows(10, preserve_order=False)
 
@@ -96,7 +95,9 @@ def manipulate_table(table, flag):
 		case "--right": table.choose_n_columns_from_left(flag.get_first_int(), right=True)
 
 		case "--mirror": table.mirror_table()
-		case "--shuffle": random.shuffle(table.rows)
+		case "--shuffle":
+			random.shuffle(table.rows)
+			table.touch()
 		case "--snip": table.snip_table(first_arg)
 		case "--transpose": table.transpose_table()
 
@@ -116,11 +117,12 @@ def manipulate_document(hotdoc, flag):
 		case "--widest":
 			hotdoc.tables = hotdoc.widest_tables()
 		case "--join": hotdoc.join_tables()
-		case "--union": hotdoc.union_tables()
+		case "--join-on": hotdoc.join_tables_on(flag.string_args)
+		case "--union": hotdoc.union_tables(flag.string_args)
 
 		case "--empty": hotdoc.empty_document()
-		case "--load": hotdoc.load_document()
-		case "--save": hotdoc.save_document()
+		case "--load": hotdoc.load_document(*flag.string_args[:1])
+		case "--save": hotdoc.save_document(*flag.string_args[:1])
 
 		case "--snap": hotdoc.time_machine.snap()
 		case "--forget": hotdoc.time_machine.forget()
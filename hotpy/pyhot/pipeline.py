@@ -0,0 +1,207 @@
+import argparse
+import contextlib
+import io
+import os
+import shlex
+import sys
+import time
+
+from .hottable.document import HotDocument
+from .plan import Plan
+
+
+
+class Pipeline:
+	"""
+	A saved flag chain: options and flags like on the command line, minus the
+	inputs, in a text file. Flags can go on one line or many, # starts a comment:
+
+		# biggest table of every page, summed up by category
+		--longest
+		--groupby category sum:amount
+		--csv
+
+	It is parsed and planned once, then run on every input on its own.
+	"""
+	def __init__(self, path, parse_command):
+		self.path = path
+		with open(path) as f:
+			argv = shlex.split(f.read(), comments=True)
+		self.args, hot_parser = parse_command(argv)
+		if hot_parser.args:
+			raise ValueError(f"Pipelines take no inputs, found: {', '.join(hot_parser.string_args)}")
+		# inputs are already spread over processes, one loader each is enough
+		self.args.jobs = 1
+		self.plan = Plan(hot_parser)
+		self.plan.push_limit_into_loading(self.args)
+		self.row_limit = self.args.row_limit
+
+	def run(self, input_path):
+		"""
+		Loads the input and runs the flag chain on it, returns its document.
+		"""
+		self.args.row_limit = self.row_limit
+		hotdoc = HotDocument(self.args)
+		hotdoc.add_hot_tables_from_args([input_path])
+		# later loads (--load, --undo) get every row again
+		self.args.row_limit = None
+		self.plan.run(hotdoc)
+		return hotdoc
+
+
+class InputResult:
+	def __init__(self, input_path):
+		self.input_path = input_path
+		self.output_path = None
+		self.table_values = []
+		self.table_count = 0
+		self.row_count = 0
+		self.messages = ""
+		self.error = None
+		self.seconds = 0
+
+	@property
+	def status(self):
+		if self.error is not None:
+			return "failed"
+		elif self.table_count == 0:
+			return "no tables"
+		return "ok"
+
+	def __repr__(self):
+		where = f" -> '{self.output_path}'" if self.output_path else ""
+		counts = f"{self.table_count} tables, {self.row_count} rows" if self.error is None else self.error
+		return f"{self.status:>9}  {self.seconds:7.3f}s  {self.input_path}: {counts}{where}"
+
+
+def get_output_extension(args):
+	if args.json:
+		return ".json"
+	elif args.html or args.html5:
+		return ".html"
+	elif args.xml:
+		return ".xml"
+	elif args.csv:
+		return ".csv"
+	elif args.markdown:
+		return ".md"
+	return ".txt"
+
+
+def get_output_paths(input_paths, output_dir, extension):
+	"""
+	Output file for every input, named after it, numbered when names repeat.
+	"""
+	paths = []
+	taken = set()
+	for input_path in input_paths:
+		name = os.path.splitext(os.path.basename(input_path.rstrip("/")))[0] or "output"
+		path, n = os.path.join(output_dir, f"{name}{extension}"), 1
+		while path in taken:
+			n += 1
+			path = os.path.join(output_dir, f"{name}-{n}{extension}")
+		taken.add(path)
+		paths.append(path)
+	return paths
+
+
+def run_input(pipeline, input_path, output_path=None):
+	"""
+	Runs the pipeline on one input. Writes the output when given a path,
+	else hands back the tables for the merged output.
+	"""
+	result = InputResult(input_path)
+	messages = io.StringIO()
+	start_time = time.perf_counter()
+	with contextlib.redirect_stdout(messages):
+		try:
+			hotdoc = pipeline.run(input_path)
+			result.table_count, result.row_count = hotdoc.table_count, hotdoc.row_count
+			if output_path is None:
+				result.table_values = [table.values for table in hotdoc.tables]
+			elif not hotdoc.is_empty:
+				with open(output_path, "w") as f:
+					hotdoc.write_output(f)
+				result.output_path = output_path
+		except Exception as e:
+			result.error = f"{type(e).__name__}: {e}"
+	result.seconds = time.perf_counter() - start_time
+	result.messages = messages.getvalue()
+	return result
+
+
+# set in every worker process, see init_worker
+worker_pipeline = None
+
+def init_worker(pipeline):
+	global worker_pipeline
+	worker_pipeline = pipeline
+
+def run_worker_input(input_path, output_path):
+	return run_input(worker_pipeline, input_path, output_path)
+
+
+def run_inputs(pipeline, input_paths, output_paths, jobs):
+	"""
+	Yields the result of every input, in input order.
+	"""
+	if jobs <= 1 or len(input_paths) < 2:
+		for input_path, output_path in zip(input_paths, output_paths):
+			yield run_input(pipeline, input_path, output_path)
+		return
+
+	import concurrent.futures
+	# the pipeline gets to every worker once, not with every input
+	with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(pipeline,)) as executor:
+		yield from executor.map(run_worker_input, input_paths, output_paths)
+
+
+def print_results(pipeline, results, seconds, jobs):
+	failed = [result for result in results if result.status != "ok"]
+	print(f"Ran '{pipeline.path}' on {len(results)} inputs in {seconds:.3f}s ({jobs} jobs): {len(results) - len(failed)} ok, {len(failed)} failed or without tables", file=sys.stderr)
+	for result in results:
+		print(result, file=sys.stderr)
+		for line in result.messages.splitlines():
+			print(f"{'':11}{line}", file=sys.stderr)
+
+
+def run_main(argv, parse_command):
+	"""
+	hot run PIPELINE INPUTS... --jobs N [-o FILE | --output-dir DIR]
+	:param parse_command: turns a command line into (args, hot_parser), see hot.py
+	"""
+	parser = argparse.ArgumentParser(prog="hot run", description="Run a saved flag chain on many inputs.", allow_abbrev=False)
+	parser.add_argument("pipeline", help="File with the options and flags to run")
+	parser.add_argument("inputs", nargs="+", help="Files or URLs, each one run on its own")
+	parser.add_argument("--jobs", type=int, default=1, help="Run up to N inputs at once, in worker processes")
+	parser.add_argument("-o", "--output", default=None, help="Merge the tables of every input into this file")
+	parser.add_argument("--output-dir", default=None, help="Write one output per input into this folder")
+	run_args = parser.parse_args(argv)
+
+	try:
+		pipeline = Pipeline(run_args.pipeline, parse_command)
+	except (OSError, ValueError) as e:
+		print(f"Bad pipeline '{run_args.pipeline}': {e}")
+		return 1
+
+	output_paths = [None] * len(run_args.inputs)
+	if run_args.output_dir:
+		os.makedirs(run_args.output_dir, exist_ok=True)
+		extension = get_output_extension(pipeline.args)
+		output_paths = get_output_paths(run_args.inputs, run_args.output_dir, extension)
+
+	start_time = time.perf_counter()
+	results = list(run_inputs(pipeline, run_args.inputs, output_paths, run_args.jobs))
+
+	if not run_args.output_dir:
+		# one document with the tables of every input, in input order
+		if run_args.output:
+			pipeline.args.output = run_args.output
+		hotdoc = HotDocument(pipeline.args)
+		for result in results:
+			for headers, rows in result.table_values:
+				hotdoc.tables.append(hotdoc.create_table_from_values(headers, rows))
+		hotdoc.produce_output()
+
+	print_results(pipeline, results, time.perf_counter() - start_time, run_args.jobs)
+	return 0 if all(result.status == "ok" for result in results) else 1
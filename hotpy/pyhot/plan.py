@@ -0,0 +1,270 @@
+from .manipulation import manipulate_document, manipulate_table
+from .utils import strip_leading_dots
+from .utils import to_bool, to_int, to_float, to_str, to_rounded
+
+
+
+CONVERTERS = {
+	"--bool": to_bool, "--int": to_int, "--float": to_float,
+	"--str": to_str, "--lower": str.lower, "--upper": str.upper,
+	"--strip": str.strip, "--lstrip": str.lstrip, "--rstrip": str.rstrip,
+}
+SCALERS = {
+	"--kilo": (1000, 0), "--mega": (1000_000, 0), "--giga": (1000_000_000, 0),
+	"--centi": (0, 100), "--milli": (0, 1000), "--micro": (0, 1000_000), "--nano": (0, 1000_000_000),
+}
+# flags that change cells one at a time and can share a single pass over the rows
+FUSABLE_FLAGS = [*CONVERTERS, *SCALERS, "--round"]
+
+# flags that turn every row into exactly one row, in the same order
+ROW_PRESERVING_FLAGS = [
+	*FUSABLE_FLAGS,
+	"--first-word", "--last-word", "--nth-word", "--slice",
+	"-t", "--template", "--parens", "--braces", "--brackets",
+	"--drop", "--drop-naked", "--keep", "--move", "--swap", "-c", "--cols",
+	"--left", "--right", "--shave", "--mirror",
+	"--id", "--index", "--uuid",
+]
+
+DOCUMENT_FLAGS = [
+	"--longest", "--widest", "--join", "--join-on", "--union",
+	"--empty", "--load", "--save",
+	"--snap", "--forget", "--history", "--undo", "--redo",
+]
+
+
+def describe_flag(flag):
+	return " ".join([flag.flag, *flag.string_args])
+
+
+def get_cell_ops(table, flag):
+	"""
+	(column index, function) pairs doing what the flag does to a table, cell by cell.
+	"""
+	args = flag.string_args
+	if not args:
+		return []
+	elif flag.flag in CONVERTERS:
+		to_x = CONVERTERS[flag.flag]
+		return [(cdx, to_x) for cdx in table.get_column_indexes(args)]
+	elif flag.flag in SCALERS:
+		divisor, multiplier = SCALERS[flag.flag]
+		if divisor:
+			scale = lambda x: None if x is None else x // divisor
+		else:
+			scale = lambda x: None if x is None else int(x * multiplier)
+		return [(cdx, scale) for cdx in table.get_column_indexes(args)]
+
+	ops = []
+	for arg in args:
+		digits, col_arg = strip_leading_dots(arg)
+		for cdx in table.get_column_indexes([col_arg]):
+			ops.append((cdx, lambda x, digits=digits: to_rounded(x, digits)))
+	return ops
+
+
+class PlanStep:
+	kind = "Table"
+
+	def __init__(self, flags):
+		self.flags = list(flags)
+
+	@property
+	def is_row_preserving(self):
+		return all(flag.flag in ROW_PRESERVING_FLAGS for flag in self.flags)
+
+	def can_merge(self, other):
+		return False
+
+	def run(self, hotdoc):
+		for flag in self.flags:
+			manipulate_document(hotdoc, flag)
+
+	def describe(self):
+		return f"{self.kind}: {', '.join(describe_flag(flag) for flag in self.flags)}"
+
+
+class DocumentStep(PlanStep):
+	kind = "Document"
+
+
+class MapStep(PlanStep):
+	"""
+	Cell conversions, scaling and rounding, all done in one pass over the rows.
+	"""
+	kind = "Map"
+
+	def can_merge(self, other):
+		return isinstance(other, MapStep)
+
+	def run(self, hotdoc):
+		for table in hotdoc.tables:
+			if table.is_columnar or not isinstance(table.rows, list):
+				# columnar tables already work a column at a time
+				for flag in self.flags:
+					manipulate_table(table, flag)
+				continue
+
+			ops = [op for flag in self.flags for op in get_cell_ops(table, flag)]
+			if not ops:
+				continue
+			table.touch()
+			for row in table.rows:
+				for cdx, fn in ops:
+					row[cdx] = fn(row[cdx])
+
+
+class BoundsStep(PlanStep):
+	"""
+	Neighbouring --min/--max flags, applied together.
+	"""
+	kind = "Filter"
+
+	def can_merge(self, other):
+		return isinstance(other, BoundsStep)
+
+	def run(self, hotdoc):
+		bounds = [(arg, flag.flag == "--max") for flag in self.flags for arg in flag.string_args]
+		if not bounds:
+			return
+		for table in hotdoc.tables:
+			table.filter_rows_by_bounds(bounds)
+
+
+class SortStep(PlanStep):
+	"""
+	Neighbouring -a/-d flags as one sort, keeping only the top rows when a --head follows.
+	"""
+	kind = "Sort"
+
+	def __init__(self, flags):
+		super().__init__(flags)
+		self.limit = None
+
+	def can_merge(self, other):
+		return isinstance(other, SortStep)
+
+	def run(self, hotdoc):
+		keys = [(arg, flag.flag in ["-d", "--descending"]) for flag in self.flags for arg in flag.string_args]
+		for table in hotdoc.tables:
+			table.sort_rows_by_keys(keys, limit=self.limit)
+
+	def describe(self):
+		description = super().describe()
+		if self.limit is not None:
+			description += f" (top {self.limit})"
+		return description
+
+
+class GroupStep(PlanStep):
+	"""
+	A --groupby with the --agg flag that follows it, as one aggregation.
+	"""
+	kind = "Aggregate"
+
+	def can_merge(self, other):
+		return isinstance(other, GroupStep) and self.flags[-1].flag == "--groupby" and other.flags[0].flag == "--agg"
+
+	def run(self, hotdoc):
+		key_arg, agg_args = None, []
+		for flag in self.flags:
+			if flag.flag == "--groupby":
+				key_arg, *agg_args = flag.string_args or [None]
+			else:
+				agg_args.extend(flag.string_args)
+		for table in hotdoc.tables:
+			table.aggregate_rows(key_arg, agg_args)
+
+
+class LimitStep(PlanStep):
+	kind = "Limit"
+
+	def __init__(self, flags):
+		super().__init__(flags)
+		self.loading = False
+
+	@property
+	def limit(self):
+		return self.flags[0].get_first_int(default=10)
+
+	def describe(self):
+		description = super().describe()
+		if self.loading:
+			description += " (also applied while loading)"
+		return description
+
+
+def make_step(flag):
+	if flag.flag in DOCUMENT_FLAGS:
+		return DocumentStep([flag])
+	elif flag.flag in FUSABLE_FLAGS:
+		return MapStep([flag])
+	elif flag.flag in ["--min", "--max"]:
+		return BoundsStep([flag])
+	elif flag.flag in ["-a", "--ascending", "-d", "--descending"]:
+		return SortStep([flag])
+	elif flag.flag in ["--groupby", "--agg"]:
+		return GroupStep([flag])
+	elif flag.flag == "--head":
+		return LimitStep([flag])
+	return PlanStep([flag])
+
+
+class Plan:
+	"""
+	The flags of a command line as steps: --head limits are moved in front of
+	row preserving steps, then neighbouring maps, min/max bounds and sorts are merged.
+	"""
+	def __init__(self, flags):
+		self.flags = list(flags)
+		self.steps = self.fuse_steps(self.push_down_limits([make_step(flag) for flag in self.flags]))
+
+	@staticmethod
+	def push_down_limits(steps):
+		steps = list(steps)
+		for i in range(len(steps)):
+			if not isinstance(steps[i], LimitStep):
+				continue
+			j = i
+			while j > 0 and steps[j-1].is_row_preserving:
+				steps[j-1], steps[j] = steps[j], steps[j-1]
+				j -= 1
+		return steps
+
+	@staticmethod
+	def fuse_steps(steps):
+		fused = []
+		for step in steps:
+			if fused and fused[-1].can_merge(step):
+				fused[-1].flags.extend(step.flags)
+			else:
+				fused.append(step)
+
+		for step, next_step in zip(fused, fused[1:]):
+			if isinstance(step, SortStep) and isinstance(next_step, LimitStep) and next_step.limit >= 0:
+				step.limit = next_step.limit
+		return fused
+
+	def push_limit_into_loading(self, args):
+		"""
+		Lets the loaders drop rows past a leading --head, when that cannot
+		change which tables are kept. Types are then inferred from the
+		kept rows only, the rows that get printed.
+		"""
+		first = self.steps[0] if self.steps else None
+		if not isinstance(first, LimitStep):
+			return
+		limit = first.limit
+		if limit < 0 or any(x is not None for x in [args.min_rows, args.max_rows, args.exact_rows]):
+			return
+		args.row_limit = limit
+		first.loading = True
+
+	def run(self, hotdoc):
+		for step in self.steps:
+			step.run(hotdoc)
+
+	def print(self):
+		print(f"Plan ({len(self.steps)} steps from {len(self.flags)} flags):")
+		for i, step in enumerate(self.steps, start=1):
+			print(f"\t{i:2}. {step.describe()}")
@@ -10,10 +10,19 @@ from .utils import format_duration_ns
 
 
 HISTORY_FILE = os.path.expanduser("~/.hottable_repl_history")
+TIME_MACHINE_FLAGS = ["--snap", "--forget", "--history", "--undo", "--redo"]
+
+# a hot --serve process can start many REPLs, the history is loaded and saved once
+history_loaded = False
 
 def load_history():
+	global history_loaded
+	if history_loaded:
+		return
+	history_loaded = True
 	if os.path.exists(HISTORY_FILE):
 		readline.read_history_file(HISTORY_FILE)
+	atexit.register(save_history)
 
 def save_history():
 	readline.write_history_file(HISTORY_FILE)
@@ -21,8 +30,7 @@ def save_history():
 
 def start_repl(hotdoc):
 	load_history()
-	atexit.register(save_history)
-	hash_1 = hotdoc.hash
+	fingerprint_1 = hotdoc.fingerprint
 
 	while True:
 		try:
@@ -51,16 +59,19 @@ def start_repl(hotdoc):
 			for arg in rest:
 				flag.add_arg(arg)
 
+			if hotdoc.args.auto_snap and flag.flag not in TIME_MACHINE_FLAGS:
+				hotdoc.time_machine.snap(quiet=True)
+
 			start_time = time.perf_counter()
 			manipulate_document(hotdoc, flag)
 			end_time = time.perf_counter()
-			hash_2 = hotdoc.hash
+			fingerprint_2 = hotdoc.fingerprint
 
-			if hash_2 == hash_1:
+			if fingerprint_2 == fingerprint_1:
 				print(f"Nothing happened!")
 			else:
 				hotdoc.print_tables()
-				hash_1 = hash_2
+				fingerprint_1 = fingerprint_2
 
 			execution_time = end_time - start_time
 			formatted_time = format_duration_ns(execution_time * 1000_000_000)
@@ -0,0 +1,206 @@
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+
+from .cache import parse_size
+from .client import get_socket_path, send_frame, recv_frame, EXIT_CODE
+from .client import REQUEST, STDIN, STDOUT, STDERR, NEED_STDIN, EXIT
+from .hottable.table_cache import keep_recent_tables
+
+
+
+class FrameWriter(io.RawIOBase):
+	"""
+	An output stream of the client, each write sent as one frame.
+	"""
+	def __init__(self, conn, kind, is_tty=False):
+		self.conn = conn
+		self.kind = kind
+		self.is_tty = is_tty
+
+	def writable(self):
+		return True
+
+	def isatty(self):
+		return self.is_tty
+
+	def write(self, data):
+		send_frame(self.conn, self.kind, bytes(data))
+		return len(data)
+
+
+class FrameReader(io.RawIOBase):
+	"""
+	The client's stdin. The client only starts sending it when the command
+	first reads it, so commands that never do leave it alone.
+	"""
+	def __init__(self, conn, reader, is_tty=False):
+		self.conn = conn
+		self.reader = reader
+		self.is_tty = is_tty
+		self.asked = False
+		self.done = False
+		self.pending = b""
+
+	def readable(self):
+		return True
+
+	def isatty(self):
+		return self.is_tty
+
+	def readinto(self, buffer):
+		if not self.asked:
+			send_frame(self.conn, NEED_STDIN)
+			self.asked = True
+		while not self.pending and not self.done:
+			kind, payload = recv_frame(self.reader)
+			if kind == STDIN:
+				self.pending = payload
+			else:
+				self.done = True
+		n = min(len(buffer), len(self.pending))
+		buffer[:n] = self.pending[:n]
+		self.pending = self.pending[n:]
+		return n
+
+
+def open_text_stream(raw, info, reading=False):
+	encoding, errors, is_tty = info
+	if reading:
+		return io.TextIOWrapper(io.BufferedReader(raw), encoding=encoding, errors=errors)
+	# same buffering as the client's own stream would have
+	return io.TextIOWrapper(io.BufferedWriter(raw), encoding=encoding, errors=errors, line_buffering=is_tty)
+
+
+def get_exit_code(e):
+	if e.code is None:
+		return 0
+	elif isinstance(e.code, int):
+		return e.code
+	print(e.code, file=sys.stderr)
+	return 1
+
+
+def run_request(conn, main):
+	"""
+	Runs one command for a client, as if hot was started in its folder
+	with its arguments, environment and standard streams.
+	"""
+	reader = conn.makefile("rb")
+	kind, payload = recv_frame(reader)
+	if kind != REQUEST:
+		return
+	request = json.loads(payload)
+
+	saved_streams = sys.stdin, sys.stdout, sys.stderr
+	saved_argv, saved_cwd, saved_env = sys.argv, os.getcwd(), dict(os.environ)
+	try:
+		os.chdir(request["cwd"])
+		os.environ.clear()
+		os.environ.update(request["env"])
+		sys.argv = [request["prog"], *request["argv"]]
+		sys.stdin = open_text_stream(FrameReader(conn, reader, request["stdin"][2]), request["stdin"], reading=True)
+		sys.stdout = open_text_stream(FrameWriter(conn, STDOUT, request["stdout"][2]), request["stdout"])
+		sys.stderr = open_text_stream(FrameWriter(conn, STDERR, request["stderr"][2]), request["stderr"])
+		sys.stderr.reconfigure(line_buffering=True)
+
+		code = 0
+		try:
+			main()
+		except SystemExit as e:
+			code = get_exit_code(e)
+		except Exception:
+			traceback.print_exc()
+			code = 1
+		sys.stdout.flush()
+		sys.stderr.flush()
+		send_frame(conn, EXIT, EXIT_CODE.pack(code))
+	except OSError:
+		# the client went away
+		pass
+	finally:
+		sys.stdin, sys.stdout, sys.stderr = saved_streams
+		sys.argv = saved_argv
+		os.environ.clear()
+		os.environ.update(saved_env)
+		os.chdir(saved_cwd)
+
+
+def warm_up(args):
+	"""
+	Imports what commands might need, opens the HTTP session and
+	reads the page cache index, so that no command has to.
+	"""
+	from . import repl, stream
+	from .fetch import get_fetcher
+	from .hottable import extractor
+	from .hottable.kernels import load_numpy
+	from .output import get_environment
+	import lxml.etree
+	import tabulate
+
+	load_numpy()
+	get_environment()
+	get_fetcher(
+		concurrency=args.concurrency, per_host=args.per_host,
+		rate=args.rate, retries=args.retries, timeout=args.timeout,
+		cache_dir=args.cache_dir, cache_size=args.cache_size
+	)
+
+
+def is_listening(path):
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+		try:
+			sock.connect(path)
+			return True
+		except OSError:
+			return False
+
+
+def serve(args, main):
+	"""
+	Runs commands sent by hot clients to the socket, one at a time,
+	in this process, which keeps its modules, HTTP sessions, page cache
+	index and recently loaded tables from one command to the next.
+	:param main: what runs a command, given its arguments in sys.argv
+	"""
+	path = get_socket_path()
+	if not path:
+		print("No socket to serve on, HOT_SOCKET is empty.")
+		return
+	if os.path.exists(path):
+		if is_listening(path):
+			print(f"Already serving on '{path}'")
+			return
+		os.remove(path)
+
+	warm_up(args)
+	keep_recent_tables(parse_size(args.serve_memory))
+
+	server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	# the commands run as this user, nobody else gets to send them
+	umask = os.umask(0o177)
+	try:
+		server.bind(path)
+	finally:
+		os.umask(umask)
+	server.listen(128)
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+	print(f"Serving on '{path}'")
+	sys.stdout.flush()
+
+	try:
+		while True:
+			conn, _ = server.accept()
+			with conn:
+				run_request(conn, main)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.close()
+		os.remove(path)
+		print(f"Stopped serving on '{path}'")
@@ -0,0 +1,120 @@
+import os
+import subprocess
+import sys
+
+
+
+# imports that cost more than most commands take to run, each is only
+# needed by some inputs, outputs or flags
+HEAVY_MODULES = [
+	"bs4", "jinja2", "lxml", "numpy", "pyperclip",
+	"readline", "requests", "tabulate", "urllib3",
+]
+PROFILE_FLAGS = ["--startup-profile"]
+PROFILE_OPTIONS = ["--startup-budget"]
+SLOWEST_COUNT = 12
+
+
+class ImportTime:
+	def __init__(self, line):
+		# import time:       self |       cumulative | <2 spaces per level>name
+		self_us, cumulative_us, name = line[len("import time:"):].rstrip("\n").split("|")
+		self.self_us = int(self_us)
+		self.cumulative_us = int(cumulative_us)
+		self.level = (len(name) - len(name.lstrip()) - 1) // 2
+		self.name = name.strip()
+
+	@property
+	def top_name(self):
+		return self.name.split(".")[0]
+
+
+def strip_profile_args(argv):
+	"""
+	argv without the startup profile flags, for the command being profiled.
+	"""
+	stripped = []
+	skip = False
+	for arg in argv:
+		if skip:
+			skip = False
+		elif arg in PROFILE_FLAGS:
+			pass
+		elif arg in PROFILE_OPTIONS:
+			skip = True
+		elif arg.split("=")[0] not in PROFILE_OPTIONS:
+			stripped.append(arg)
+	return stripped
+
+
+def run_with_import_times(argv):
+	"""
+	Runs hot with argv in a new interpreter under -X importtime.
+	Returns the exit code, the imports done to start up
+	and the imports done later, on the way.
+	"""
+	root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	code = f"import sys; sys.path.insert(0, {root!r}); sys.argv[0] = 'hot'; import hot; hot.main()"
+	process = subprocess.Popen(
+		[sys.executable, "-X", "importtime", "-c", code, *argv],
+		stderr=subprocess.PIPE, text=True
+	)
+
+	imports = []
+	for line in process.stderr:
+		if not line.startswith("import time:"):
+			sys.stderr.write(line)
+		elif not line.startswith("import time: self"):
+			imports.append(ImportTime(line))
+	returncode = process.wait()
+
+	# a module is printed once it is done, so what comes after the
+	# interpreter's own imports (ending with site) up to hot itself is startup
+	imports = imports[get_position(imports, "site") + 1:]
+	hot_position = get_position(imports, "hot")
+	startup = [it for it in imports[:hot_position + 1] if it.level == 0]
+	on_demand = [it for it in imports[hot_position + 1:] if it.level == 0]
+	return returncode, startup, on_demand, imports
+
+
+def get_position(imports, name):
+	return next((i for i, it in enumerate(imports) if it.name == name and it.level == 0), -1)
+
+
+def format_us(us):
+	return f"{us / 1000:.1f} ms"
+
+
+def print_profile(startup, on_demand, imports, heavy):
+	print(f"Startup: {format_us(sum(it.cumulative_us for it in startup))}, {len(imports)} modules in all", file=sys.stderr)
+	print(f"On demand: {format_us(sum(it.cumulative_us for it in on_demand))}", file=sys.stderr)
+	print(f"Slowest imports:", file=sys.stderr)
+	slowest = sorted(imports, key=lambda it: it.self_us, reverse=True)
+	for it in slowest[:SLOWEST_COUNT]:
+		print(f"{format_us(it.self_us):>10}  {it.name}", file=sys.stderr)
+	print(f"Heavy modules: {', '.join(heavy) if heavy else 'none'}", file=sys.stderr)
+
+
+def profile_startup(argv, budget_ms=None):
+	"""
+	Runs a hot command and reports where its import time went.
+	With a budget the command fails if its imports took longer than
+	budget_ms in all, or if it loaded any of the heavy modules.
+	:param argv: the command's arguments, without the profile flags
+	"""
+	returncode, startup, on_demand, imports = run_with_import_times(argv)
+	names = set(it.top_name for it in imports)
+	heavy = [name for name in HEAVY_MODULES if name in names]
+	print_profile(startup, on_demand, imports, heavy)
+	if returncode:
+		return returncode
+
+	if budget_ms is not None:
+		total_ms = sum(it.cumulative_us for it in startup + on_demand) / 1000
+		if total_ms > budget_ms:
+			print(f"Imports took {total_ms:.1f} ms, over the {budget_ms} ms budget.", file=sys.stderr)
+			return 1
+		if heavy:
+			print(f"Heavy modules were loaded: {', '.join(heavy)}", file=sys.stderr)
+			return 1
+	return 0
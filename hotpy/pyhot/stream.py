@@ -0,0 +1,207 @@
+import collections
+import csv
+import itertools
+import os
+import sys
+
+from .hottable.inference import get_column_converters, apply_column_converters
+from .hottable.table import HotTable
+from .manipulation import manipulate_table
+from .utils import filter_list, is_int
+from .writers import CsvWriter, JsonWriter
+
+
+
+# flags that only ever look at one row at a time
+ROW_LOCAL_FLAGS = [
+	"--bool", "--int", "--float",
+	"--str", "--lower", "--upper", "--strip", "--lstrip", "--rstrip", "--shave",
+	"--kilo", "--mega", "--giga", "--centi", "--milli", "--micro", "--nano",
+	"-t", "--template", "--round",
+	"-c", "--cols", "--drop", "--drop-naked", "--keep", "--move", "--swap",
+	"--parens", "--braces", "--brackets",
+	"--min", "--max",
+	"--first-word", "--last-word", "--nth-word", "--slice",
+	"--left", "--right",
+]
+# flags that need bounded state across batches
+LIMIT_FLAGS = ["--head", "--tail"]
+
+
+def get_unstreamable_flags(flags):
+	unstreamable = [flag.flag for flag in flags if flag.flag not in ROW_LOCAL_FLAGS + LIMIT_FLAGS]
+	tails = [flag for flag in flags if flag.flag == "--tail"]
+	if len(tails) > 1:
+		unstreamable.append("--tail (more than once)")
+	return unstreamable
+
+
+def filter_stream(rows, s):
+	if s is None:
+		return rows
+	elif is_int(s) and int(s) >= 0:
+		return itertools.islice(rows, int(s))
+
+	parts = s.split(":")
+	if "," not in s and 1 < len(parts) <= 3:
+		try:
+			start, stop, step = [int(p) if p else None for p in parts + [""] * (3 - len(parts))]
+			if all(x is None or x >= 0 for x in (start, stop)) and (step is None or step > 0):
+				return itertools.islice(rows, start, stop, step)
+		except ValueError:
+			pass
+	raise ValueError(f"Filter '{s}' needs the whole table, not supported with --stream")
+
+
+class CsvBatchReader:
+	def __init__(self, hotdoc, csv_path, batch_size=10_000):
+		self.hotdoc = hotdoc
+		self.csv_path = csv_path
+		self.batch_size = batch_size
+
+	def __iter__(self):
+		args = self.hotdoc.args
+		with open(self.csv_path, "r") as file:
+			csv_reader = csv.reader(file)
+			self.headers = filter_list(next(csv_reader, []), args.c1)
+			rows = filter_stream(csv_reader, args.r1)
+
+			converters = None
+			reported = set()
+			while True:
+				batch = list(itertools.islice(rows, self.batch_size))
+				if not batch: break
+				if args.c1:
+					batch = [filter_list(row, args.c1) for row in batch]
+
+				if not args.no_infer:
+					if converters is None:
+						sample = batch[:args.infer_sample] if args.infer_sample else batch
+						converters = get_column_converters(sample)
+					for n in apply_column_converters(batch, converters):
+						if n not in reported:
+							print(f"Column {n} changed type after the first batch, kept as text where needed", file=sys.stderr)
+							reported.add(n)
+				yield batch
+
+
+class StreamPipeline:
+	def __init__(self, flags):
+		flags = list(flags)
+		tail_idx = next((i for i, flag in enumerate(flags) if flag.flag == "--tail"), None)
+		if tail_idx is None:
+			self.before, self.tail, self.after = flags, None, []
+		else:
+			self.before, self.tail, self.after = flags[:tail_idx], flags[tail_idx], flags[tail_idx+1:]
+
+		self.remaining = {}
+		for flag in flags:
+			if flag.flag == "--head":
+				self.remaining[id(flag)] = flag.get_first_int(default=10)
+
+		self.tail_rows = None
+		if self.tail:
+			self.tail_rows = collections.deque(maxlen=self.tail.get_first_int(default=10))
+
+	@property
+	def exhausted(self):
+		# a used up --head before any --tail means no later row can get through
+		return any(self.remaining[id(flag)] <= 0 for flag in self.before if flag.flag == "--head")
+
+	def apply(self, table, flag):
+		if flag.flag == "--head":
+			n = self.remaining[id(flag)]
+			table.rows = table.rows[:n]
+			self.remaining[id(flag)] = n - len(table.rows)
+		else:
+			manipulate_table(table, flag)
+
+	def process_batch(self, table):
+		for flag in self.before:
+			self.apply(table, flag)
+		if self.tail is not None:
+			self.tail_rows.extend(table.rows)
+			table.rows = []
+
+	def finish(self, table):
+		table.rows = list(self.tail_rows)
+		for flag in self.after:
+			self.apply(table, flag)
+
+
+def get_stream_writer(hotdoc, stream):
+	if hotdoc.args.json:
+		return JsonWriter(hotdoc, stream)
+	return CsvWriter(hotdoc, stream)
+
+
+def stream_table(hotdoc, reader, pipeline, writer):
+	def new_table():
+		table = HotTable(hotdoc)
+		table.headers = list(reader.headers)
+		return table
+
+	writer.begin(1)
+	table = None
+	started = False
+	for batch in reader:
+		table = new_table()
+		table.rows = batch
+		pipeline.process_batch(table)
+		if pipeline.tail is None:
+			if not started:
+				writer.begin_table(table)
+				started = True
+			writer.write_rows(table, table.rows)
+		if pipeline.exhausted:
+			break
+
+	if table is None:
+		# empty input, still work out the headers
+		table = new_table()
+		pipeline.process_batch(table)
+		if pipeline.tail is None:
+			writer.begin_table(table)
+
+	if pipeline.tail is not None:
+		pipeline.finish(table)
+		writer.begin_table(table)
+		writer.write_rows(table, table.rows)
+	writer.end_table(table)
+	writer.end()
+
+
+def stream_document(hotdoc, input_paths, flags):
+	args = hotdoc.args
+	if len(input_paths) != 1 or not input_paths[0].endswith(".csv"):
+		print(f"--stream needs exactly one CSV input, got: {input_paths}")
+		return
+	csv_path = input_paths[0]
+	if not os.path.isfile(csv_path):
+		print(f"File not found: '{csv_path}'")
+		return
+
+	unstreamable = get_unstreamable_flags(flags)
+	if unstreamable:
+		print(f"Cannot use with --stream: {', '.join(unstreamable)}")
+		return
+
+	if not args.csv and not args.json:
+		print(f"--stream only supports --csv and --json output")
+		return
+
+	try:
+		filter_stream(iter(()), args.r1)
+	except ValueError as e:
+		print(e)
+		return
+
+	reader = CsvBatchReader(hotdoc, csv_path, batch_size=args.batch_size)
+	pipeline = StreamPipeline(flags)
+	if args.output:
+		with open(args.output, "w") as f:
+			stream_table(hotdoc, reader, pipeline, get_stream_writer(hotdoc, f))
+		print(f"Saved: '{args.output}' (1 tables)")
+	else:
+		stream_table(hotdoc, reader, pipeline, get_stream_writer(hotdoc, sys.stdout))
+		sys.stdout.write("\n")
@@ -8,6 +8,9 @@ def to_bool(val):
 
 
 def to_int(val):
+	if val is None:
+		# empty cells stay empty
+		return None
 	if isinstance(val, int):
 		return val
 	if isinstance(val, float):
@@ -28,6 +31,8 @@ def to_int(val):
 
 
 def to_float(val):
+	if val is None:
+		return None
 	if isinstance(val, float):
 		return val
 	if isinstance(val, int):
@@ -58,6 +63,8 @@ def strip_leading_dots(val: str, ch="."):
 
 def to_rounded(val, digits=0):
 	val = to_float(val)
+	if val is None:
+		return None
 	return round(val, digits)
 
 
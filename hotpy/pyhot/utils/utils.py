@@ -1,6 +1,24 @@
+import contextlib
+import os
 
 
 
+@contextlib.contextmanager
+def open_replacing(path, mode="w"):
+	"""
+	A file written next to path and only moved over it once complete, so
+	that readers (and mappings) of the old file never see a partial one.
+	"""
+	tmp_path = f"{path}.{os.getpid()}.tmp"
+	try:
+		with open(tmp_path, mode) as f:
+			yield f
+		os.replace(tmp_path, path)
+	finally:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+
+
 def format_duration_ns(ns):
 	# Convert nanoseconds to seconds (1 second = 1_000_000_000 ns)
 	seconds = ns / 1_000_000_000
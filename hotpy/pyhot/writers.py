@@ -0,0 +1,292 @@
+import csv
+import html
+import json
+
+from .hottable.columnar import ColumnarRows
+
+
+
+WRITE_BATCH_SIZE = 10_000
+
+
+class CsvWriter:
+	streams_rows = True
+
+	def __init__(self, document, stream):
+		self.document = document
+		self.stream = stream
+		self.writer = csv.writer(stream)
+		self.table_count = 0
+
+	def begin(self, table_count):
+		pass
+
+	def begin_table(self, table):
+		if self.table_count:
+			self.stream.write("\n")
+		self.table_count += 1
+		self.writer.writerow(table.headers)
+
+	def write_rows(self, table, rows):
+		self.writer.writerows(rows)
+
+	def end_table(self, table):
+		pass
+
+	def end(self):
+		pass
+
+
+class JsonWriter:
+	"""
+	Writes the same text as json.dumps(document.jo, sort_keys=True, indent=...)
+	one row at a time. Headers come after data since keys are sorted.
+	"""
+	streams_rows = True
+
+	def __init__(self, document, stream):
+		self.document = document
+		self.stream = stream
+		indent = document.indent
+		self.indent = indent
+		self.space = None if indent is None else (indent if isinstance(indent, str) else " " * indent)
+		self.item_separator = ", " if indent is None else ","
+
+	def newline(self, level):
+		if self.space is None:
+			return ""
+		return "\n" + self.space * level
+
+	def dumps(self, value, level):
+		text = json.dumps(value, sort_keys=True, indent=self.indent)
+		if self.space is not None:
+			text = text.replace("\n", self.newline(level))
+		return text
+
+	def begin(self, table_count):
+		args = self.document.args
+		self.table_count = table_count
+		self.tables_written = 0
+		if args.flat and table_count == 1:
+			self.mode = "table"
+			self.stream.write("{" + self.newline(1) + '"table": ')
+			self.level = 1
+		elif args.naked and table_count == 1:
+			self.mode = "naked"
+			self.level = 0
+		else:
+			self.mode = "tables"
+			self.stream.write("{" + self.newline(1) + '"tables": ')
+			if table_count == 0:
+				self.stream.write("[]")
+			else:
+				self.stream.write("[" + self.newline(2))
+			self.level = 2
+
+	def begin_table(self, table):
+		if self.tables_written:
+			self.stream.write(self.item_separator + self.newline(self.level))
+		self.tables_written += 1
+		self.as_objects = table.args.obj and table.has_unique_column_names()
+		self.camel_headers = table.camel_headers if self.as_objects else None
+		self.rows_written = 0
+		self.stream.write("{" + self.newline(self.level + 1) + '"data": ')
+
+	def write_rows(self, table, rows):
+		if not rows:
+			return
+		if self.as_objects:
+			rows = [table.make_row_object(row, headers=self.camel_headers) for row in rows]
+		# one dumps for the whole batch, less its brackets, leaves the rows
+		# each starting with a newline at the right level
+		level = self.level + 2
+		text = self.dumps(list(rows), level - 1)
+		closing = len(self.newline(level - 1)) + 1
+		prefix = self.item_separator if self.rows_written else "["
+		self.stream.write(prefix + text[1:-closing])
+		self.rows_written += len(rows)
+
+	def end_table(self, table):
+		level = self.level
+		if self.rows_written:
+			self.stream.write(self.newline(level + 1) + "]")
+		else:
+			self.stream.write("[]")
+
+		headers = table.headers
+		if self.as_objects:
+			headers = table.make_row_object(table.headers, headers=self.camel_headers)
+		self.stream.write(self.item_separator + self.newline(level + 1) + '"headers": ')
+		self.stream.write(self.dumps(headers, level + 1))
+		self.stream.write(self.newline(level) + "}")
+
+	def end(self):
+		if self.mode == "tables":
+			if self.table_count:
+				self.stream.write(self.newline(1) + "]")
+			self.stream.write(self.newline(0) + "}")
+		elif self.mode == "table":
+			self.stream.write(self.newline(0) + "}")
+
+
+class TableTextWriter:
+	"""
+	Tabulate and markdown output. Column widths depend on every row,
+	so each table is written whole when it ends.
+	"""
+	streams_rows = False
+
+	def __init__(self, document, stream):
+		self.document = document
+		self.stream = stream
+		self.table_count = 0
+
+	def begin(self, table_count):
+		pass
+
+	def begin_table(self, table):
+		if self.table_count:
+			self.stream.write("\n")
+		self.table_count += 1
+
+	def write_rows(self, table, rows):
+		pass
+
+	def end_table(self, table):
+		self.stream.write(table.get_output_text())
+
+	def end(self):
+		pass
+
+
+def xml_element(tag, text):
+	# what ElementTree writes for a leaf element
+	if tag is None:
+		return html.escape(text, quote=False)
+	elif not text:
+		return f"<{tag} />"
+	return f"<{tag}>{html.escape(text, quote=False)}</{tag}>"
+
+
+class XmlWriter:
+	"""
+	Writes the same text as document_to_xml used to, building an
+	ElementTree and calling ET.indent on it, one row at a time.
+	"""
+	streams_rows = True
+
+	def __init__(self, document, stream):
+		self.document = document
+		self.stream = stream
+		self.space = document.space
+
+	def newline(self, level):
+		return "\n" + self.space * level
+
+	def begin(self, table_count):
+		self.tables_written = 0
+		self.stream.write("<data>" if table_count else "<data />")
+
+	def begin_table(self, table):
+		self.tables_written += 1
+		self.rows_written = 0
+		self.stream.write(self.newline(1) + "<HotTable")
+
+	def write_rows(self, table, rows):
+		headers = table.headers
+		chunks = [] if self.rows_written or not rows else [">"]
+		for row in rows:
+			cells = [xml_element(header, str(value)) for header, value in zip(headers, row)]
+			if cells:
+				cell_newline = self.newline(3)
+				chunks.append(self.newline(2) + "<HotRow>" + cell_newline + cell_newline.join(cells) + self.newline(2) + "</HotRow>")
+			else:
+				chunks.append(self.newline(2) + "<HotRow />")
+		self.rows_written += len(rows)
+		self.stream.write("".join(chunks))
+
+	def end_table(self, table):
+		if self.rows_written:
+			self.stream.write(self.newline(1) + "</HotTable>")
+		else:
+			self.stream.write(" />")
+
+	def end(self):
+		if self.tables_written:
+			self.stream.write(self.newline(0) + "</data>")
+
+
+class HtmlWriter:
+	"""
+	Writes the same text as document_to_html used to (an indented ElementTree
+	of the tables, with a row number in front of every row), one row at a time.
+	"""
+	streams_rows = True
+
+	def __init__(self, document, stream):
+		self.document = document
+		self.stream = stream
+		self.space = document.space
+
+	def newline(self, level):
+		return "\n" + self.space * level
+
+	def begin(self, table_count):
+		self.tables_written = 0
+		self.stream.write("<section>" if table_count else "<section />")
+
+	def get_row_html(self, tag, values):
+		if not values:
+			return "<tr />"
+		cell_newline = self.newline(4)
+		cells = [xml_element(tag, str(value)) for value in values]
+		return "<tr>" + cell_newline + cell_newline.join(cells) + self.newline(3) + "</tr>"
+
+	def begin_table(self, table):
+		self.tables_written += 1
+		self.rows_written = 0
+		self.stream.write(
+			self.newline(1) + "<table>" + self.newline(2) + "<thead>" + self.newline(3)
+			+ self.get_row_html("th", table.headers) + self.newline(2) + "</thead>"
+			+ self.newline(2) + "<tbody"
+		)
+
+	def write_rows(self, table, rows):
+		chunks = [] if self.rows_written or not rows else [">"]
+		for i, row in enumerate(rows, start=self.rows_written + 1):
+			chunks.append(self.newline(3) + self.get_row_html("td", [i, *row]))
+		self.rows_written += len(rows)
+		self.stream.write("".join(chunks))
+
+	def end_table(self, table):
+		if self.rows_written:
+			self.stream.write(self.newline(2) + "</tbody>")
+		else:
+			self.stream.write(" />")
+		self.stream.write(self.newline(1) + "</table>")
+
+	def end(self):
+		if self.tables_written:
+			self.stream.write(self.newline(0) + "</section>")
+
+
+def iter_row_batches(table, batch_size=WRITE_BATCH_SIZE):
+	rows = table.rows
+	if isinstance(rows, ColumnarRows):
+		for start in range(0, len(rows), batch_size):
+			yield rows[start:start + batch_size].to_lists()
+		return
+	rows = table.row_list
+	for start in range(0, len(rows), batch_size):
+		yield rows[start:start + batch_size]
+
+
+def write_document(document, writer):
+	writer.begin(document.table_count)
+	for table in document.tables:
+		writer.begin_table(table)
+		if writer.streams_rows:
+			for rows in iter_row_batches(table):
+				writer.write_rows(table, rows)
+		writer.end_table(table)
+	writer.end()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+
+
+# the package runs from its folder (python hotpy/hot.py), not installed
+HOTPY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hotpy")
+sys.path.insert(0, HOTPY_DIR)
@@ -0,0 +1,35 @@
+import os
+
+from pyhot.cache import TABLES_DIR
+from pyhot.hottable.table_cache import TableCache
+
+
+
+def no_walk(*args):
+	raise AssertionError("the cache tree was walked")
+
+
+def test_tables_are_indexed_and_evicted_without_walking(tmp_path, monkeypatch):
+	monkeypatch.setattr(os, "walk", no_walk)
+	table_cache = TableCache(str(tmp_path), 3000)
+	page_cache = table_cache.page_cache
+	table_cache.location = str(tmp_path / TABLES_DIR / "vtest")
+
+	page_cache.put("example.com/a", "x" * 100, {})
+	for key in ["aa01", "bb02"]:
+		table_cache.put(key, [(["a"], [[os.urandom(600).hex()]])])
+	assert table_cache.get("aa01") is not None
+	# over the budget, the page and then the table used longest ago go
+	table_cache.put("cc03", [(["a"], [[os.urandom(600).hex()]])])
+
+	assert set(page_cache.index) == {"tables/vtest/aa/aa01.pickle", "tables/vtest/cc/cc03.pickle"}
+	assert not os.path.exists(table_cache.get_path("bb02"))
+	assert page_cache.total_bytes <= 3000
+
+
+def test_other_extractor_versions_are_kept(tmp_path):
+	old_path = tmp_path / TABLES_DIR / "vold" / "ab" / "ab12.pickle"
+	old_path.parent.mkdir(parents=True)
+	old_path.write_bytes(b"")
+	TableCache(str(tmp_path), "1G")
+	assert old_path.exists()
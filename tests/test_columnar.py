@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from hot import parse_command
+from pyhot.hottable.columnar import ColumnarRows
+from pyhot.hottable.document import HotDocument
+from pyhot.plan import Plan
+
+
+
+def make_rows():
+	return ColumnarRows.from_rows([[i, i * 10] for i in range(6)], 2)
+
+
+def test_swap_keeps_both_rows():
+	rows = make_rows()
+	rows[0], rows[1] = rows[1], rows[0]
+	assert [list(row) for row in rows[:3]] == [[1, 10], [0, 0], [2, 20]]
+
+
+def test_view_keeps_its_row_when_overwritten():
+	rows = make_rows()
+	view = rows[2]
+	rows[2] = [7, 70]
+	assert list(view) == [2, 20]
+	assert list(rows[2]) == [7, 70]
+
+
+def test_view_still_writes_through():
+	rows = make_rows()
+	rows[3][1] = 99
+	assert list(rows[3]) == [3, 99]
+
+
+def test_shuffle_keeps_every_row_once():
+	rows = make_rows()
+	random.Random(4).shuffle(rows)
+	assert sorted(list(row) for row in rows) == [[i, i * 10] for i in range(6)]
+
+
+def run_flags(argv, columnar):
+	args, hot_parser = parse_command([*argv, "--columnar"] if columnar else argv)
+	hotdoc = HotDocument(args)
+	rows = [[i, f"w{i} x{i} y{i}", i * 1.5] for i in range(8)]
+	hotdoc.tables.append(hotdoc.create_table_from_values(["n", "words", "f"], rows))
+	Plan(hot_parser).run(hotdoc)
+	return hotdoc.tables[0]
+
+
+@pytest.mark.parametrize("argv", [
+	["--first-word", "words"],
+	["--last-word", "words"],
+	["--nth-word", "words=1"],
+	["--slice", "words=2:4"],
+	["--id"],
+	["--index"],
+	["-r", "1,3,5"],
+	["-r", "2:"],
+	["--cols", "0,2"],
+	["--mirror"],
+	["--snip", "a2:b5"],
+	["--parens", "words"],
+	["--move", "f=0", "--swap", "n=words"],
+	["--transpose"],
+])
+def test_manipulators_keep_tables_columnar(argv):
+	columnar = run_flags(argv, columnar=True)
+	assert columnar.is_columnar
+	assert columnar.values == run_flags(argv, columnar=False).values
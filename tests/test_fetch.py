@@ -0,0 +1,122 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("bs4")
+
+from pyhot.cache import PageCache
+from pyhot.fetch import PageFetcher
+
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+	# keep-alive, one connection can carry many requests
+	protocol_version = "HTTP/1.1"
+
+	def do_GET(self):
+		server = self.server
+		with server.lock:
+			server.requests.append((self.path, self.client_address[1], time.monotonic()))
+			server.active += 1
+			server.most_active = max(server.most_active, server.active)
+			failures = server.failures.get(self.path, 0)
+			if failures:
+				server.failures[self.path] = failures - 1
+		try:
+			time.sleep(server.delay)
+			status = 503 if failures else 200
+			body = f"<p>{self.path}</p>".encode("utf-8")
+			self.send_response(status)
+			self.send_header("Content-Type", "text/html; charset=utf-8")
+			self.send_header("Content-Length", str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+		finally:
+			with server.lock:
+				server.active -= 1
+
+	def log_message(self, *args):
+		pass
+
+
+@pytest.fixture
+def server():
+	server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+	server.daemon_threads = True
+	server.lock = threading.Lock()
+	server.requests = []
+	server.active = server.most_active = 0
+	server.failures = {}
+	server.delay = 0
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	server.url = f"http://127.0.0.1:{server.server_address[1]}"
+	try:
+		yield server
+	finally:
+		server.shutdown()
+		server.server_close()
+
+
+def make_fetcher(tmp_path, **kwargs):
+	return PageFetcher(page_cache=PageCache(str(tmp_path / "cache"), None), **kwargs)
+
+
+def fetch_all(fetcher, urls):
+	results = {}
+	for idx, html, error in fetcher.get_pages(urls):
+		assert error is None
+		results[idx] = html
+	return [results[idx] for idx in range(len(urls))]
+
+
+def test_per_host_limit(server, tmp_path):
+	server.delay = 0.1
+	fetcher = make_fetcher(tmp_path, concurrency=6, per_host=2)
+	urls = [f"{server.url}/{n}" for n in range(6)]
+	assert fetch_all(fetcher, urls) == [f"<p>/{n}</p>" for n in range(6)]
+	assert server.most_active == 2
+
+
+def test_retries_5xx_with_backoff(server, tmp_path):
+	server.failures["/flaky"] = 2
+	fetcher = make_fetcher(tmp_path, retries=3, backoff=0.1)
+	assert fetcher.get_page_html(f"{server.url}/flaky") == "<p>/flaky</p>"
+	times = [at for path, _, at in server.requests]
+	assert len(times) == 3
+	# urllib3 retries the first failure at once, then waits backoff * 2
+	assert times[2] - times[1] >= 0.2
+
+
+def test_rate_limit(server, tmp_path):
+	fetcher = make_fetcher(tmp_path, concurrency=6, per_host=6, rate=4)
+	urls = [f"{server.url}/{n}" for n in range(6)]
+	started = time.monotonic()
+	fetch_all(fetcher, urls)
+	# a burst of 4, then one more every quarter second
+	assert time.monotonic() - started >= 0.45
+
+
+def test_keep_alive_reuses_connection(server, tmp_path):
+	fetcher = make_fetcher(tmp_path, concurrency=1, per_host=1)
+	for n in range(3):
+		fetcher.get_page_html(f"{server.url}/{n}")
+	assert len(server.requests) == 3
+	assert len(set(port for _, port, _ in server.requests)) == 1
+
+
+def test_refetches_page_evicted_after_lookup(server, tmp_path):
+	fetcher = make_fetcher(tmp_path)
+	page_url = f"{server.url}/page"
+	fetcher.get_page_html(page_url, cache=True)
+	page_cache = fetcher.page_cache
+	entry = page_cache.get_entry(page_url)
+	# another fetch evicts the page between the lookup and the open
+	page_cache.get_entry = lambda page_url: entry
+	page_cache.remove(page_cache.get_key(page_url))
+	assert page_cache.open(page_url) is None
+	assert fetcher.get_page_html(page_url) == "<p>/page</p>"
+	assert len(server.requests) == 2
@@ -0,0 +1,35 @@
+from pyhot.hottable.columnar import ColumnarRows
+from pyhot.hottable.hot_format import iter_hot_tables, save_hot_file
+from pyhot.hottable.table import HotTable
+
+
+
+def save_and_map(path):
+	table = HotTable()
+	table.headers = ["n", "f", "s"]
+	table.rows = ColumnarRows.from_rows([[i, None if i == 2 else i / 2, f"s{i}"] for i in range(5)], 3)
+	save_hot_file(str(path), [table])
+	(headers, rows), = iter_hot_tables(str(path))
+	return rows
+
+
+def test_numbers_are_views_of_the_mapping(tmp_path):
+	rows = save_and_map(tmp_path / "doc.hot")
+	ints, floats, strs = rows.columns
+	assert isinstance(ints.values, memoryview) and ints.values.format == "q"
+	assert isinstance(floats.values, memoryview) and isinstance(floats.nulls, memoryview)
+	assert ints.values.obj is floats.values.obj
+	assert rows.to_lists()[2] == [2, None, "s2"]
+	assert [list(row) for row in rows[1:3]] == [[1, 0.5, "s1"], [2, None, "s2"]]
+
+
+def test_changes_copy_the_column(tmp_path):
+	path = tmp_path / "doc.hot"
+	rows = save_and_map(path)
+	rows[2][1] = 7.5
+	rows[0][0] = None
+	rows.reverse()
+	assert rows.to_lists()[-1] == [None, 0.0, "s0"]
+	assert rows.to_lists()[2] == [2, 7.5, "s2"]
+	(headers, mapped), = iter_hot_tables(str(path))
+	assert mapped.to_lists()[2] == [2, None, "s2"]
@@ -0,0 +1,17 @@
+from pyhot.hottable.joins import hash_join, join_positions
+
+
+
+def test_sorted_keys_of_different_types_fall_back_to_hash_join():
+	left, right = [1, 2, 3], ["a", "b"]
+	assert join_positions(left, right, "outer") == hash_join(left, right, "outer")
+	assert join_positions(left, right, "outer") == ([0, 1, 2, None, None], [None, None, None, 0, 1])
+	assert join_positions(left, right) == ([], [])
+
+
+def test_sorted_keys_merge_like_hash_join():
+	left, right = [1, 2, 2, 4], [2, 3, 4, 4]
+	for how in ["inner", "left", "outer"]:
+		merged = join_positions(left, right, how)
+		hashed = hash_join(left, right, how)
+		assert sorted(zip(*merged), key=repr) == sorted(zip(*hashed), key=repr)
@@ -0,0 +1,65 @@
+import json
+
+from hot import parse_command
+from pyhot.hottable.document import HotDocument
+from pyhot.hottable.json_loader import JsonTableReader
+
+
+
+TABLES = [
+	{"headers": ["a"]},
+	{"headers": ["b"], "data": [[1], [2]]},
+	{"headers": ["c"], "data": [[3]]},
+]
+
+
+def read_headers(tables_filter):
+	buf = json.dumps({"tables": TABLES}).encode("utf-8")
+	reader = JsonTableReader(buf, tables_filter=tables_filter)
+	return [headers for headers, rows in reader.iter_tables()]
+
+
+def test_table_filter_counts_readable_tables(capsys):
+	assert read_headers(None) == [["b"], ["c"]]
+	assert read_headers("1") == [["b"]]
+	assert read_headers("1:") == [["c"]]
+	assert read_headers("-1:") == [["c"]]
+	assert read_headers("0,1") == [["b"], ["c"]]
+	assert "needs 'headers' and 'data'" in capsys.readouterr().out
+
+
+def test_lazy_save_over_its_own_input(tmp_path, capsys):
+	path = tmp_path / "hotdoc.json"
+	path.write_text(json.dumps({"tables": TABLES[1:]}))
+	args, hot_parser = parse_command(["--lazy"])
+	hotdoc = HotDocument(args)
+	hotdoc.load_document(str(path))
+	hotdoc.tables[0].headers = ["d"]
+	hotdoc.save_document(str(path))
+
+	assert [list(row) for row in hotdoc.tables[1].rows] == [[3]]
+	saved = json.loads(path.read_text())
+	assert [table["headers"] for table in saved["tables"]] == [["d"], ["c"]]
+	assert saved["tables"][0]["data"] == [[1], [2]]
+	assert list(tmp_path.iterdir()) == [path]
+
+
+def test_filter_that_does_not_fit_skips_the_table(tmp_path, capsys):
+	path = tmp_path / "tables.json"
+	path.write_text(json.dumps({"tables": [
+		{"headers": ["a", "b"], "data": [[1, 2]]},
+		{"headers": ["a", "b", "c"], "data": [[1, 2, 3], [4, 5]]},
+		{"headers": ["a", "b", "c"], "data": [[1, 2, 3]]},
+	]}))
+	args, hot_parser = parse_command(["--c1", "0,2"])
+	hotdoc = HotDocument(args)
+	hotdoc.add_hot_tables_from_json_file(str(path))
+	assert [table.values for table in hotdoc.tables] == [(["a", "c"], [[1, 3]])]
+	assert capsys.readouterr().out.count("Can't apply filter '0,2': list index out of range") == 2
+
+	# lazy rows are decoded after their table was taken, short ones get empty cells
+	args, hot_parser = parse_command(["--c1", "0,2", "--lazy", "--no-infer"])
+	hotdoc = HotDocument(args)
+	hotdoc.add_hot_tables_from_json_file(str(path))
+	assert [table.values for table in hotdoc.tables] == [(["a", "c"], [[1, 3], [4, None]]), (["a", "c"], [[1, 3]])]
+	assert "Row 1: Can't apply filter '0,2'" in capsys.readouterr().out
@@ -0,0 +1,29 @@
+from hot import parse_command
+from pyhot.hottable.document import HotDocument
+from pyhot.plan import Plan
+
+
+
+def load_with_plan(argv, path):
+	args, hot_parser = parse_command([str(path), *argv])
+	plan = Plan(hot_parser)
+	plan.push_limit_into_loading(args)
+	hotdoc = HotDocument(args)
+	hotdoc.add_hot_tables_from_args([str(path)])
+	return hotdoc, plan
+
+
+def test_head_is_applied_while_loading_with_inference(tmp_path, capsys):
+	path = tmp_path / "data.csv"
+	path.write_text("a,b\n" + "".join(f"{i},x{i}\n" for i in range(100)) + "n/a,y\n")
+	hotdoc, plan = load_with_plan(["--kilo", "a", "--head", "3"], path)
+	assert hotdoc.tables[0].values == (["a", "b"], [[0, "x0"], [1, "x1"], [2, "x2"]])
+	plan.print()
+	assert "Limit: --head 3 (also applied while loading)" in capsys.readouterr().out
+
+
+def test_head_is_not_applied_while_loading_with_row_bounds(tmp_path):
+	path = tmp_path / "data.csv"
+	path.write_text("a\n" + "".join(f"{i}\n" for i in range(20)))
+	hotdoc, plan = load_with_plan(["--head", "3", "--min-rows", "10"], path)
+	assert hotdoc.tables[0].row_count == 20
@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import HOTPY_DIR
+
+
+HOT = os.path.join(HOTPY_DIR, "hot.py")
+PAGE = "<table><tr><th>a</th><th>b</th></tr><tr><td>1</td><td>2</td></tr></table>"
+# runs a command on the server only, exits with 99 when it would run here
+CLIENT = f"""
+import sys
+sys.path.insert(0, {HOTPY_DIR!r})
+from pyhot.client import forward_to_server
+code = forward_to_server(sys.argv[1:])
+sys.exit(99 if code is None else code)
+"""
+
+
+@pytest.fixture
+def server(tmp_path):
+	pytest.importorskip("lxml")
+	pytest.importorskip("tabulate")
+	env = dict(os.environ, HOT_SOCKET=str(tmp_path / "hot.sock"), HOT_CACHE_DIR=str(tmp_path / "server-cache"))
+	proc = subprocess.Popen(
+		[sys.executable, HOT, "--serve"], cwd=tmp_path, env=env,
+		stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, text=True
+	)
+	try:
+		assert proc.stdout.readline().startswith("Serving on")
+		yield env
+	finally:
+		proc.terminate()
+		proc.wait(timeout=10)
+
+
+def test_client_cache_dir_is_used_by_server(server, tmp_path):
+	(tmp_path / "page.html").write_text(PAGE)
+	env = dict(server, HOT_CACHE_DIR=str(tmp_path / "client-cache"))
+	result = subprocess.run(
+		[sys.executable, "-c", CLIENT, "page.html", "--cache", "--csv", "-o", "out.csv"],
+		cwd=tmp_path, env=env, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=60
+	)
+	assert result.returncode == 0, result.stderr
+	assert (tmp_path / "out.csv").read_text().splitlines()[0] == "a,b"
+	assert (tmp_path / "client-cache" / "tables").is_dir()
+	assert not (tmp_path / "server-cache").exists()
+
+
+def test_script_loads_only_the_client_before_forwarding():
+	code = f"""
+import json, sys
+sys.path.insert(0, {HOTPY_DIR!r})
+import hot
+print(json.dumps(sorted(name for name in sys.modules if name.startswith("pyhot"))))
+"""
+	result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=60)
+	assert result.returncode == 0, result.stderr
+	assert json.loads(result.stdout) == ["pyhot", "pyhot.client"]
+
+
+def test_repl_history_is_registered_once(monkeypatch, tmp_path):
+	pytest.importorskip("readline")
+	from pyhot import repl
+	registered = []
+	monkeypatch.setattr(repl.atexit, "register", registered.append)
+	monkeypatch.setattr(repl, "HISTORY_FILE", str(tmp_path / "history"))
+	monkeypatch.setattr(repl, "history_loaded", False)
+	repl.load_history()
+	repl.load_history()
+	assert registered == [repl.save_history]
@@ -0,0 +1,64 @@
+from hot import parse_command
+from pyhot.hottable import snapshot
+from pyhot.hottable.document import HotDocument
+
+
+
+def make_document():
+	args, hot_parser = parse_command([])
+	hotdoc = HotDocument(args)
+	hotdoc.tables.append(hotdoc.create_table_from_values(["a", "b"], [[i, str(i)] for i in range(100)]))
+	return hotdoc
+
+
+def test_changed_rows_are_copied_others_shared(capsys):
+	hotdoc = make_document()
+	time_machine = hotdoc.time_machine
+	time_machine.snap()
+	table = hotdoc.tables[0]
+	table.set_column_values(1, [str(i) if i != 5 else "five" for i in range(100)])
+	time_machine.snap()
+
+	old, new = (s.states[0] for s in time_machine.snapshots)
+	assert new.rows[5] == (5, "five")
+	assert all(new.rows[i] is old.rows[i] for i in range(100) if i != 5)
+
+
+def test_untouched_table_is_not_looked_at(capsys, monkeypatch):
+	hotdoc = make_document()
+	time_machine = hotdoc.time_machine
+	time_machine.snap()
+	def fail(*args):
+		raise AssertionError("the table was compared")
+	monkeypatch.setattr(snapshot, "is_same_table", fail)
+	monkeypatch.setattr(snapshot, "is_same_cells", fail)
+	time_machine.snap()
+	assert len(time_machine.snapshots) == 1
+	assert "up-to-date" in capsys.readouterr().out
+
+
+def test_undo_and_redo(capsys):
+	hotdoc = make_document()
+	time_machine = hotdoc.time_machine
+	time_machine.snap()
+	hotdoc.tables[0].rows = hotdoc.tables[0].rows[:3]
+	time_machine.undo()
+	assert hotdoc.tables[0].row_count == 100
+	time_machine.redo()
+	assert hotdoc.tables[0].values == (["a", "b"], [[0, "0"], [1, "1"], [2, "2"]])
+
+
+def test_each_undo_uses_up_one_snapshot(capsys):
+	hotdoc = make_document()
+	time_machine = hotdoc.time_machine
+	time_machine.snap()
+	hotdoc.tables[0].rows = hotdoc.tables[0].rows[:3]
+	time_machine.snap()
+	# the newest snapshot is the current state, undoing to it changes nothing
+	time_machine.undo()
+	assert hotdoc.tables[0].row_count == 3
+	time_machine.undo()
+	assert hotdoc.tables[0].row_count == 100
+	time_machine.redo()
+	assert hotdoc.tables[0].row_count == 3
+	assert len(time_machine.snapshots) == 1 and len(time_machine.redo_snapshots) == 1
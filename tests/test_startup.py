@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import HOTPY_DIR
+
+
+HOT = os.path.join(HOTPY_DIR, "hot.py")
+HEAVY_MODULES = ["bs4", "lxml", "requests", "jinja2", "tabulate", "readline", "numpy", "pyperclip"]
+# wall-clock timings depend on the machine and its load, so the budget is
+# only checked when asked for, like make check-startup does
+BUDGET_MS = os.environ.get("HOT_STARTUP_BUDGET_MS")
+# runs a command in this interpreter, then prints the heavy modules it loaded
+LOADED = f"""
+import json, sys
+sys.path.insert(0, {HOTPY_DIR!r})
+sys.argv[0] = "hot"
+import hot
+hot.main()
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+
+def run(args, cwd):
+	# no server, the command has to start up here
+	env = dict(os.environ, HOT_SOCKET="")
+	return subprocess.run(
+		[sys.executable, *args], cwd=cwd, env=env,
+		stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=60
+	)
+
+
+def test_csv_command_loads_no_heavy_modules(tmp_path):
+	(tmp_path / "data.csv").write_text("a,b\n1,2\n")
+	result = run(["-c", LOADED, "data.csv", "--csv", "-o", "out.csv"], tmp_path)
+	assert result.returncode == 0, result.stderr
+	assert json.loads(result.stdout.splitlines()[-1]) == []
+	assert (tmp_path / "out.csv").read_text().splitlines() == ["a,b", "1,2"]
+
+
+@pytest.mark.skipif(not BUDGET_MS, reason="set HOT_STARTUP_BUDGET_MS to check the startup time")
+def test_csv_command_is_within_startup_budget(tmp_path):
+	(tmp_path / "data.csv").write_text("a,b\n1,2\n")
+	result = run([HOT, "--startup-profile", "--startup-budget", BUDGET_MS, "data.csv", "--csv", "-o", "out.csv"], tmp_path)
+	assert result.returncode == 0, result.stderr
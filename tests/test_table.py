@@ -0,0 +1,44 @@
+from hot import parse_command
+from pyhot.hottable.document import HotDocument
+from pyhot.plan import Plan
+
+
+
+def make_document(argv, headers, rows):
+	args, hot_parser = parse_command(argv)
+	hotdoc = HotDocument(args)
+	hotdoc.tables.append(hotdoc.create_table_from_values(headers, rows))
+	return hotdoc, Plan(hot_parser)
+
+
+def test_print_leaves_version_alone(capsys):
+	hotdoc, plan = make_document(["--print"], ["a", "b"], [[1, 2], [3, 4]])
+	table = hotdoc.tables[0]
+	fingerprint, version = table.fingerprint, table.version
+	plan.run(hotdoc)
+	assert table.version == version
+	assert table.fingerprint == fingerprint
+
+
+def test_change_in_place_bumps_version():
+	hotdoc, plan = make_document(["--swap", "a=b", "--kilo", "b"], ["a", "b"], [[1, 2000], [3, 4000]])
+	table = hotdoc.tables[0]
+	fingerprint, version = table.fingerprint, table.version
+	plan.run(hotdoc)
+	assert table.version > version
+	assert table.fingerprint != fingerprint
+	assert table.values == (["b", "a"], [[2, 1], [4, 3]])
+
+
+def test_bound_on_a_text_column_is_reported(capsys):
+	for columnar in [False, True]:
+		hotdoc, plan = make_document([], ["name", "price"], [["a", 3], ["b", 7], ["c", None]])
+		table = hotdoc.tables[0]
+		if columnar:
+			table.make_columnar()
+		else:
+			table.rows = table.row_list
+		assert table.is_columnar == columnar
+		table.filter_rows_by_bounds([("name=5", False), ("price=5", False)])
+		assert table.values == (["name", "price"], [["b", 7]])
+		assert "Invalid min/max arg: 'name=5'" in capsys.readouterr().out
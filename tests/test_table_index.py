@@ -0,0 +1,32 @@
+from hot import parse_command
+from pyhot.hottable.document import HotDocument
+from pyhot.hottable.table_index import build_table_index
+
+
+
+# cells outside a row, the pre-scan counts them into the header
+STRAY_CELLS = "<table><tr><th>a</th></tr><td>1</td><td>2</td><tr><td>3</td></tr></table>"
+# a row inside a cell, the pre-scan counts it as a row of its own
+NESTED_ROW = "<table><tr><th>a</th></tr><tr><td><div><tr><td>x</td></tr></div></td></tr><tr><td>2</td></tr></table>"
+WELL_FORMED = "<table><thead><tr><th>a</th></tr></thead><tbody><tr><td>1</td></tr><tr><td>2</td></tr></tbody></table>"
+
+
+def extract(html, *flags):
+	args, hot_parser = parse_command(list(flags))
+	hotdoc = HotDocument(args)
+	return [table.values for table in hotdoc.extract_hot_tables(html)]
+
+
+def test_broken_markup_is_not_exact():
+	assert [info.is_exact for info in build_table_index(STRAY_CELLS + NESTED_ROW + WELL_FORMED)] == [False, False, True]
+	assert [info.is_exact for info in build_table_index("<table><tr><td>1</td></tr>")] == [False]
+
+
+def test_broken_markup_is_left_to_the_full_parse():
+	assert extract(STRAY_CELLS, "--exact-cols", "1") == extract(STRAY_CELLS) != []
+	assert extract(NESTED_ROW, "--exact-rows", "2") == extract(NESTED_ROW) != []
+
+
+def test_exact_counts_still_reject():
+	assert extract(WELL_FORMED, "--min-rows", "2") == [(["a"], [[1], [2]])]
+	assert extract(WELL_FORMED, "--min-rows", "3") == []